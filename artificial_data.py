@@ -6,14 +6,16 @@ import numpy as np
 import networkx as nx
 import cPickle as pkl
 
+from multiprocessing import Pool
 from scipy.spatial.distance import cosine
 
-from experiment_util import weighted_choice
-from dag_util import get_roots
+from dag_util import get_roots, assert_no_cycle
 from interactions import InteractionsUtil as IU
 from experiment_util import get_number_and_percentage, \
     experiment_signature
 
+MAX_SEED = 2**31 - 1
+
 
 def random_topic(n_topics, topic_noise=0.0001, taboo_topics=set()):
     taboo_topics = set(taboo_topics)
@@ -34,6 +36,28 @@ def random_topic_distribution(n_topics):
     return raw_vect / raw_vect.sum()
 
 
+def _sample_recency_offset(q, i, u):
+    """
+    Sample k in 1..i with probability proportional to q^k,
+    by inverting the CDF of the truncated geometric distribution
+    """
+    if q == 0:
+        return 1
+    elif q == 1:
+        k = math.ceil(u * i)
+    else:
+        k = math.ceil(math.log(1 - u * (1 - q ** i)) / math.log(q))
+    return int(max(1, min(i, k)))
+
+
+def _random_participant(rng, participants, excluded):
+    """rejection sampling, `participants` are few and distinct"""
+    while True:
+        p = participants[rng.randint(len(participants))]
+        if p not in excluded:
+            return p
+
+
 def gen_event_with_known_tree_structure(event_size, participants,
                                         start_time, end_time,
                                         event_topic_param,
@@ -41,92 +65,134 @@ def gen_event_with_known_tree_structure(event_size, participants,
                                         alpha, tau,
                                         forward_proba,
                                         reply_proba,
-                                        create_new_proba):
+                                        create_new_proba,
+                                        random_state=None):
+    """
+    Grow an event tree node by node.
+    The parent of a new node is sampled with weight
+    alpha * out_degree + tau ^ recency.
+
+    Nodes are evenly spaced in time, so the recency part is a truncated
+    geometric distribution over the existing nodes and the out-degree part
+    is a uniform pick over the existing edges, both O(1) per node.
+
+    random_state: `np.random.RandomState`, the global one if None
+    """
+    rng = np.random if random_state is None else random_state
     n_participants = len(participants)
+    assert n_participants > 2
     time_step = (end_time - start_time) / float(event_size)
     if time_step < 1:
-        # raise ValueError('time_step should be larger than 1 ({}-{}) / {}'.format(
-        #     end_time,
-        #     start_time,
-        #     event_size
-        # ))
         print("timestemp < 1")
 
+    # recency weight of the node added k steps before is q^k
+    q = tau ** time_step
+
+    c_type_probas = np.cumsum([forward_proba, reply_proba, create_new_proba])
+    c_types = np.array(['f', 'r', 'c'])[np.searchsorted(
+        c_type_probas,
+        rng.uniform(0, c_type_probas[-1], event_size)
+    ).clip(max=2)]
+    mixture_draws = rng.random_sample(event_size)
+    parent_draws = rng.random_sample(event_size)
+
+    topics = event_topic_param + rng.uniform(
+        0, topic_noise,
+        (event_size, len(event_topic_param))
+    )
+    topics /= topics.sum(axis=1)[:, None]
+
+    senders, recipients = [], []
+    # one entry per out-edge, uniform picks are proportional to out-degree
+    edge_sources = []
+
     tree = nx.DiGraph()
     for i in xrange(event_size):
         time = start_time + time_step * (i+1)
-        if tree.number_of_nodes() == 0:
-            rand_inds = np.random.permutation(n_participants)
+        if i == 0:
+            rand_inds = rng.permutation(n_participants)
             sender_id = participants[rand_inds[0]]
             recipient_id = participants[rand_inds[1]]
         else:
-            # sample a node to connect
-            # weighted by degree and recency
-            nodes = tree.nodes()
-            out_degree = np.asarray([tree.out_degree(n)
-                                     for n in nodes])
-
-            recency = np.asarray([time - tree.node[n]['timestamp']
-                                  for n in nodes])
-            weights = alpha * out_degree + np.power(tau, recency)
-            parent = weighted_choice(zip(nodes, weights))[0]
-
-            # randomly choose the type of connection
-            # e.g, forward, reply, create_new
-            c_type = weighted_choice(
-                [('f', forward_proba),
-                 ('r', reply_proba),
-                 ('c', create_new_proba)]
-            )[0]
+            degree_weight = alpha * len(edge_sources)
+            if q == 1:
+                recency_weight = float(i)
+            else:
+                recency_weight = q * (1 - q ** i) / (1 - q)
+            total_weight = degree_weight + recency_weight
+            if total_weight > 0 and \
+               mixture_draws[i] * total_weight < degree_weight:
+                parent = edge_sources[
+                    int(parent_draws[i] * len(edge_sources))
+                ]
+            else:
+                parent = i - _sample_recency_offset(q, i, parent_draws[i])
+
+            c_type = str(c_types[i])
             tree.add_edge(parent, i, c_type=c_type)
+            edge_sources.append(parent)
 
             if c_type == 'r':
-                sender_id = tree.node[parent]['recipient_id']
-                recipient_id = tree.node[parent]['sender_id']
+                sender_id = recipients[parent]
+                recipient_id = senders[parent]
             elif c_type == 'f':
-                parent_sender_id = tree.node[parent]['sender_id']
-                sender_id = tree.node[parent]['recipient_id']
-                # print(np.random.permutation(n_participants))
-                try:
-                    recipient_id = (participants[r_id]
-                                    for r_id in np.random.permutation(n_participants)
-                                    if participants[r_id] != sender_id and
-                                    participants[r_id] != parent_sender_id).next()
-                except StopIteration:
-                    print('participants', participants)
-                    print('sender_id, parent_sender_id', sender_id, parent_sender_id)
+                sender_id = recipients[parent]
+                recipient_id = _random_participant(
+                    rng, participants, (sender_id, senders[parent])
+                )
             else:
-                sender_id = tree.node[parent]['sender_id']
-                recipient_id = (participants[r_id]
-                                for r_id in np.random.permutation(n_participants)
-                                if participants[r_id] != sender_id).next()
+                sender_id = senders[parent]
+                recipient_id = _random_participant(
+                    rng, participants, (sender_id, )
+                )
         tree.add_node(i)
-
-        # randomly adding white noise
-        topics = event_topic_param + np.random.uniform(
-            0, topic_noise,
-            len(event_topic_param)
-        )
-        topics /= topics.sum()
+        senders.append(sender_id)
+        recipients.append(recipient_id)
 
         tree.node[i] = {
             'message_id': i,
-            'sender_id': sender_id,
-            'recipient_id': recipient_id,
+            'sender_id': 'u-{}'.format(sender_id),
+            'recipient_ids': ['u-{}'.format(recipient_id)],
             'timestamp': time,
-            'topics': topics
+            'topics': topics[i]
         }
-    
-    # change int to string
-    for n in tree.nodes_iter():
-        tree.node[n]['sender_id'] = 'u-{}'.format(tree.node[n]['sender_id'])
-        tree.node[n]['recipient_ids'] = ['u-{}'.format(
-            tree.node[n]['recipient_id'])
-        ]
-        del tree.node[n]['recipient_id']
+
+    assert_no_cycle(tree)
     return tree
 
 
+def _gen_checked_event(kws):
+    """generate one event and check its meta graph has a single root"""
+    kws = dict(kws)
+    kws['random_state'] = np.random.RandomState(kws.pop('seed'))
+    event = gen_event_with_known_tree_structure(**kws)
+
+    g = IU.get_meta_graph(
+        [event.node[n] for n in event.nodes_iter()],
+        decompose_interactions=False,
+        remove_singleton=True,
+        given_topics=True,
+        convert_time=False)
+    n_interactions_in_mg = g.number_of_nodes()
+
+    if n_interactions_in_mg == len(event):
+        roots = [n
+                 for n, d in g.in_degree(g.nodes_iter()).items()
+                 if d == 0]
+        if len(roots) > 1:
+            print(roots)
+            for r in roots:
+                print(event[r])
+            raise ValueError("roots number {}".format(len(roots)))
+    else:
+        raise ValueError(
+            'invalid meta graph. {} < {}'.format(
+                n_interactions_in_mg,
+                len(event)
+            ))
+    return event
+
+
 def random_events(n_events, event_size_mu, event_size_sigma,
                   n_total_participants, participant_mu, participant_sigma,
                   min_time, max_time, event_duration_mu, event_duration_sigma,
@@ -136,15 +202,17 @@ def random_events(n_events, event_size_mu, event_size_sigma,
                   reply_proba,
                   create_new_proba,
                   taboo_topics=set(),
-                  accumulate_taboo=False):
+                  accumulate_taboo=False,
+                  n_jobs=1):
+    """
+    n_jobs: number of processes to grow the event trees
+    """
     # add main events
-    events = []
+    specs = []
     taboo_topics = set(taboo_topics)
     
     for i in xrange(n_events):
         # randomly select a topic and add some noise to it
-        event = []
-
         event_topic_param, topic_id = random_topic(
             n_topics,
             topic_noise,
@@ -182,43 +250,31 @@ def random_events(n_events, event_size_mu, event_size_sigma,
         if end_time > max_time:
             end_time = max_time
 
-        event = gen_event_with_known_tree_structure(
-            event_size, participants, start_time, end_time,
-            event_topic_param,
-            topic_noise,
-            alpha, tau,
-            forward_proba,
-            reply_proba,
-            create_new_proba
-        )
+        specs.append({
+            'event_size': event_size,
+            'participants': participants,
+            'start_time': start_time,
+            'end_time': end_time,
+            'event_topic_param': event_topic_param,
+            'topic_noise': topic_noise,
+            'alpha': alpha, 'tau': tau,
+            'forward_proba': forward_proba,
+            'reply_proba': reply_proba,
+            'create_new_proba': create_new_proba,
+            # independent stream per event,
+            # the same events regardless of `n_jobs`
+            'seed': np.random.randint(MAX_SEED)
+        })
 
-        # some checking
-        g = IU.get_meta_graph(
-            [event.node[n] for n in event.nodes_iter()],
-            decompose_interactions=False,
-            remove_singleton=True,
-            given_topics=True,
-            convert_time=False)
-        n_interactions_in_mg = g.number_of_nodes()
-
-        if n_interactions_in_mg == len(event):
-            roots = [n
-                     for n, d in g.in_degree(g.nodes_iter()).items()
-                     if d == 0]
-            if len(roots) > 1:
-                print(roots)
-                for r in roots:
-                    print(event[r])
-                print("WARNING: roots number {}".format(len(roots)))
-                raise
-        else:
-            print(
-                'invalid meta graph. {} < {}'.format(
-                    n_interactions_in_mg,
-                    len(event)
-                ))
-            raise
-        events.append(event)
+    if n_jobs == 1:
+        events = map(_gen_checked_event, specs)
+    else:
+        pool = Pool(n_jobs)
+        try:
+            events = pool.map(_gen_checked_event, specs)
+        finally:
+            pool.close()
+            pool.join()
 
     return events, taboo_topics
 
@@ -280,7 +336,8 @@ def make_artificial_data(
         forward_proba,
         reply_proba,
         create_new_proba,
-        dist_func):
+        dist_func,
+        n_jobs=1):
     events, taboo_topics = random_events(
         n_events, event_size_mu, event_size_sigma,
         n_total_participants, participant_mu, participant_sigma,
@@ -290,7 +347,8 @@ def make_artificial_data(
         forward_proba,
         reply_proba,
         create_new_proba,
-        accumulate_taboo=True
+        accumulate_taboo=True,
+        n_jobs=n_jobs
     )
 
     minor_events, _ = random_events(
@@ -304,7 +362,8 @@ def make_artificial_data(
         reply_proba,
         create_new_proba,
         taboo_topics=taboo_topics,
-        accumulate_taboo=False
+        accumulate_taboo=False,
+        n_jobs=n_jobs
     )
     
     (n_noisy_interactions, _) = get_number_and_percentage(
@@ -394,6 +453,10 @@ def main():
     parser.add_argument('--random_seed',
                         type=int,
                         default=None)    
+    parser.add_argument('--n_jobs',
+                        type=int,
+                        default=1,
+                        help="Number of processes to generate events")
 
     args = parser.parse_args()
 
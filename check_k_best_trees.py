@@ -25,12 +25,13 @@ def get_k_best_tree_summary(
         interactions_path, people_path,
         corpus_dict_path, lda_model_path,
         cand_trees_path, k, people_repr_template,
-        undirected=False):
+        undirected=False, n_jobs=1):
 
     summary_kws = build_default_summary_kws_from_path(
         interactions_path, people_path,
         corpus_dict_path, lda_model_path,
-        people_repr_template, undirected=undirected
+        people_repr_template, undirected=undirected,
+        cache_event_topics=True
     )
 
     trees = k_best_trees(pickle.load(open(cand_trees_path)),
@@ -38,7 +39,8 @@ def get_k_best_tree_summary(
 
     return summary(trees,
                    summary_kws=summary_kws,
-                   tablefmt='orgtbl')
+                   tablefmt='orgtbl',
+                   n_jobs=n_jobs)
 
 
 def main():
@@ -53,6 +55,7 @@ def main():
                         default="{id}")
     parser.add_argument('-k', type=int, default=10)
     parser.add_argument('--undirected', default=False, action="store_true")
+    parser.add_argument('--n_jobs', type=int, default=1)
 
     args = parser.parse_args()
     pprint(vars(args))
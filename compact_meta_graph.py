@@ -0,0 +1,359 @@
+# Compact on-disk format of meta graphs
+#
+# A meta graph is saved as a directory of numpy arrays:
+#
+# - meta.json: sizes, column and feature descriptions
+# - node.npy: node ids
+# - indptr.npy, indices.npy: CSR adjacency(out edges)
+# - cost.npy: edge costs aligned with `indices`
+# - edge-{name}.npy: other edge attributes(e.g, orig_c, recency),
+#   aligned with `indices` as well
+# - col-{name}.npy: node attribute columns
+#   (list-valued columns come with col-{name}.offsets.npy)
+# - feat-{name}.npy: dense node features(e.g, topics)
+# - feat-{name}.{data,indices,indptr}.npy: sparse node features(e.g, bow)
+#
+# All arrays can be memory mapped and features are only loaded on demand,
+# so that startup is fast compared to `nx.read_gpickle`
+
+import os
+import logging
+import cPickle as pkl
+import ujson as json
+import numpy as np
+import networkx as nx
+
+from itertools import izip
+from datetime import datetime, timedelta
+from scipy.sparse import issparse, csr_matrix, vstack
+
+from interactions import InteractionsUtil as IU
+
+logging.basicConfig(format="%(asctime)s;%(levelname)s;%(message)s",
+                    datefmt="%Y-%m-%d %H:%M:%S")
+logger = logging.getLogger("compact_meta_graph")
+logger.setLevel(logging.DEBUG)
+
+FORMAT_VERSION = 1
+EPOCH = datetime(1970, 1, 1)
+COMPACT_SUFFIX = '.mg'
+FEATURE_FIELDS = ('topics', 'bow', 'hashtag_bow')
+
+
+def _datetime_to_int(d):
+    delta = d - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 10**6 + delta.microseconds
+
+
+def _int_to_datetime(i):
+    return EPOCH + timedelta(microseconds=int(i))
+
+
+def _column_kind(values):
+    if all(isinstance(v, datetime) for v in values):
+        return 'datetime'
+    elif all(isinstance(v, (list, tuple)) for v in values):
+        return 'list'
+    else:
+        arr = np.asarray(values)
+        if arr.dtype == np.object_ or arr.ndim != 1:
+            return 'pickle'
+        else:
+            return 'array'
+
+
+def _feature_kind(values):
+    if all(issparse(v) for v in values):
+        return 'sparse'
+    elif all(isinstance(v, np.ndarray) and v.ndim == 1 for v in values):
+        if len(set(v.shape for v in values)) == 1:
+            return 'dense'
+    return None
+
+
+class CompactMetaGraph(object):
+    """
+    Read-only view of a meta graph saved by `save_compact_meta_graph`
+    """
+    def __init__(self, path, mmap_mode='r'):
+        self.path = path
+        self.mmap_mode = mmap_mode
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        assert self.meta['version'] == FORMAT_VERSION, \
+            'unsupported format version {}'.format(self.meta['version'])
+
+        self.nodes = self._load_array('node').tolist()
+        self.indptr = self._load_array('indptr')
+        self.indices = self._load_array('indices')
+        self.costs = self._load_array('cost')
+
+        self._columns = {}
+        self._features = {}
+        self._edge_columns = {}
+
+    def _file(self, name):
+        return os.path.join(self.path, name + '.npy')
+
+    def _load_array(self, name):
+        return np.load(self._file(name), mmap_mode=self.mmap_mode)
+
+    @property
+    def number_of_nodes(self):
+        return self.meta['n_nodes']
+
+    @property
+    def number_of_edges(self):
+        return self.meta['n_edges']
+
+    @property
+    def column_names(self):
+        return sorted(self.meta['columns'].keys())
+
+    @property
+    def feature_names(self):
+        return sorted(self.meta['features'].keys())
+
+    @property
+    def edge_column_names(self):
+        return sorted(self.meta.get('edge_columns', {}).keys())
+
+    def column(self, name):
+        """node attribute values as a list, in node order
+        """
+        if name not in self._columns:
+            kind = self.meta['columns'][name]
+            fname = 'col-{}'.format(name)
+            if kind == 'pickle':
+                with open(os.path.join(self.path, fname + '.pkl'), 'rb') as f:
+                    values = pkl.load(f)
+            elif kind == 'datetime':
+                values = map(_int_to_datetime, self._load_array(fname))
+            elif kind == 'list':
+                flat = self._load_array(fname).tolist()
+                offsets = self._load_array(fname + '.offsets')
+                values = [flat[offsets[i]: offsets[i+1]]
+                          for i in xrange(len(offsets) - 1)]
+            else:
+                values = self._load_array(fname).tolist()
+            self._columns[name] = values
+        return self._columns[name]
+
+    def edge_column(self, name):
+        """edge attribute values as a list, aligned with `indices`
+        (None for edges without the attribute)
+        """
+        if name not in self._edge_columns:
+            kind = self.meta['edge_columns'][name]
+            fname = 'edge-{}'.format(name)
+            if kind == 'pickle':
+                with open(os.path.join(self.path, fname + '.pkl'), 'rb') as f:
+                    values = pkl.load(f)
+            else:
+                values = self._load_array(fname).tolist()
+            self._edge_columns[name] = values
+        return self._edge_columns[name]
+
+    def feature(self, name):
+        """node feature matrix, one row per node(lazily loaded)
+        """
+        if name not in self._features:
+            kind = self.meta['features'][name]
+            fname = 'feat-{}'.format(name)
+            if kind == 'dense':
+                mat = self._load_array(fname)
+            else:
+                mat = csr_matrix(
+                    (self._load_array(fname + '.data'),
+                     self._load_array(fname + '.indices'),
+                     self._load_array(fname + '.indptr')),
+                    shape=tuple(self.meta['feature_shapes'][name])
+                )
+            self._features[name] = mat
+        return self._features[name]
+
+    def edge_arrays(self):
+        """(source index array, target index array, cost array)
+        """
+        sources = np.repeat(np.arange(self.number_of_nodes),
+                            np.diff(self.indptr))
+        return sources, self.indices, self.costs
+
+    def to_networkx(self, columns=None, features=()):
+        """
+        columns: node attributes to include, all if None
+        features: node features to include, e.g, ('topics', )
+        """
+        if columns is None:
+            columns = self.column_names
+        cols = [(name, self.column(name)) for name in columns]
+        feats = [(name, self.feature(name)) for name in features]
+
+        def node_attrs(i):
+            attrs = {name: values[i] for name, values in cols}
+            for name, mat in feats:
+                attrs[name] = mat[i]
+            return attrs
+
+        g = nx.DiGraph()
+        g.add_nodes_from(
+            (n, node_attrs(i)) for i, n in enumerate(self.nodes)
+        )
+
+        cost_key = self.meta['edge_cost_key']
+        sources, targets, costs = self.edge_arrays()
+        edge_cols = [(name, self.edge_column(name))
+                     for name in self.edge_column_names]
+
+        def edge_attrs(i, c):
+            attrs = {name: values[i] for name, values in edge_cols
+                     if values[i] is not None}
+            if self.meta['has_edge_cost']:
+                attrs[cost_key] = c
+            return attrs
+
+        g.add_edges_from(
+            (self.nodes[s], self.nodes[t], edge_attrs(i, c))
+            for i, (s, t, c) in enumerate(izip(sources.tolist(),
+                                               targets.tolist(),
+                                               costs.tolist()))
+        )
+        return g
+
+
+def save_compact_meta_graph(g, path, edge_cost_key=IU.EDGE_COST_KEY):
+    if not os.path.exists(path):
+        os.makedirs(path)
+
+    def save_array(name, arr):
+        np.save(os.path.join(path, name + '.npy'), arr)
+
+    nodes = g.nodes()
+    n2i = {n: i for i, n in enumerate(nodes)}
+
+    # adjacency
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    indices = []
+    costs = []
+    edge_attrs = []
+    for i, n in enumerate(nodes):
+        for child in g.neighbors(n):
+            indices.append(n2i[child])
+            costs.append(g[n][child].get(edge_cost_key, np.nan))
+            edge_attrs.append(g[n][child])
+        indptr[i+1] = len(indices)
+
+    save_array('indptr', indptr)
+    save_array('indices', np.asarray(indices, dtype=np.int64))
+    save_array('cost', np.asarray(costs, dtype=np.float64))
+    assert _column_kind(nodes) == 'array', 'node ids should be int or str'
+    save_array('node', np.asarray(nodes))
+
+    meta = {'version': FORMAT_VERSION,
+            'n_nodes': len(nodes),
+            'n_edges': len(indices),
+            'edge_cost_key': edge_cost_key,
+            'has_edge_cost': not np.all(np.isnan(costs)),
+            'columns': {},
+            'features': {},
+            'feature_shapes': {},
+            'edge_columns': {}}
+
+    edge_attr_names = set(name for d in edge_attrs for name in d)
+    edge_attr_names.discard(edge_cost_key)
+    for name in sorted(edge_attr_names):
+        values = [d.get(name) for d in edge_attrs]
+        fname = 'edge-{}'.format(name)
+        kind = _column_kind(values)
+        if kind == 'array':
+            save_array(fname, np.asarray(values))
+        else:
+            kind = 'pickle'
+            with open(os.path.join(path, fname + '.pkl'), 'wb') as f:
+                pkl.dump(values, f, protocol=pkl.HIGHEST_PROTOCOL)
+        meta['edge_columns'][name] = kind
+
+    attr_names = set(name for n in nodes for name in g.node[n])
+    for name in sorted(attr_names):
+        values = [g.node[n].get(name) for n in nodes]
+
+        kind = _feature_kind(values) if name in FEATURE_FIELDS else None
+        if kind == 'dense':
+            save_array('feat-{}'.format(name), np.vstack(values))
+            meta['features'][name] = kind
+            continue
+        elif kind == 'sparse':
+            mat = vstack(values, format='csr')
+            for part in ('data', 'indices', 'indptr'):
+                save_array('feat-{}.{}'.format(name, part),
+                           getattr(mat, part))
+            meta['features'][name] = kind
+            meta['feature_shapes'][name] = list(mat.shape)
+            continue
+
+        kind = _column_kind(values)
+        fname = 'col-{}'.format(name)
+        if kind == 'datetime':
+            save_array(fname,
+                       np.asarray(map(_datetime_to_int, values),
+                                  dtype=np.int64))
+        elif kind == 'list' and \
+                _column_kind([v for l in values for v in l] or [0]) == 'array':
+            save_array(fname, np.asarray([v for l in values for v in l]))
+            save_array(fname + '.offsets',
+                       np.cumsum([0] + map(len, values)))
+        elif kind == 'array':
+            save_array(fname, np.asarray(values))
+        else:
+            kind = 'pickle'
+            with open(os.path.join(path, fname + '.pkl'), 'wb') as f:
+                pkl.dump(values, f, protocol=pkl.HIGHEST_PROTOCOL)
+        meta['columns'][name] = kind
+
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+def is_compact_meta_graph(path):
+    return os.path.isdir(path) and \
+        os.path.exists(os.path.join(path, 'meta.json'))
+
+
+def load_meta_graph(path, features=FEATURE_FIELDS):
+    """load meta graph saved in either compact format or gpickle
+
+    features: node features to load in case of compact format
+    """
+    if is_compact_meta_graph(path):
+        mg = CompactMetaGraph(path)
+        return mg.to_networkx(
+            features=[f for f in features if f in mg.meta['features']]
+        )
+    else:
+        return nx.read_gpickle(path)
+
+
+def convert_gpickle(pkl_path, output_path=None):
+    """convert existing meta graph pickle to the compact format
+    """
+    if output_path is None:
+        output_path = os.path.splitext(pkl_path)[0] + COMPACT_SUFFIX
+    logger.info('converting {} to {}'.format(pkl_path, output_path))
+    save_compact_meta_graph(nx.read_gpickle(pkl_path), output_path)
+    return output_path
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        'Convert meta graph pickles to the compact format'
+    )
+    parser.add_argument('pkl_paths', nargs='+')
+    args = parser.parse_args()
+
+    for p in args.pkl_paths:
+        print(convert_gpickle(p))
+
+
+if __name__ == '__main__':
+    main()
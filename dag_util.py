@@ -1,5 +1,7 @@
+import numpy as np
 import networkx as nx
-from networkx.algorithms.shortest_paths.weighted import single_source_dijkstra_path
+
+from collections import namedtuple
 from networkx import minimum_spanning_tree
 from interactions import InteractionsUtil
 
@@ -16,17 +18,34 @@ def chunks(lst, chunk_size):
 def binarize_dag(g,
                  vertex_weight_key,
                  edge_weight_key,
-                 dummy_node_name_prefix='d_'):
+                 dummy_node_name_prefix='d_',
+                 deterministic=False):
+    """
+    deterministic: if True, children are grouped in sorted order and
+    dummy nodes are named after their parent, '{prefix}{parent}_{i}',
+    so that the same sub-DAG is always binarized in the same way
+    (required to share DP tables across rooted DAGs)
+    """
     g = g.copy()  # be functional
     dummy_node_counter = 1
     for u in nx.topological_sort(g):
         nbs = g.neighbors(u)
+        if deterministic:
+            nbs = sorted(nbs)
+            dummy_node_counter = 1
         while len(nbs) > 2:
             for p_1, p_2 in chunks(nbs, 2):
-                v = "{}{}".format(
-                    dummy_node_name_prefix,
-                    dummy_node_counter
-                )
+                if deterministic:
+                    v = "{}{}_{}".format(
+                        dummy_node_name_prefix,
+                        u,
+                        dummy_node_counter
+                    )
+                else:
+                    v = "{}{}".format(
+                        dummy_node_name_prefix,
+                        dummy_node_counter
+                    )
                 g.add_node(v)
                 g.node[v]['dummy'] = True
                 
@@ -42,9 +61,86 @@ def binarize_dag(g,
                 g.remove_edges_from([(u, p_1), (u, p_2)])
                 dummy_node_counter += 1
             nbs = g.neighbors(u)
+            if deterministic:
+                nbs = sorted(nbs)
     return g
 
 
+# binarized DAG as arrays, indexed by position:
+# the first `n_real` positions are the nodes of the original DAG,
+# the rest are dummy nodes(reward 0, cost 0 on the edge from the parent)
+# `left`/`right` are child positions, -1 if there is no such child
+BinaryDagArrays = namedtuple('BinaryDagArrays',
+                             ['nodes', 'n_real',
+                              'left', 'right',
+                              'left_cost', 'right_cost',
+                              'reward'])
+
+
+def binarize_dag_to_arrays(g,
+                           vertex_weight_key,
+                           edge_weight_key,
+                           cost_func=None):
+    """
+    Same structure as `binarize_dag` but produced as compact arrays,
+    without copying the graph or its attribute dicts.
+
+    cost_func: applied to each edge cost, e.g, fixed point rounding
+    """
+    nodes = g.nodes()
+    n2i = {n: i for i, n in enumerate(nodes)}
+    if cost_func is None:
+        cost_func = lambda c: c
+
+    left, right, left_cost, right_cost = [], [], [], []
+    reward = [g.node[n][vertex_weight_key] for n in nodes]
+    n_real = len(nodes)
+
+    # children of each real node, dummy nodes are appended at the end
+    children_of = [
+        [(n2i[c], cost_func(g[n][c][edge_weight_key]))
+         for c in g.neighbors(n)]
+        for n in nodes
+    ]
+    for i in xrange(n_real):
+        left.append(-1)
+        right.append(-1)
+        left_cost.append(0)
+        right_cost.append(0)
+
+    def set_children(i, nbs):
+        if len(nbs) > 0:
+            left[i], left_cost[i] = nbs[0]
+        if len(nbs) > 1:
+            right[i], right_cost[i] = nbs[1]
+
+    for i in xrange(n_real):
+        nbs = children_of[i]
+        while len(nbs) > 2:
+            dummies = []
+            for (p_1, c_1), (p_2, c_2) in chunks(nbs, 2):
+                left.append(p_1)
+                left_cost.append(c_1)
+                right.append(p_2)
+                right_cost.append(c_2)
+                reward.append(0)
+                dummies.append((len(left) - 1, 0))
+            nbs = nbs[len(nbs) // 2 * 2:] + dummies
+        set_children(i, nbs)
+
+    cost_dtype = np.int64 if all(isinstance(c, (int, long))
+                                 for c in left_cost + right_cost) \
+        else np.float64
+    return BinaryDagArrays(
+        nodes=nodes, n_real=n_real,
+        left=np.asarray(left, dtype=np.int32),
+        right=np.asarray(right, dtype=np.int32),
+        left_cost=np.asarray(left_cost, dtype=cost_dtype),
+        right_cost=np.asarray(right_cost, dtype=cost_dtype),
+        reward=np.asarray(reward, dtype=np.float64)
+    )
+
+
 def unbinarize_dag(g,
                    edge_weight_key):
     """
@@ -72,25 +168,85 @@ def is_binary(g):
     return True
 
 
+def find_cycle(g):
+    """
+    Return the first cycle found(a list of nodes, the last one
+    pointing back to the first one), None if g is acyclic.
+
+    DFS with colouring, O(V+E)
+    """
+    WHITE, GRAY, BLACK = 0, 1, 2
+    color = {n: WHITE for n in g.nodes_iter()}
+    for s in g.nodes_iter():
+        if color[s] != WHITE:
+            continue
+        color[s] = GRAY
+        path = [s]
+        stack = [iter(g.successors(s))]
+        while stack:
+            for v in stack[-1]:
+                if color[v] == GRAY:
+                    return path[path.index(v):]
+                if color[v] == WHITE:
+                    color[v] = GRAY
+                    path.append(v)
+                    stack.append(iter(g.successors(v)))
+                    break
+            else:
+                color[path.pop()] = BLACK
+                stack.pop()
+    return None
+
+
 def assert_no_cycle(g):
-    """Use this carefully especially with big graph,
-    it's quite slow
+    """raise AssertionError with the cycle if g is cyclic, O(V+E)
+    """
+    cycle = find_cycle(g)
+    assert cycle is None, 'g is cyclic: {}'.format(
+        ' -> '.join(map(str, cycle + cycle[:1]))
+    )
+
+
+def shortest_path_arborescence(g, source,
+                               weight=InteractionsUtil.EDGE_COST_KEY):
+    """
+    Tree of the shortest paths from source to the nodes reachable from it.
+
+    g is a DAG, so one relaxation pass over the topological order
+    is enough, O(V+E). Node attributes are shared with g.
     """
-    assert len(list(nx.simple_cycles(g))) == 0, 'g is cyclic'
+    dist = {source: 0}
+    pred = {}
+    for u in _topological_order_from(g, source):
+        for v in g.neighbors(u):
+            d = dist[u] + g[u][v][weight]
+            if v not in dist or d < dist[v]:
+                dist[v] = d
+                pred[v] = u
+
+    t = nx.DiGraph()
+    for n in dist:
+        t.add_node(n)
+        t.node[n] = g.node[n]
+    for v, u in pred.iteritems():
+        t.add_edge(u, v, g[u][v])
+    return t
 
 
 def remove_edges_via_dijkstra(g, source,
                               weight=InteractionsUtil.EDGE_COST_KEY):
-    g = g.copy()
-    paths = single_source_dijkstra_path(g,
-                                        source=source,
-                                        weight=weight)
-    edges = [(path[i], path[i+1])
-             for path in paths.values()
-             for i in xrange(len(path)-1)]
-    edges_to_remove = set(g.edges()) - set(edges)
-    g.remove_edges_from(edges_to_remove)
-    return g
+    """keep only the edges on the shortest paths from source,
+    see `shortest_path_arborescence`.
+
+    All nodes of g are kept, those unreachable from source without edges
+    """
+    t = shortest_path_arborescence(g, source, weight)
+    for n in g.nodes_iter():
+        if n not in t:
+            t.add_node(n)
+            t.node[n] = g.node[n]
+    t.graph.update(g.graph)
+    return t
 
 
 def get_roots(g):
@@ -111,9 +267,84 @@ def all_simple_paths_from_source(g, root):
                 yield path
 
 
-def longest_path(g, root):
-    return max(all_simple_paths_from_source(g, root),
-               key=lambda path: len(path))
+def _topological_order_from(g, root):
+    """nodes reachable from root in topological order"""
+    return nx.topological_sort(g, [root])
+
+
+def _edge_length(g, u, v, weight):
+    return g[u][v][weight] if weight else 1
+
+
+def _longest_path_dp(g, root, weight=None):
+    """
+    length(#edges or total `weight`) of the longest path
+    from root to each node reachable from it, O(V+E)
+    """
+    length = {root: 0}
+    for u in _topological_order_from(g, root):
+        for v in g.neighbors(u):
+            l = length[u] + _edge_length(g, u, v, weight)
+            if v not in length or l > length[v]:
+                length[v] = l
+    return length
+
+
+def longest_path_lengths(g, root, weight=None):
+    """
+    depth of each node reachable from root,
+    i.e, length of the longest path from root to it
+    (#edges if `weight` is None, otherwise the sum of edge `weight`)
+    """
+    return _longest_path_dp(g, root, weight)
+
+
+def longest_path(g, root, weight=None):
+    """
+    longest path from root(as a list of nodes), by #edges or
+    by the sum of edge `weight`
+
+    Ties are broken as `max` over `all_simple_paths_from_source` did:
+    the first end node in `g.nodes_iter()` order,
+    then the first path in depth-first(adjacency) order
+    """
+    length = _longest_path_dp(g, root, weight)
+    del length[root]
+    if not length:
+        raise ValueError('no path from {}'.format(root))
+    best = max(length.itervalues())
+    target = next(n for n in g.nodes_iter()
+                  if n in length and length[n] == best)
+
+    # longest distance to target from the nodes that can reach it
+    order = _topological_order_from(g, root)
+    to_target = {target: 0}
+    for u in reversed(order):
+        for v in g.neighbors(u):
+            if v in to_target:
+                l = to_target[v] + _edge_length(g, u, v, weight)
+                if u not in to_target or l > to_target[u]:
+                    to_target[u] = l
+
+    # the first neighbor still on a longest path, as a DFS would find
+    path = [root]
+    u = root
+    while u != target:
+        u = next(v for v in g.neighbors(u)
+                 if v in to_target and
+                 to_target[v] + _edge_length(g, u, v, weight) ==
+                 to_target[u])
+        path.append(u)
+    return path
+
+
+def count_paths(g, root):
+    """number of distinct paths from root to each node reachable from it"""
+    counts = {root: 1}
+    for u in _topological_order_from(g, root):
+        for v in g.neighbors(u):
+            counts[v] = counts.get(v, 0) + counts[u]
+    return counts
 
 
 def shrink_by_transitive_closure(g, closure, cost_key='c'):
@@ -7,6 +7,7 @@ import matplotlib.pyplot as plt
 from collections import defaultdict
 
 from check_k_best_trees import k_best_trees
+from compact_meta_graph import load_meta_graph
 
 
 def draw(mg, trees, output_path):
@@ -41,6 +42,6 @@ if __name__ == '__main__':
 
     args = parser.parse_args()
 
-    draw(nx.read_gpickle(args.meta_graph_path),
+    draw(load_meta_graph(args.meta_graph_path, features=()),
          k_best_trees(pkl.load(open(args.result_path)), args.k),
          args.output_path)
@@ -0,0 +1,300 @@
+# Batch driver of the dump_* scripts
+#
+# The interactions, people info, dictionary and LDA model are loaded
+# once(and only if some output format needs them),
+# then every (candidate tree pickle, output format) pair is dumped,
+# optionally by a pool of workers which inherit the loaded resources.
+
+import os
+import logging
+import cPickle as pkl
+
+from datetime import datetime
+from multiprocessing import Pool
+
+import dump_events_to_json
+import dump_events_to_nvd3
+import dump_events_to_vega_format
+import dump_meta_info_to_json
+import dump_vis_timeline_data
+from check_k_best_trees import k_best_trees
+from experiment_util import get_output_path
+from meta_graph_stat import build_default_summary_kws_from_path, \
+    prefetch_event_topics
+from util import load_id2obj_dict, json_dump
+
+logging.basicConfig(format="%(asctime)s;%(levelname)s;%(message)s",
+                    datefmt="%Y-%m-%d %H:%M:%S")
+logger = logging.getLogger("dump_batch")
+logger.setLevel(logging.DEBUG)
+
+# format -> resources it needs
+FORMAT_RESOURCES = {
+    'json': ('id2people', 'id2interaction'),
+    'timeline': ('summary_kws', ),
+    'nvd3': ('interactions_df', ),
+    'vega': ('interactions_df', ),
+}
+FORMATS = tuple(sorted(FORMAT_RESOURCES.keys()))
+
+
+def _add_secs(timings, key, start):
+    timings[key] = timings.get(key, 0) + \
+        (datetime.now() - start).total_seconds()
+
+
+class DumpResources(object):
+    """
+    Resources shared by all dumps, each loaded on first use
+    and the loading time recorded in `timings` under `load:<name>`
+    """
+    def __init__(self, interactions_path, people_path,
+                 corpus_dict_path=None, lda_model_path=None,
+                 people_repr_template='{id}',
+                 undirected=False):
+        self.interactions_path = interactions_path
+        self.people_path = people_path
+        self.corpus_dict_path = corpus_dict_path
+        self.lda_model_path = lda_model_path
+        self.people_repr_template = people_repr_template
+        self.undirected = undirected
+        self.timings = {}
+        self._loaded = {}
+
+    def _get(self, name, load):
+        if name not in self._loaded:
+            start = datetime.now()
+            self._loaded[name] = load()
+            _add_secs(self.timings, 'load:' + name, start)
+        return self._loaded[name]
+
+    @property
+    def id2interaction(self):
+        return self._get('id2interaction', lambda: load_id2obj_dict(
+            self.interactions_path, 'message_id'))
+
+    @property
+    def id2people(self):
+        return self._get('id2people', lambda: load_id2obj_dict(
+            self.people_path, 'id'))
+
+    @property
+    def interactions_df(self):
+        return self._get('interactions_df', lambda: (
+            dump_events_to_nvd3.load_interactions_df(self.interactions_path)
+        ))
+
+    @property
+    def summary_kws(self):
+        assert self.corpus_dict_path and self.lda_model_path, \
+            'corpus_dict_path and lda_model_path are required'
+        return self._get('summary_kws', lambda: (
+            build_default_summary_kws_from_path(
+                self.interactions_path,
+                self.people_path,
+                self.corpus_dict_path,
+                self.lda_model_path,
+                self.people_repr_template,
+                undirected=self.undirected,
+                cache_event_topics=True
+            )))
+
+    def preload(self, formats):
+        for fmt in formats:
+            for name in FORMAT_RESOURCES[fmt]:
+                getattr(self, name)
+
+
+def _format_dir(output_dir, fmt, format_subdir):
+    if format_subdir:
+        return os.path.join(output_dir, fmt)
+    else:
+        return output_dir
+
+
+def dump(resources, candidate_tree_path, fmt, output_dir,
+         k=10,
+         to_original_graph=False,
+         freq='1h',
+         non_event_sample_n=None,
+         format_subdir=True):
+    """dump one candidate tree pickle in format `fmt`
+    to `output_dir/fmt/<name>.json`
+    (`output_dir/<name>.json` if not `format_subdir`)
+    """
+    dirname = _format_dir(output_dir, fmt, format_subdir)
+    output_path = get_output_path(candidate_tree_path, dirname)
+    if fmt == 'json':
+        return dump_events_to_json.run(candidate_tree_path, k,
+                                       resources.id2people,
+                                       resources.id2interaction,
+                                       dirname=dirname,
+                                       to_original_graph=to_original_graph)
+
+    cand_trees = pkl.load(open(candidate_tree_path))
+    if fmt == 'timeline':
+        data = dump_vis_timeline_data.run(
+            cand_trees, k,
+            dump_vis_timeline_data.with_hashtags(cand_trees,
+                                                 resources.summary_kws),
+            resources.undirected
+        )
+    elif fmt == 'nvd3':
+        data = dump_events_to_nvd3.run(k_best_trees(cand_trees, k),
+                                       resources.interactions_df,
+                                       freq, non_event_sample_n)
+    elif fmt == 'vega':
+        data = dump_events_to_vega_format.run(k_best_trees(cand_trees, k),
+                                              resources.interactions_df,
+                                              non_event_sample_n)
+    else:
+        raise ValueError('Invalid format: {}'.format(fmt))
+    json_dump(data, output_path)
+    return output_path
+
+
+# set in each worker of `run`,
+# inherited from the parent process instead of pickled per task
+_worker_state = None
+
+
+def _init_worker(resources, output_dir, kws):
+    global _worker_state
+    _worker_state = (resources, output_dir, kws)
+
+
+def _dump_task(task):
+    resources, output_dir, kws = _worker_state
+    path, fmt = task
+    start = datetime.now()
+    output_path = dump(resources, path, fmt, output_dir, **kws)
+    return fmt, output_path, (datetime.now() - start).total_seconds()
+
+
+def run(candidate_tree_paths, formats, output_dir, resources,
+        meta_info=False,
+        n_jobs=1,
+        format_subdir=True,
+        **kws):
+    """
+    Dump each of `candidate_tree_paths` in each of `formats`.
+
+    meta_info: also dump the interactions and people by id(once),
+        as `id2interactions.json` and `id2people.json`(read by html/)
+    format_subdir: if False, dump into `output_dir` directly
+        (only one format is allowed then)
+    kws: passed to `dump`
+
+    Return the output paths,
+    seconds per stage are recorded in `resources.timings`
+    """
+    for fmt in formats:
+        if fmt not in FORMAT_RESOURCES:
+            raise ValueError('Invalid format: {}'.format(fmt))
+    if not format_subdir and len(formats) > 1:
+        raise ValueError('output of several formats would collide '
+                         'without format_subdir')
+    kws['format_subdir'] = format_subdir
+    for fmt in formats:
+        d = _format_dir(output_dir, fmt, format_subdir)
+        if not os.path.exists(d):
+            os.makedirs(d)
+
+    timings = resources.timings
+    # loaded before the workers are forked
+    resources.preload(formats)
+
+    if 'timeline' in formats and n_jobs > 1:
+        # Mallet inference cannot run in several workers at once,
+        # so the event topics of all pickles are inferred here
+        start = datetime.now()
+        prefetch_event_topics(
+            [t for path in candidate_tree_paths
+             for t in k_best_trees(pkl.load(open(path)), kws.get('k', 10))],
+            resources.summary_kws
+        )
+        _add_secs(timings, 'topics_prefetch', start)
+
+    output_paths = []
+    if meta_info:
+        start = datetime.now()
+        paths = [os.path.join(output_dir, 'id2interactions.json'),
+                 os.path.join(output_dir, 'id2people.json')]
+        dump_meta_info_to_json.run(resources.id2interaction,
+                                   resources.id2people,
+                                   *paths)
+        _add_secs(timings, 'dump:meta_info', start)
+        output_paths += paths
+
+    tasks = [(path, fmt)
+             for path in candidate_tree_paths
+             for fmt in formats]
+    if n_jobs == 1:
+        _init_worker(resources, output_dir, kws)
+        results = map(_dump_task, tasks)
+    else:
+        pool = Pool(n_jobs, initializer=_init_worker,
+                    initargs=(resources, output_dir, kws))
+        try:
+            results = pool.map(_dump_task, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+    for fmt, output_path, secs in results:
+        logger.info('written to {}'.format(output_path))
+        timings['dump:' + fmt] = timings.get('dump:' + fmt, 0) + secs
+        output_paths.append(output_path)
+    return output_paths
+
+
+def main():
+    import argparse
+    from pprint import pformat
+
+    parser = argparse.ArgumentParser(
+        'Dump many candidate tree pickles in several formats'
+    )
+    parser.add_argument('--candidate_tree_paths', nargs='+', required=True)
+    parser.add_argument('--formats', nargs='+', choices=FORMATS,
+                        default=['json'])
+    parser.add_argument('--output_dir', required=True)
+    parser.add_argument('--no_format_subdir', action='store_true',
+                        help='dump into output_dir directly(one format only)')
+    parser.add_argument('--interactions_path', required=True)
+    parser.add_argument('--people_path', required=True)
+    parser.add_argument('--corpus_dict_path')
+    parser.add_argument('--lda_model_path')
+    parser.add_argument('--people_repr_template', type=str,
+                        default="{id}")
+    parser.add_argument('--meta_info', action='store_true')
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--to_original_graph', action='store_true')
+    parser.add_argument('--undirected', action='store_true')
+    parser.add_argument('--freq', default='1h',
+                        help='time bin of nvd3 format')
+    parser.add_argument('--non_event_sample_n', type=int)
+    parser.add_argument('--n_jobs', type=int, default=1)
+
+    args = parser.parse_args()
+
+    resources = DumpResources(args.interactions_path,
+                              args.people_path,
+                              args.corpus_dict_path,
+                              args.lda_model_path,
+                              args.people_repr_template,
+                              undirected=args.undirected)
+    run(args.candidate_tree_paths, args.formats, args.output_dir,
+        resources,
+        meta_info=args.meta_info,
+        n_jobs=args.n_jobs,
+        format_subdir=not args.no_format_subdir,
+        k=args.k,
+        to_original_graph=args.to_original_graph,
+        freq=args.freq,
+        non_event_sample_n=args.non_event_sample_n)
+    logger.info('secs per stage:\n{}'.format(pformat(resources.timings)))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,24 +2,17 @@ import os
 import sys
 import ujson as json
 from events import detect_events_given_path
-from event_context import extract_event_context
+from event_context import EventContext
 from interactions import InteractionsUtil as IU
 from meta_graph import convert_to_original_graph
 
-from util import json_dump, load_json_by_line
+from util import load_json_by_line
 from viz_util import add_subgraph_specific_attributes_to_graph,\
-    to_d3_graph
+    dump_d3_graphs
 from experiment_util import get_output_path
 
 
-def run_with_context(interactions_path,
-                     candidate_tree_path,
-                     dirname=None,
-                     to_original_graph=False,
-                     undirected=False):
-    if not os.path.exists(dirname):
-        os.makedirs(dirname)
-
+def load_event_context(interactions_path, undirected=False):
     try:
         interactions = json.load(open(interactions_path))
     except ValueError as e:
@@ -28,32 +21,68 @@ def run_with_context(interactions_path,
 
     interactions = IU.clean_interactions(interactions,
                                          undirected=undirected)
+    # indexed once for all events
+    return EventContext(interactions, undirected=undirected)
 
-    output_path = get_output_path(candidate_tree_path, dirname)
-
-    K = 5
-    events = detect_events_given_path(candidate_tree_path, K)
 
-    contexted_events = []
+def contexted_events(event_context, events, to_original_graph=False):
+    """generator of the context graphs with the event marked"""
     for e in events:
-        context_dag = extract_event_context(
-            interactions, e,
-            undirected=undirected
-        )
+        context_dag = event_context.context(e)
 
         if to_original_graph:
             context_dag = convert_to_original_graph(context_dag)
             e = convert_to_original_graph(e)
 
-        contexted_events.append(
-            add_subgraph_specific_attributes_to_graph(
-                context_dag, [(e, {'event': True})])
-        )
-    d3_events = [to_d3_graph(ce)
-                 for ce in contexted_events]
-    
+        yield add_subgraph_specific_attributes_to_graph(
+            context_dag, [(e, {'event': True})])
+
+
+def dump_contexted_events(event_context,
+                          candidate_tree_path,
+                          dirname=None,
+                          to_original_graph=False,
+                          K=5):
+    if not os.path.exists(dirname):
+        os.makedirs(dirname)
+
+    output_path = get_output_path(candidate_tree_path, dirname)
+
+    events = detect_events_given_path(candidate_tree_path, K)
+
     print('writing to {}'.format(output_path))
-    json_dump(d3_events, output_path)
+    dump_d3_graphs(contexted_events(event_context, events,
+                                    to_original_graph),
+                   output_path)
+    return output_path
+
+
+def run_with_context(interactions_path,
+                     candidate_tree_path,
+                     dirname=None,
+                     to_original_graph=False,
+                     undirected=False):
+    return run_many_with_context(interactions_path,
+                                 [candidate_tree_path],
+                                 dirname=dirname,
+                                 to_original_graph=to_original_graph,
+                                 undirected=undirected)[0]
+
+
+def run_many_with_context(interactions_path,
+                          candidate_tree_paths,
+                          dirname=None,
+                          to_original_graph=False,
+                          undirected=False):
+    """`run_with_context` over several result pickles,
+    sharing the loaded interactions
+    """
+    event_context = load_event_context(interactions_path, undirected)
+    return [dump_contexted_events(event_context, path,
+                                  dirname=dirname,
+                                  to_original_graph=to_original_graph)
+            for path in candidate_tree_paths]
+
 
 if __name__ == '__main__':
     import argparse
@@ -62,6 +91,7 @@ if __name__ == '__main__':
                         required=True
                     )
     parser.add_argument('--candidate_tree_path',
+                        nargs='+',
                         required=True
     )
     parser.add_argument('--dirname')
@@ -78,8 +108,8 @@ if __name__ == '__main__':
         print('ERROR: to_original_graph not allowed for undirected')
         sys.exit(-1)
 
-    run_with_context(args.interactions_path,
-                     args.candidate_tree_path,
-                     args.dirname,
-                     args.to_original_graph,
-                     undirected=args.undirected)
+    run_many_with_context(args.interactions_path,
+                          args.candidate_tree_path,
+                          args.dirname,
+                          args.to_original_graph,
+                          undirected=args.undirected)
@@ -8,12 +8,35 @@ from events import detect_events_given_path
 from meta_graph import convert_to_original_graph
 from clustering import greedy_clustering_on_graph
 
-from util import json_dump
-from viz_util import to_d3_graph
+from viz_util import dump_d3_graphs
 from experiment_util import get_output_path
 from dag_util import get_roots
 
 
+def add_people_and_content(e, id2people, id2interaction):
+    root = get_roots(e)[0]
+    for n in e.nodes_iter():
+        e.node[n]['sender'] = id2people[e.node[n]['sender_id']]
+        e.node[n]['recipients'] = [id2people[id_]
+                                   for id_ in e.node[n]['recipient_ids']]
+        # print(id2interaction[n])
+        e.node[n]['subject'] = id2interaction[n]['subject']
+        e.node[n]['body'] = id2interaction[n]['body']
+
+        for f in ('retweet_count', 'favorite_count'):
+            e.node[n][f] = id2interaction[n].get(f)
+
+        e.node[n]['body'] = id2interaction[n]['body']
+        e.node[n]['root'] = (n == root)
+        e.node[n]['datetime'] = str(e.node[n]['datetime'])
+
+    # # some simple clustering
+    # assignment = greedy_clustering_on_graph(e)
+    # for n in e.nodes_iter():
+    #     e.node[n]['cluster_label'] = assignment[n]
+    return e
+
+
 def run(candidate_tree_path,
         k,
         id2people,
@@ -27,39 +50,28 @@ def run(candidate_tree_path,
     output_path = get_output_path(candidate_tree_path, dirname)
 
     events = detect_events_given_path(candidate_tree_path, k)
-    
-    # add people and content
-    for e in events:
-        root = get_roots(e)[0]
-        for n in e.nodes_iter():
-            e.node[n]['sender'] = id2people[e.node[n]['sender_id']]
-            e.node[n]['recipients'] = [id2people[id_]
-                                       for id_ in e.node[n]['recipient_ids']]
-            # print(id2interaction[n])
-            e.node[n]['subject'] = id2interaction[n]['subject']
-            e.node[n]['body'] = id2interaction[n]['body']
-
-            for f in ('retweet_count', 'favorite_count'):
-                e.node[n][f] = id2interaction[n].get(f)
-            
-            e.node[n]['body'] = id2interaction[n]['body']
-            e.node[n]['root'] = (n == root)
-            e.node[n]['datetime'] = str(e.node[n]['datetime'])
-
-        # # some simple clustering
-        # assignment = greedy_clustering_on_graph(e)
-        # for n in e.nodes_iter():
-        #     e.node[n]['cluster_label'] = assignment[n]
-            
+
+    # events are annotated and written one at a time
+    events = (add_people_and_content(e, id2people, id2interaction)
+              for e in events)
     if to_original_graph:
-        events = map(convert_to_original_graph,
-                     events)
-        # import pdb; pdb.set_trace()
+        events = (convert_to_original_graph(e) for e in events)
+
+    dump_d3_graphs(events, output_path)
+    return output_path
 
-    d3_events = [to_d3_graph(e)
-                 for e in events]
 
-    json_dump(d3_events, output_path)
+def run_many(candidate_tree_paths, k,
+             id2people, id2interaction,
+             dirname=None,
+             to_original_graph=False):
+    """`run` over several result pickles,
+    sharing the loaded `id2people` and `id2interaction`
+    """
+    return [run(path, k, id2people, id2interaction,
+                dirname=dirname,
+                to_original_graph=to_original_graph)
+            for path in candidate_tree_paths]
 
 
 if __name__ == '__main__':
@@ -69,6 +81,7 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser('Dump events to json')
     parser.add_argument('--candidate_tree_path',
                         '-p',
+                        nargs='+',
                         required=True
     )
     parser.add_argument('--dirname', '-d', required=True)
@@ -89,9 +102,9 @@ if __name__ == '__main__':
         print('ERROR: to_original_graph not allowed for undirected')
         sys.exit(-1)
 
-    run(args.candidate_tree_path,
-        args.k,
-        load_id2obj_dict(args.people_path, 'id'),
-        load_id2obj_dict(args.interactions_path, 'message_id'),
-        args.dirname,
-        args.to_original_graph)
+    run_many(args.candidate_tree_path,
+             args.k,
+             load_id2obj_dict(args.people_path, 'id'),
+             load_id2obj_dict(args.interactions_path, 'message_id'),
+             args.dirname,
+             args.to_original_graph)
@@ -6,29 +6,20 @@ from datetime import datetime as dt
 from check_k_best_trees import k_best_trees
 
 
-def main():
-    import argparse
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--result_path')
-    parser.add_argument('--interactions_path')
-    parser.add_argument('--output_path')
-    parser.add_argument('--non_event_sample_n', type=int)
-    parser.add_argument('--freq')
-    parser.add_argument('--k', type=int)
-
-    args = parser.parse_args()
-    result = pkl.load(open(args.result_path))
-    trees = k_best_trees(result, args.k)
+def load_interactions_df(path):
     try:
-        df = pd.read_json(args.interactions_path)
+        return pd.read_json(path)
     except ValueError:
-        df = pd.read_pickle(args.interactions_path)
+        return pd.read_pickle(path)
+
 
+def run(trees, df, freq, non_event_sample_n=None):
+    """event and non-event message counts per `freq`"""
     # for enron:
     # df = df[df['datetime'] > dt(2000, 6, 1)]
     
     timestamps = df.groupby(
-        pd.Grouper(key='datetime', freq=args.freq)
+        pd.Grouper(key='datetime', freq=freq)
     )['message_id'].count().index
     
     values = lambda counts: [{'ts': ts.value/1000000,
@@ -39,7 +30,7 @@ def main():
     for i, t in enumerate(trees):
         nids = set(t.nodes())
         event_df = df[df['message_id'].apply(lambda m: m in nids)]
-        groups = event_df.groupby(pd.Grouper(key='datetime', freq=args.freq))
+        groups = event_df.groupby(pd.Grouper(key='datetime', freq=freq))
         counts = groups['message_id'].count()
         
         data.append({
@@ -51,14 +42,33 @@ def main():
 
     df = df[df['message_id'].map(lambda m: m not in event_nodes)]
 
-    if args.non_event_sample_n:
-        df = df.sample(n=args.non_event_sample_n)
+    if non_event_sample_n:
+        df = df.sample(n=non_event_sample_n)
 
-    counts = df.groupby(pd.Grouper(key='datetime', freq=args.freq))['message_id'].count()
+    counts = df.groupby(pd.Grouper(key='datetime', freq=freq))['message_id'].count()
     data.append({
         'key': 'non-event',
         'values': values(counts)
     })
+    return data
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--result_path')
+    parser.add_argument('--interactions_path')
+    parser.add_argument('--output_path')
+    parser.add_argument('--non_event_sample_n', type=int)
+    parser.add_argument('--freq')
+    parser.add_argument('--k', type=int)
+
+    args = parser.parse_args()
+    result = pkl.load(open(args.result_path))
+    trees = k_best_trees(result, args.k)
+    df = load_interactions_df(args.interactions_path)
+
+    data = run(trees, df, args.freq, args.non_event_sample_n)
     # print(data)
     json.dump(data, open(args.output_path, 'w'))
 
@@ -6,20 +6,8 @@ from datetime import datetime as dt
 from check_k_best_trees import k_best_trees
 
 
-def main():
-    import argparse
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--result_path')
-    parser.add_argument('--interactions_path')
-    parser.add_argument('--output_path')
-    parser.add_argument('--non_event_sample_n', type=int)
-    parser.add_argument('--k', type=int)
-
-    args = parser.parse_args()
-    result = pkl.load(open(args.result_path))
-    trees = k_best_trees(result, args.k)
-    df = pd.read_json(args.interactions_path)
-    
+def run(trees, df, non_event_sample_n=None):
+    """datetime of each event and non-event message"""
     dt_format = '%Y-%m-%dT%H:%M:%S.000Z'
 
     data = []
@@ -43,11 +31,11 @@ def main():
     # for baltimore
     # df = df[df['datetime'] >= dt(2015, 4, 27)]
 
-    if args.non_event_sample_n:
+    if non_event_sample_n:
         print df.shape
         df = df[df['message_id'].map(lambda m: m not in event_nodes)]
 
-        df = df.sample(n=args.non_event_sample_n)
+        df = df.sample(n=non_event_sample_n)
         print df.shape
 
     for i, r in df.iterrows():
@@ -63,7 +51,24 @@ def main():
         else:
             # print "drop"
             pass
+    return data
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--result_path')
+    parser.add_argument('--interactions_path')
+    parser.add_argument('--output_path')
+    parser.add_argument('--non_event_sample_n', type=int)
+    parser.add_argument('--k', type=int)
+
+    args = parser.parse_args()
+    result = pkl.load(open(args.result_path))
+    trees = k_best_trees(result, args.k)
+    df = pd.read_json(args.interactions_path)
 
+    data = run(trees, df, args.non_event_sample_n)
     json.dump(data, open(args.output_path, 'w'))
 
 if __name__ == '__main__':
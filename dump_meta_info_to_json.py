@@ -1,6 +1,12 @@
 from util import load_id2obj_dict, json_dump
 
 
+def run(id2interaction, id2people,
+        interactions_output_path, people_output_path):
+    json_dump(id2interaction, interactions_output_path)
+    json_dump(id2people, people_output_path)
+
+
 def main():
     import argparse
 
@@ -16,14 +22,10 @@ def main():
                         required=True)
     args = parser.parse_args()
 
-    json_dump(
-        load_id2obj_dict(args.interactions_path, 'message_id'),
-        args.interactions_output_path
-    )
-    json_dump(
+    run(load_id2obj_dict(args.interactions_path, 'message_id'),
         load_id2obj_dict(args.people_path, 'id'),
-        args.people_output_path
-    )
+        args.interactions_output_path,
+        args.people_output_path)
 
 
 if __name__ == '__main__':
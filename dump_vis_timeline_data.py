@@ -1,5 +1,6 @@
 from check_k_best_trees import k_best_trees
-from meta_graph_stat import MetaGraphStat, build_default_summary_kws_from_path
+from meta_graph_stat import build_default_summary_kws_from_path,\
+    summarize_events, use_interaction_index
 from datetime import datetime
 from collections import Counter
 
@@ -11,14 +12,20 @@ def format_time(dt):
         return datetime.strftime(dt, '%Y-%m-%d %H:%M:%S')
 
 
-def run(cand_trees, k, summary_kws, undirected):
-    interactions = summary_kws['topics']['interactions']
-    mid2i = {
-        i['message_id']: i
-        for i in interactions
-    }
+def with_hashtags(trees, summary_kws):
+    """`summary_kws` plus hashtags if the trees have them"""
+    first_node = trees[0].nodes()[0]
+    if 'hashtags' in trees[0].node[first_node]:
+        summary_kws = dict(summary_kws, hashtags={})
+    return summary_kws
+
+
+def run(cand_trees, k, summary_kws, undirected, n_jobs=1, timings=None):
+    summary_kws = use_interaction_index(summary_kws)
+    mid2i = summary_kws['topics']['interactions']
     trees = k_best_trees(cand_trees, k)
-    summaries = [MetaGraphStat(t, summary_kws).summary_dict() for t in trees]
+    summaries = list(summarize_events(trees, summary_kws, n_jobs=n_jobs,
+                                      timings=timings))
 
     items = []
     groups = []
@@ -94,6 +101,7 @@ def main():
                         default="{id}")
     parser.add_argument('-k', type=int, default=10)
     parser.add_argument('--undirected', default=False, action="store_true")
+    parser.add_argument('--n_jobs', type=int, default=1)
 
     args = parser.parse_args()
     
@@ -103,21 +111,23 @@ def main():
         args.corpus_dict_path,
         args.lda_model_path,
         args.people_repr_template,
-        undirected=args.undirected
+        undirected=args.undirected,
+        cache_event_topics=True
     )
     trees = pkl.load(open(args.cand_trees_path))
     
     # add hashtags if there
     print(len(trees))
-    first_node = trees[0].nodes()[0]
-    if 'hashtags' in trees[0].node[first_node]:
-        print('add hashtags')
-        summary_kws['hashtags'] = {}
+    summary_kws = with_hashtags(trees, summary_kws)
 
+    timings = {}
     data = run(trees,
                args.k,
                summary_kws,
-               args.undirected)
+               args.undirected,
+               n_jobs=args.n_jobs,
+               timings=timings)
+    print('summary secs per section: {}'.format(timings))
     json_dump(data, args.output_path)
     
 
@@ -1,7 +1,10 @@
 import sys
 import numpy as np
+import scipy.sparse as sp
 from itertools import chain
 from sklearn import metrics
+from sklearn.metrics.cluster.expected_mutual_info_fast import \
+    expected_mutual_information
 
 from tree_util import salzburg_ted, tree_similarity_ratio
 
@@ -60,6 +63,145 @@ def evaluate_clustering_result(
     return metric(true_labels, pred_labels)
     
 
+def cluster_contingency(true_clusters, pred_clusters, all_entry_ids):
+    """
+    Sparse contingency table of the entries(0 for no cluster) by
+    (true label, pred label), built in one pass.
+
+    Entries of the true clusters are the rows with true label > 0,
+    so the `true_only` table is the same one without row 0.
+    Return (all, true_only)
+    """
+    true_entries = set(chain(*true_clusters))
+    all_entries = set(all_entry_ids)
+    entries = all_entries | true_entries
+    entry2index = {e: i for i, e in enumerate(entries)}
+
+    def labels(clusters):
+        arr = np.zeros(len(entries), dtype=np.int64)
+        for label, clst in enumerate(clusters, 1):
+            arr[[entry2index[e] for e in clst if e in entry2index]] = label
+        return arr
+
+    true_labels = labels(true_clusters)
+    pred_labels = labels(pred_clusters)
+
+    def table(rows, cols):
+        return sp.coo_matrix(
+            (np.ones(len(rows), dtype=np.int64), (rows, cols)),
+            shape=(len(true_clusters) + 1, len(pred_clusters) + 1)
+        ).tocsr()  # duplicates are summed
+
+    if true_entries <= all_entries:
+        all_table = table(true_labels, pred_labels)
+        true_only_table = all_table[1:]
+    else:
+        # true entries that are not in `all_entry_ids`
+        in_all = np.array([e in all_entries for e in entries], dtype=bool)
+        all_table = table(true_labels[in_all], pred_labels[in_all])
+        in_true = true_labels > 0
+        true_only_table = table(true_labels[in_true],
+                                pred_labels[in_true])[1:]
+    return all_table, true_only_table
+
+
+def _comb2(x):
+    return x * (x - 1) / 2.
+
+
+def _entropy(counts, n):
+    p = counts / float(n)
+    return -np.sum(p * np.log(p))
+
+
+def scores_from_contingency(contingency):
+    """
+    The clustering metrics of `sklearn.metrics`(adjusted_rand_score,
+    adjusted_mutual_info_score, homogeneity_score, completeness_score
+    and v_measure_score) from one contingency table
+    """
+    contingency = sp.coo_matrix(contingency)
+    contingency.sum_duplicates()
+    contingency.eliminate_zeros()
+    rows, cols = contingency.row, contingency.col
+    nij = contingency.data.astype(np.float64)
+    a = np.asarray(contingency.sum(axis=1), dtype=np.float64).ravel()
+    b = np.asarray(contingency.sum(axis=0), dtype=np.float64).ravel()
+    n = a.sum()
+    n_classes = np.count_nonzero(a)
+    n_clusters = np.count_nonzero(b)
+
+    if (n_classes == n_clusters == 1 or
+            n_classes == n_clusters == 0 or
+            n_classes == n_clusters == n):
+        ari = 1.0
+    else:
+        sum_comb_k = _comb2(a).sum()
+        sum_comb = _comb2(b).sum()
+        expected = sum_comb_k * sum_comb / _comb2(n)
+        ari = ((_comb2(nij).sum() - expected) /
+               ((sum_comb_k + sum_comb) / 2. - expected))
+
+    h_true = _entropy(a[a > 0], n)
+    h_pred = _entropy(b[b > 0], n)
+    mi = np.sum(nij / n * (np.log(nij) + np.log(n) -
+                           np.log(a[rows]) - np.log(b[cols])))
+
+    homogeneity = mi / h_true if h_true else 1.0
+    completeness = mi / h_pred if h_pred else 1.0
+    if homogeneity + completeness == 0:
+        v_measure = 0.
+    else:
+        v_measure = (2. * homogeneity * completeness /
+                     (homogeneity + completeness))
+
+    if n_classes == n_clusters == 1 or n_classes == n_clusters == 0:
+        ami = 1.0
+    else:
+        dense = contingency.toarray()[np.flatnonzero(a)][:, np.flatnonzero(b)]
+        emi = expected_mutual_information(dense, int(n))
+        ami = (mi - emi) / (max(h_true, h_pred) - emi)
+
+    return {
+        'adjusted_rand_score': ari,
+        'adjusted_mutual_info_score': ami,
+        'homogeneity_score': homogeneity,
+        'completeness_score': completeness,
+        'v_measure_score': v_measure
+    }
+
+
+def evaluate_clustering_results(true_clusters, pred_clusters,
+                                all_entry_ids, methods):
+    """
+    `evaluate_clustering_result` of each method with
+    `true_only` on and off(suffixed by "(all)"),
+    sklearn metrics are derived from one contingency table
+    """
+    if not methods:
+        return {}
+    tables = cluster_contingency(true_clusters, pred_clusters,
+                                 all_entry_ids)
+    all_scores = scores_from_contingency(tables[0])
+    true_only_scores = scores_from_contingency(tables[1])
+
+    scores = {}
+    for m in methods:
+        name = m.__name__
+        if name in all_scores:
+            scores[name] = true_only_scores[name]
+            scores[name + "(all)"] = all_scores[name]
+        else:
+            for true_only in (True, False):
+                scores[name + ("" if true_only else "(all)")] = \
+                    evaluate_clustering_result(
+                        true_clusters, pred_clusters,
+                        all_entry_ids,
+                        m,
+                        true_only)
+    return scores
+
+
 def events2clusters(events):
     return [[i['message_id'] for i in e]for e in events]
 
@@ -78,16 +220,9 @@ def evaluate_meta_tree_result(
     true_clusters = trees2clusters(true_events)
     pred_clusters = trees2clusters(pred_events)
     
-    for m in methods:
-        for true_only in (True, False):
-            name = m.__name__
-            if not true_only:
-                name += "(all)"
-            scores[name] = evaluate_clustering_result(
-                true_clusters, pred_clusters,
-                all_entry_ids,
-                m,
-                true_only)
+    scores.update(evaluate_clustering_results(
+        true_clusters, pred_clusters, all_entry_ids, methods
+    ))
     p, r, f1 = precision_recall_f1(true_clusters, pred_clusters)
 
     scores['precision'] = p
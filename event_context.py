@@ -1,22 +1,92 @@
+# Context of events: the meta graph over all interactions
+# that happen within the time span of the event
+#
+# `EventContext` sorts the interactions by time once,
+# so each window is found by binary search.
+# The context graph is taken from the full meta graph if given,
+# otherwise built from the window(cleaned already) and cached.
+
+import bisect
+import networkx as nx
+
 from datetime import datetime
 from meta_graph_stat import MetaGraphStat
 from interactions import InteractionsUtil as IU
 
 
+def _copy_subgraph(g, nodes):
+    """subgraph of `g` with its own attribute dicts,
+    so that callers can annotate it
+    """
+    nodes = set(nodes)
+    sub_g = nx.DiGraph()
+    sub_g.add_nodes_from((n, dict(g.node[n])) for n in nodes)
+    sub_g.add_edges_from((s, t, dict(d))
+                         for s in nodes
+                         for t, d in g[s].iteritems()
+                         if t in nodes)
+    return sub_g
+
+
+class EventContext(object):
+    """
+    interactions: cleaned interactions with datetime
+    meta_graph: meta graph over all `interactions`, built by
+        `IU.get_meta_graph` without prepruning and decomposition.
+        If None, the graph of each window is built from the window only
+    """
+    def __init__(self, interactions, undirected=False, meta_graph=None):
+        self.interactions = sorted(interactions, key=lambda i: i['datetime'])
+        self.times = []
+        for i in self.interactions:
+            assert 'datetime' in i
+            assert isinstance(i['datetime'], datetime)
+            self.times.append(i['datetime'])
+        self.undirected = undirected
+        self.meta_graph = meta_graph
+        # (lo, hi) -> window meta graph
+        self._window_graphs = {}
+
+    def window_bounds(self, start, end):
+        """offsets of interactions within [start, end]"""
+        return (bisect.bisect_left(self.times, start),
+                bisect.bisect_right(self.times, end))
+
+    def window(self, start, end):
+        lo, hi = self.window_bounds(start, end)
+        return self.interactions[lo:hi]
+
+    def _window_graph(self, lo, hi):
+        key = (lo, hi)
+        if key not in self._window_graphs:
+            self._window_graphs[key] = IU.get_meta_graph_from_cleaned(
+                self.interactions[lo:hi],
+                undirected=self.undirected,
+                remove_singleton=True
+            )
+        return self._window_graphs[key]
+
+    def context(self, event_tree):
+        span = MetaGraphStat(event_tree).time_span()
+        lo, hi = self.window_bounds(span['start_time'], span['end_time'])
+
+        if self.meta_graph is not None:
+            # edges only depend on the two ends,
+            # so the window graph is the induced subgraph
+            # minus those connected outside the window only
+            g = self.meta_graph
+            nodes = [i['message_id'] for i in self.interactions[lo:hi]
+                     if i['message_id'] in g]
+            context_dag = _copy_subgraph(g, nodes)
+            context_dag.remove_nodes_from(
+                [n for n in context_dag.nodes()
+                 if context_dag.degree(n) == 0]
+            )
+            return context_dag
+        else:
+            g = self._window_graph(lo, hi)
+            return _copy_subgraph(g, g.nodes_iter())
+
+
 def extract_event_context(interactions, event_tree, undirected=False):
-    span = MetaGraphStat(event_tree).time_span()
-    start = span['start_time']
-    end = span['end_time']
-    
-    filtered_interactions = []
-    for i in interactions:
-        assert 'datetime' in i
-        dt = i['datetime']
-        assert isinstance(dt, datetime)
-        if dt >= start and dt <= end:
-            filtered_interactions.append(i)
-    context_dag = IU.get_meta_graph(filtered_interactions,
-                                    decompose_interactions=False,
-                                    remove_singleton=True,
-                                    undirected=undirected)
-    return context_dag
+    return EventContext(interactions, undirected).context(event_tree)
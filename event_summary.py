@@ -1,14 +1,22 @@
 from tabulate import tabulate
 
-from meta_graph_stat import MetaGraphStat
+from meta_graph_stat import summarize_events
 
 
-def summary(events, tablefmt, summary_kws):
+def summary(events, tablefmt, summary_kws, interaction_index=None,
+            n_jobs=1, timings=None):
+    """
+    interaction_index: `interaction_index.InteractionIndex` shared by
+    all events, built from `summary_kws` once if not given
+    n_jobs, timings: see `meta_graph_stat.summarize_events`
+    """
     date_format = '%Y-%m-%d'
-    
+
     table = []
-    for i, e in enumerate(events):
-        d = MetaGraphStat(e, summary_kws).summary_dict()
+    for i, d in enumerate(summarize_events(
+            events, summary_kws, n_jobs=n_jobs,
+            interaction_index=interaction_index,
+            timings=timings)):
         row = ["**#{},**".format(i+1),
                d['basic_structure_stats']['#nodes'],
                "{} {}".format(
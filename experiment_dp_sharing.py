@@ -0,0 +1,100 @@
+# Reuse rate and speedup of sharing lst_dag DP tables across roots
+# for cand_n_percent=1.0 runs(every node is taken as root)
+
+import cPickle as pkl
+
+from scipy.spatial.distance import cosine
+
+from lst import lst_dag, LstMemo
+from gen_candidate_trees import run
+from interactions import InteractionsUtil as IU
+from util import parse_time_delta
+
+
+def tree_rewards(trees):
+    return [sum(t.node[n][IU.VERTEX_REWARD_KEY] for n in t.nodes_iter())
+            for t in trees]
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        'Compare lst_dag with and without shared DP tables'
+    )
+    parser.add_argument('--interaction_path', required=True)
+    parser.add_argument('--msg_ids_path', required=True)
+    parser.add_argument('--lda_path', required=True)
+    parser.add_argument('--corpus_dict_path', required=True)
+    parser.add_argument('--meta_graph_path_prefix', required=True)
+    parser.add_argument('--result_prefix', default='tmp/dp-sharing-')
+    parser.add_argument('--max_time_distance', required=True)
+    parser.add_argument('--max_time_span', required=True)
+    parser.add_argument('--U', type=float, default=0.5)
+    parser.add_argument('--fixed_point', type=int, default=1)
+    parser.add_argument('--dp_memo_size', type=int, default=100000)
+    parser.add_argument('--cand_n_percent', type=float, default=1.0)
+    parser.add_argument('--given_topics', action='store_true')
+    parser.add_argument('--not_convert_time', action='store_true')
+    args = parser.parse_args()
+
+    results = {}
+    for name in ('no_sharing', 'sharing'):
+        if name == 'sharing':
+            memo = LstMemo(args.dp_memo_size)
+        else:
+            memo = None
+
+        def lst(g, r, U):
+            return lst_dag(g, r, U,
+                           edge_weight_decimal_point=args.fixed_point,
+                           debug=False,
+                           memo=memo)
+
+        paths = run(lst,
+                    msg_ids_path=args.msg_ids_path,
+                    root_sampling_method='upperbound',
+                    interaction_path=args.interaction_path,
+                    lda_model_path=args.lda_path,
+                    corpus_dict_path=args.corpus_dict_path,
+                    meta_graph_pkl_path_prefix=args.meta_graph_path_prefix,
+                    cand_tree_percent=args.cand_n_percent,
+                    result_pkl_path_prefix=args.result_prefix + name,
+                    all_paths_pkl_prefix=args.result_prefix + name,
+                    meta_graph_kws={
+                        'dist_func': cosine,
+                        'preprune_secs': parse_time_delta(
+                            args.max_time_distance),
+                        'distance_weights': {'topics': 1.0},
+                    },
+                    gen_tree_kws={
+                        'timespan': parse_time_delta(args.max_time_span),
+                        'U': args.U,
+                        'dijkstra': False
+                    },
+                    given_topics=args.given_topics,
+                    convert_time=not args.not_convert_time,
+                    should_binarize_dag=True,
+                    deterministic_binarization=True)
+        trees = pkl.load(open(paths['result']))
+        # tree generation only, the meta graph is built in the first run
+        results[name] = {'secs': sum(t.graph['calculation_time']
+                                     for t in trees),
+                         'rewards': tree_rewards(trees),
+                         'memo': memo}
+
+    print('#trees: {}'.format(len(results['sharing']['rewards'])))
+    print('same tree rewards: {}'.format(
+        results['sharing']['rewards'] == results['no_sharing']['rewards']))
+    memo = results['sharing']['memo']
+    print('reuse rate: {:.3f} ({} hits, {} misses, {} tables kept)'.format(
+        memo.reuse_rate, memo.n_hits, memo.n_misses, len(memo)))
+    print('time without sharing: {:.2f} secs'.format(
+        results['no_sharing']['secs']))
+    print('time with sharing: {:.2f} secs'.format(
+        results['sharing']['secs']))
+    print('speedup: {:.2f}x'.format(
+        results['no_sharing']['secs'] / results['sharing']['secs']))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,13 +2,13 @@ import os
 import re
 import ujson as json
 import numpy as np
-import networkx as nx
 import cPickle as pkl
 from datetime import timedelta
 import random
 
 from interactions import InteractionsUtil
 from dag_util import binarize_dag
+from compact_meta_graph import load_meta_graph
 
 
 def sample_nodes(g, node_sample_size=100):
@@ -30,20 +30,38 @@ def weighted_choice(choices):
     assert False, "Shouldn't get here"
 
 
+def weighted_sample_without_replacement(weights, k, random_state=None):
+    """
+    Indices of `k` items sampled without replacement,
+    with probability proportional to `weights`, in the order of drawing.
+
+    Efraimidis-Spirakis: the k items with the largest keys u^(1/w),
+    compared as log(u) / w. Items of zero weight are never drawn.
+
+    random_state: `np.random.RandomState`, the global one if None
+    """
+    rng = np.random if random_state is None else random_state
+    weights = np.asarray(weights, dtype=np.float64)
+    candidates = np.flatnonzero(weights > 0)
+    k = min(k, len(candidates))
+    if k == 0:
+        return np.array([], dtype=np.int64)
+
+    keys = np.log(rng.random_sample(len(candidates))) / weights[candidates]
+    top = np.argpartition(-keys, k - 1)[:k]
+    return candidates[top[np.argsort(-keys[top])]]
+
+
 def sample_nodes_by_weight(g, weight_func, node_sample_size=100):
-    choices = set(
-        [(n, weight_func(n))
-         for n in g.nodes_iter() if weight_func(n) > 0]
-    )
-    samples = []
-    if node_sample_size >= len(choices):
-        return g.nodes()
+    nodes = g.nodes()
+    weights = np.fromiter((weight_func(n) for n in nodes),
+                          dtype=np.float64, count=len(nodes))
+    if node_sample_size >= np.count_nonzero(weights > 0):
+        return nodes
     else:
-        while len(samples) < node_sample_size:
-            c, w = weighted_choice(choices)
-            samples.append(c)
-            choices.remove((c, w))
-        return samples
+        return [nodes[i]
+                for i in weighted_sample_without_replacement(
+                        weights, node_sample_size)]
 
 
 def sample_nodes_by_out_degree(g, node_sample_size=100):
@@ -58,7 +76,7 @@ def sample_rooted_binary_graphs_within_timespan(
         sample_number,
         timespan,
         output_path):
-    g = nx.read_gpickle(meta_graph_pickle_path)
+    g = load_meta_graph(meta_graph_pickle_path, features=())
     roots = sample_nodes(g, sample_number)
     results = []
     for i, r in enumerate(roots):
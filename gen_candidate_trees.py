@@ -2,26 +2,32 @@ import os
 import gensim
 import cPickle as pickle
 import networkx as nx
-import ujson as json
 import copy
 import logging
 
 from pprint import pprint
+from memory_profiler import memory_usage
 from datetime import timedelta, datetime
 from scipy.spatial.distance import euclidean, cosine
 
 from dag_util import unbinarize_dag, binarize_dag, remove_edges_via_dijkstra
-from lst import lst_dag, make_variance_cost_func, dp_dag_general
+from lst import lst_dag, make_variance_cost_func, dp_dag_general, LstMemo, \
+    lst_dag_compact
 from interactions import InteractionsUtil as IU
 from meta_graph_stat import MetaGraphStat
+from token_cache import TokenCache
+from topic_cache import TopicMatrix
+from compact_meta_graph import save_compact_meta_graph, load_meta_graph, \
+    COMPACT_SUFFIX
 from experiment_util import experiment_signature,\
     get_number_and_percentage
-from util import load_json_by_line, parse_time_delta
+from meta_graph_cache import MetaGraphCache, CachedMetaGraphBuilder
+from util import load_interactions, parse_time_delta
 from baselines import random_grow, greedy_grow_by_discounted_reward, \
     greedy_grow, greedy_grow_numpy
 from budget_problem import binary_search_using_charikar
 from sampler import RandomSampler, UBSampler, AdaptiveSampler, \
-    DeterministicSampler
+    DeterministicSampler, WeightedSampler
 
 logging.basicConfig(format="%(asctime)s;%(levelname)s;%(message)s",
                     datefmt="%Y-%m-%d %H:%M:%S")
@@ -47,7 +53,8 @@ def calc_tree(node_i, r, dag, U,
               gen_tree_func,
               gen_tree_kws,
               print_summary,
-              should_binarize_dag=False):
+              should_binarize_dag=False,
+              deterministic_binarization=False):
     print('root', r)
     logger.info('nodes procssed {}'.format(node_i))
     if len(dag.edges()) == 0:
@@ -69,7 +76,8 @@ def calc_tree(node_i, r, dag, U,
         dag = binarize_dag(dag,
                            IU.VERTEX_REWARD_KEY,
                            IU.EDGE_COST_KEY,
-                           dummy_node_name_prefix="d_")
+                           dummy_node_name_prefix="d_",
+                           deterministic=deterministic_binarization)
 
     logger.debug('generating tree ')
 
@@ -96,6 +104,80 @@ def calc_tree(node_i, r, dag, U,
     return tree
 
 
+def build_meta_graph(interaction_path, msg_ids_path,
+                     lda_model_path, corpus_dict_path,
+                     meta_graph_pkl_path_prefix, meta_graph_pkl_suffix,
+                     meta_graph_kws, convert_time, calculate_graph,
+                     given_topics, token_cache, load_topic_matrix,
+                     meta_graph_format):
+    """meta graph cached at a path made of `experiment_signature`
+    (callables are ignored and timedeltas are rounded to days)
+    """
+    meta_graph_pkl_path = "{}--{}{}{}".format(
+        meta_graph_pkl_path_prefix,
+        experiment_signature(**meta_graph_kws),
+        meta_graph_pkl_suffix,
+        COMPACT_SUFFIX if meta_graph_format == 'compact' else '.pkl'
+    )
+    logger.info('meta_graph_pkl_path: {}'.format(meta_graph_pkl_path))
+
+    if calculate_graph or not os.path.exists(meta_graph_pkl_path):
+        # we want to calculate the graph or
+        # it's not there so we have to
+        logger.info('calculating meta_graph...')
+        interactions = load_interactions(interaction_path)
+
+        logger.info('loading lda from {}'.format(lda_model_path))
+        if not given_topics:
+            lda_model = gensim.models.wrappers.LdaMallet.load(
+                os.path.join(CURDIR, lda_model_path)
+            )
+            dictionary = gensim.corpora.dictionary.Dictionary.load(
+                os.path.join(CURDIR, corpus_dict_path)
+            )
+        else:
+            lda_model = None
+            dictionary = None
+
+        meta_graph_kws_copied = copy.deepcopy(meta_graph_kws)
+        with open(msg_ids_path) as f:
+            msg_ids = [l.strip() for l in f]
+
+        if isinstance(meta_graph_kws_copied['preprune_secs'], timedelta):
+            meta_graph_kws_copied['preprune_secs'] = meta_graph_kws['preprune_secs'].total_seconds()
+
+        g = IU.get_topic_meta_graph(
+            interactions,
+            msg_ids=msg_ids,
+            lda_model=lda_model,
+            dictionary=dictionary,
+            undirected=False,  # deprecated
+            given_topics=given_topics,
+            decompose_interactions=False,
+            convert_time=convert_time,
+            token_cache=token_cache,
+            topic_matrix=load_topic_matrix(lda_model, msg_ids),
+            **meta_graph_kws_copied
+        )
+
+        if meta_graph_format == 'compact':
+            logger.info('saving in compact format...')
+            save_compact_meta_graph(
+                IU.compactize_meta_graph(g, map_nodes=False),
+                meta_graph_pkl_path
+            )
+        else:
+            logger.info('pickling...')
+            nx.write_gpickle(
+                IU.compactize_meta_graph(g, map_nodes=False),
+                meta_graph_pkl_path
+            )
+    else:
+        logger.info('loading meta graph...')
+        g = load_meta_graph(meta_graph_pkl_path, features=('topics', ))
+    return g, meta_graph_pkl_path
+
+
 def run(gen_tree_func,
         msg_ids_path,
         root_sampling_method='random',
@@ -128,74 +210,83 @@ def run(gen_tree_func,
         calculate_graph=False,
         given_topics=False,
         print_summary=False,
-        should_binarize_dag=False):
+        should_binarize_dag=False,
+        token_cache_dir=None,
+        n_jobs=1,
+        topic_matrix_path=None,
+        meta_graph_format='gpickle',
+        meta_graph_cache_dir=None,
+        deterministic_binarization=False,
+        report_memory=False):
+    """
+    token_cache_dir: if given, message tokens and BoW are cached there
+    and shared across meta graph builds(e.g, different `preprune_secs`)
+    topic_matrix_path: if given, document topics of the LDA model are
+    stored there once as a memory-mapped matrix
+    meta_graph_format: 'gpickle' or 'compact'(see `compact_meta_graph`)
+    meta_graph_cache_dir: if given, meta graph stages are cached there
+    by content hash of the inputs and parameters(see `meta_graph_cache`),
+    `meta_graph_pkl_path_prefix` and `meta_graph_pkl_suffix` are ignored
+    deterministic_binarization: required when `gen_tree_func` shares
+    DP tables across roots(`lst_dag` with `LstMemo`)
+    report_memory: if True, peak memory(MB) of each tree computation
+    is stored in `tree.graph['peak_memory_mb']`
+    """
+    if deterministic_binarization:
+        assert not gen_tree_kws.get('dijkstra'), \
+            'DP tables cannot be shared if edges are removed per root'
+
     if isinstance(gen_tree_kws['timespan'], timedelta):
         timespan = gen_tree_kws['timespan'].total_seconds()
     else:
         timespan = gen_tree_kws['timespan']
     U = gen_tree_kws['U']
         
-    if interaction_path.endswith(".json"):
-        try:
-            interactions = json.load(open(interaction_path))
-        except ValueError:
-            interactions = load_json_by_line(interaction_path)
-    elif interaction_path.endswith(".pkl"):
-        interactions = pickle.load(open(interaction_path))
+    if token_cache_dir:
+        token_cache = TokenCache(token_cache_dir, n_jobs=n_jobs)
     else:
-        raise ValueError("invalid path extension: {}".format(interaction_path))
+        token_cache = None
 
-
-    logger.info('loading lda from {}'.format(lda_model_path))
-    if not given_topics:
-        lda_model = gensim.models.wrappers.LdaMallet.load(
-            os.path.join(CURDIR, lda_model_path)
-        )
-        dictionary = gensim.corpora.dictionary.Dictionary.load(
-            os.path.join(CURDIR, corpus_dict_path)
+    def load_topic_matrix(lda_model, msg_ids):
+        if topic_matrix_path and not given_topics:
+            return TopicMatrix.load_or_build(
+                topic_matrix_path, lda_model, msg_ids
+            )
+        else:
+            return None
+
+    if meta_graph_cache_dir:
+        if not given_topics:
+            lda_model_path = os.path.join(CURDIR, lda_model_path)
+            corpus_dict_path = os.path.join(CURDIR, corpus_dict_path)
+        builder = CachedMetaGraphBuilder(
+            MetaGraphCache(meta_graph_cache_dir),
+            interaction_path,
+            msg_ids_path=msg_ids_path,
+            lda_model_path=lda_model_path,
+            corpus_dict_path=corpus_dict_path,
+            given_topics=given_topics,
+            token_cache=token_cache,
+            topic_matrix_loader=load_topic_matrix
         )
-    else:
-        lda_model = None
-        dictionary = None
-
-    meta_graph_pkl_path = "{}--{}{}.pkl".format(
-        meta_graph_pkl_path_prefix,
-        experiment_signature(**meta_graph_kws),
-        meta_graph_pkl_suffix
-    )
-    logger.info('meta_graph_pkl_path: {}'.format(meta_graph_pkl_path))
-
-    if calculate_graph or not os.path.exists(meta_graph_pkl_path):
-        # we want to calculate the graph or
-        # it's not there so we have to
-        logger.info('calculating meta_graph...')
-        meta_graph_kws_copied = copy.deepcopy(meta_graph_kws)
-        with open(msg_ids_path) as f:
-            msg_ids = [l.strip() for l in f]
-
-        if isinstance(meta_graph_kws_copied['preprune_secs'], timedelta):
-            meta_graph_kws_copied['preprune_secs'] = meta_graph_kws['preprune_secs'].total_seconds()
-        g = IU.get_topic_meta_graph(
-            interactions,
-            msg_ids=msg_ids,
-            lda_model=lda_model,
-            dictionary=dictionary,
+        g, meta_graph_pkl_path = builder.build(
             undirected=False,  # deprecated
-            given_topics=given_topics,
             decompose_interactions=False,
             convert_time=convert_time,
-            **meta_graph_kws_copied
-        )
-
-        logger.info('pickling...')
-        nx.write_gpickle(
-            IU.compactize_meta_graph(g, map_nodes=False),
-            meta_graph_pkl_path
+            meta_graph_format=meta_graph_format,
+            recompute=calculate_graph,
+            **meta_graph_kws
         )
+        logger.info('meta_graph_pkl_path: {}'.format(meta_graph_pkl_path))
     else:
-        logger.info('loading pickle...')
-        g = nx.read_gpickle(meta_graph_pkl_path)
-        
+        g, meta_graph_pkl_path = build_meta_graph(
+            interaction_path, msg_ids_path,
+            lda_model_path, corpus_dict_path,
+            meta_graph_pkl_path_prefix, meta_graph_pkl_suffix,
+            meta_graph_kws, convert_time, calculate_graph, given_topics,
+            token_cache, load_topic_matrix, meta_graph_format
+        )
+
     if print_summary:
         logger.debug(get_summary(g))
 
@@ -211,6 +302,8 @@ def run(gen_tree_func,
             root_sampler = RandomSampler(g, timespan)
         elif root_sampling_method == 'upperbound':
             root_sampler = UBSampler(g, U, timespan)
+        elif root_sampling_method == 'out_degree':
+            root_sampler = WeightedSampler(g, timespan)
         else:
             logger.info('init AdaptiveSampler...')
             root_sampler = AdaptiveSampler(g, U, timespan)
@@ -237,12 +330,28 @@ def run(gen_tree_func,
         
         
         start = datetime.now()
-        tree = calc_tree(i, root, dag, U,
-                         gen_tree_func,
-                         gen_tree_kws,
-                         print_summary,
-                         should_binarize_dag=should_binarize_dag)
+        calc_tree_args = (i, root, dag, U,
+                          gen_tree_func,
+                          gen_tree_kws,
+                          print_summary)
+        calc_tree_kws = {
+            'should_binarize_dag': should_binarize_dag,
+            'deterministic_binarization': deterministic_binarization
+        }
+        if report_memory:
+            peak_mb, tree = memory_usage(
+                (calc_tree, calc_tree_args, calc_tree_kws),
+                max_usage=True, retval=True
+            )
+            # a list of one value in older versions of memory_profiler
+            if isinstance(peak_mb, list):
+                peak_mb = peak_mb[0]
+        else:
+            tree = calc_tree(*calc_tree_args, **calc_tree_kws)
         tree.graph['calculation_time'] = (datetime.now() - start).total_seconds()
+        if report_memory:
+            tree.graph['peak_memory_mb'] = peak_mb
+            logger.info('peak memory: {:.1f} MB'.format(peak_mb))
         
         trees.append(tree)
 
@@ -315,13 +424,15 @@ if __name__ == '__main__':
 
     parser.add_argument('--method', required=True,
                         choices=("lst", "greedy", "lst+dij",
+                                 "lst-compact", "lst-compact+dij",
                                  "random", "quota"),
                         help="Method you will use")
     parser.add_argument('--dist', required=True,
                         choices=('euclidean', 'cosine'),
                         help="Distance function to use")
     parser.add_argument('--root_sampling', default='random',
-                        choices=('random', 'upperbound', 'adaptive'),
+                        choices=('random', 'upperbound', 'adaptive',
+                                 'out_degree'),
                         help="Scheme to sample roots")
 
     parser.add_argument('--roots', nargs='+',
@@ -413,6 +524,34 @@ if __name__ == '__main__':
                         type=int,
                         default=None)
 
+    parser.add_argument('--token_cache_dir',
+                        default=None,
+                        help="Directory to cache message tokens and BoW")
+    parser.add_argument('--n_jobs',
+                        type=int,
+                        default=1,
+                        help="Number of processes to use for tokenization")
+    parser.add_argument('--topic_matrix_path',
+                        default=None,
+                        help="Path(without extension) to cache document topics")
+    parser.add_argument('--meta_graph_format',
+                        choices=('gpickle', 'compact'),
+                        default='gpickle',
+                        help="On-disk format of the meta graph cache")
+    parser.add_argument('--share_dp_tables',
+                        action='store_true',
+                        help="Share lst DP tables across roots(not with --dij)")
+    parser.add_argument('--dp_memo_size',
+                        type=int,
+                        default=100000,
+                        help="Maximum number of shared DP tables")
+    parser.add_argument('--meta_graph_cache_dir',
+                        default=None,
+                        help="Directory of the content-addressed meta graph cache")
+    parser.add_argument('--report_memory',
+                        action='store_true',
+                        help="Report peak memory of each tree computation")
+
     args = parser.parse_args()
 
     random.seed(args.random_seed)
@@ -421,9 +560,19 @@ if __name__ == '__main__':
     dist_funcs = {'euclidean': euclidean, 'cosine': cosine}
     dist_func = dist_funcs[args.dist]
 
+    if args.share_dp_tables:
+        lst_memo = LstMemo(args.dp_memo_size)
+    else:
+        lst_memo = None
+
     lst = lambda g, r, U: lst_dag(g, r, U,
                                   edge_weight_decimal_point=args.fixed_point,
-                                  debug=False)
+                                  debug=False,
+                                  memo=lst_memo)
+    lst_compact = lambda g, r, U: lst_dag_compact(
+        g, r, U,
+        edge_weight_decimal_point=args.fixed_point
+    )
     variance_method = lambda g, r, U: dp_dag_general(
         g, r,
         int(U*(10**args.fixed_point)),
@@ -438,6 +587,8 @@ if __name__ == '__main__':
 
     methods = {'lst': lst,
                'lst+dij': lst,
+               'lst-compact': lst_compact,
+               'lst-compact+dij': lst_compact,
                'variance': variance_method,
                'greedy': greedy_grow_numpy,
                'quota': quota_based_method,
@@ -446,7 +597,8 @@ if __name__ == '__main__':
 
     apply_dij = 'dij' in args.method
 
-    if 'lst' in args.method:
+    if 'lst' in args.method and 'compact' not in args.method:
+        # lst-compact binarizes the DAG into arrays itself
         should_binarize_dag = True
     else:
         should_binarize_dag = False
@@ -530,8 +682,19 @@ if __name__ == '__main__':
                 given_topics=args.given_topics,
                 roots=roots,
                 convert_time=not args.not_convert_time,
-                should_binarize_dag=should_binarize_dag
+                should_binarize_dag=should_binarize_dag,
+                token_cache_dir=args.token_cache_dir,
+                n_jobs=args.n_jobs,
+                topic_matrix_path=args.topic_matrix_path,
+                meta_graph_format=args.meta_graph_format,
+                meta_graph_cache_dir=args.meta_graph_cache_dir,
+                deterministic_binarization=args.share_dp_tables,
+                report_memory=args.report_memory
             )
 
+    if lst_memo is not None:
+        logger.info('DP table reuse rate: {:.3f} ({} hits, {} misses)'.format(
+            lst_memo.reuse_rate, lst_memo.n_hits, lst_memo.n_misses))
+
     import cPickle as pkl
     pkl.dump(paths, open('.paths.pkl', 'w'))
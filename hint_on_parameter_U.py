@@ -1,6 +1,8 @@
 import numpy as np
 import networkx as nx
 
+from compact_meta_graph import CompactMetaGraph, is_compact_meta_graph
+
 
 def main():
     import argparse
@@ -10,8 +12,11 @@ def main():
                         type=int, nargs='+')
     args = parser.parse_args()
     
-    g = nx.read_gpickle(args.meta_graph_path)
-    costs = np.array([g[s][t]['c'] for s, t in g.edges_iter()])
+    if is_compact_meta_graph(args.meta_graph_path):
+        costs = np.asarray(CompactMetaGraph(args.meta_graph_path).costs)
+    else:
+        g = nx.read_gpickle(args.meta_graph_path)
+        costs = np.array([g[s][t]['c'] for s, t in g.edges_iter()])
     for p in args.percentile:
         print("At percentile {}: {}".format(
             p, np.percentile(costs, p))
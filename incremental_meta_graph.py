@@ -0,0 +1,259 @@
+# Incremental meta graph construction for interaction streams
+#
+# Same broadcast and relay rules as `meta_graph.convert_to_meta_graph`,
+# but interactions are added one by one in time order:
+#
+# - broadcast: i1 -> i2 if both are sent by the same person
+# - relay: i1 -> i2 if the sender of i2 is a recipient of i1
+#
+# given time1 < time2 <= time1 + preprune_secs.
+# Only interactions within the last `preprune_secs` can become parents,
+# so the per-person index is bounded by the window.
+# Nodes older than `retention_secs` are dropped from the graph.
+
+import logging
+import numpy as np
+import networkx as nx
+
+from collections import defaultdict, deque
+from datetime import datetime
+
+from interactions import InteractionsUtil as IU
+from util import get_datetime, load_interactions
+
+logging.basicConfig(format="%(asctime)s;%(levelname)s;%(message)s",
+                    datefmt="%Y-%m-%d %H:%M:%S")
+logger = logging.getLogger("incremental_meta_graph")
+logger.setLevel(logging.DEBUG)
+
+NODE_FIELDS = ('message_id', 'datetime', 'sender_id', 'recipient_ids',
+               'subject', 'body', 'hashtags', 'topics')
+
+
+def make_edge_cost_func(dist_func, fields_with_weights={'topics': 1}):
+    """edge cost function equivalent to `IU.assign_edge_weights`
+    """
+    def edge_cost(source_attrs, target_attrs):
+        return abs(sum(
+            w * IU.field_distance(dist_func, f,
+                                  source_attrs[f], target_attrs[f])
+            for f, w in fields_with_weights.items()
+        ))
+    return edge_cost
+
+
+def replay_interactions(path, convert_time=True):
+    """generator of interactions in a json/pickle file in time order,
+    a local stand-in for the live feed
+    """
+    interactions = IU.clean_interactions(load_interactions(path),
+                                         convert_time=convert_time)
+    for i in sorted(interactions, key=lambda i: i['datetime']):
+        yield i
+
+
+class IncrementalMetaGraph(object):
+    """
+    Meta graph that grows as interactions arrive.
+
+    preprune_secs: maximum time difference of an edge,
+        unlimited if None(as in `convert_to_meta_graph`),
+        then all interactions are kept as parents
+    retention_secs: nodes older than this(relative to the latest interaction)
+        are removed from the graph, never if None.
+        It should not be smaller than `preprune_secs`
+    edge_cost_func: function (source node attrs, target node attrs) -> cost,
+        e.g, `make_edge_cost_func(cosine, {'topics': 1})`
+    featurize: function interaction -> dict of extra node attributes,
+        e.g, topics inferred by some LDA model
+    on_expire: callback of node id and its attributes when it is removed
+    """
+    def __init__(self, preprune_secs,
+                 retention_secs=None,
+                 edge_cost_func=None,
+                 featurize=None,
+                 on_expire=None,
+                 convert_time=True):
+        if retention_secs is not None:
+            assert preprune_secs is not None, \
+                'retention_secs requires preprune_secs'
+            assert retention_secs >= preprune_secs, \
+                'retention_secs < preprune_secs'
+        self.preprune_secs = preprune_secs
+        self.retention_secs = retention_secs
+        self.edge_cost_func = edge_cost_func
+        self.featurize = featurize
+        self.on_expire = on_expire
+        self.convert_time = convert_time
+
+        self.g = nx.DiGraph()
+
+        # person -> deque of (time, node), in time order
+        self._sent = defaultdict(deque)
+        self._received = defaultdict(deque)
+
+        # (time, node, sender, recipients) that can still be parents
+        self._window = deque()
+
+        # all nodes in the graph, in time order
+        self._nodes = deque()
+        self.latest_time = None
+        self.n_added = 0
+        self.n_expired = 0
+
+    def _time_diff(self, t1, t2):
+        if isinstance(t1, datetime):
+            return (t1 - t2).total_seconds()
+        else:
+            return t1 - t2
+
+    def _expire_index(self, now):
+        if self.preprune_secs is None:
+            return
+        # entries leave the per-person deques in the same order
+        # as they leave the window, so each one is at the head
+        while self._window and \
+                self._time_diff(now, self._window[0][0]) > self.preprune_secs:
+            _, n, sender, recipients = self._window.popleft()
+            for index, people in ((self._sent, [sender]),
+                                  (self._received, recipients)):
+                for p in people:
+                    q = index[p]
+                    assert q[0][1] == n
+                    q.popleft()
+                    if not q:
+                        del index[p]
+
+    def _expire_nodes(self, now):
+        if self.retention_secs is None:
+            return
+        while self._nodes and \
+                self._time_diff(now, self._nodes[0][0]) > self.retention_secs:
+            _, n = self._nodes.popleft()
+            if self.on_expire is not None:
+                self.on_expire(n, self.g.node[n])
+            self.g.remove_node(n)
+            self.n_expired += 1
+
+    def expire(self, now):
+        """drop state that is too old relative to `now`,
+        called on every `add`, can also be called on idle feeds
+        """
+        self._expire_index(now)
+        self._expire_nodes(now)
+
+    def add(self, interaction):
+        """
+        Add one interaction, which should not be earlier than
+        those already added.
+
+        Return the node id, None if it is a duplicate
+        """
+        n = interaction['message_id']
+        if n in self.g:
+            logger.warning("{} added already".format(n))
+            return None
+
+        time = interaction['datetime']
+        if self.convert_time:
+            time = get_datetime(time)
+        if self.latest_time is not None and time < self.latest_time:
+            raise ValueError(
+                'interactions should be added in time order: {} < {}'.format(
+                    time, self.latest_time)
+            )
+        self.latest_time = time
+
+        self.expire(time)
+
+        attrs = {f: interaction[f] for f in NODE_FIELDS if f in interaction}
+        attrs['datetime'] = time
+        attrs['recipient_ids'] = list(set(interaction['recipient_ids']))
+        if 'topics' in attrs:
+            attrs['topics'] = np.array(attrs['topics'])
+        attrs[IU.VERTEX_REWARD_KEY] = 1
+        if self.featurize is not None:
+            attrs.update(self.featurize(interaction))
+        self.g.add_node(n, attrs)
+        self._nodes.append((time, n))
+
+        sender = interaction['sender_id']
+        # broadcast and relay parents, all within the window
+        parents = set(
+            p for t, p in self._sent.get(sender, ()) if t < time
+        ) | set(
+            p for t, p in self._received.get(sender, ()) if t < time
+        )
+        for p in parents:
+            if self.edge_cost_func is not None:
+                self.g.add_edge(p, n, {
+                    IU.EDGE_COST_KEY: self.edge_cost_func(self.g.node[p],
+                                                          attrs)
+                })
+            else:
+                self.g.add_edge(p, n)
+
+        self._sent[sender].append((time, n))
+        for r in attrs['recipient_ids']:
+            self._received[r].append((time, n))
+        self._window.append((time, n, sender, attrs['recipient_ids']))
+
+        self.n_added += 1
+        return n
+
+    def add_all(self, interactions):
+        """add interactions and yield the node ids"""
+        for i in interactions:
+            n = self.add(i)
+            if n is not None:
+                yield n
+
+    @property
+    def window_size(self):
+        """number of interactions that can still be parents"""
+        return len(self._window)
+
+
+def main():
+    import argparse
+    from scipy.spatial.distance import cosine
+    from util import parse_time_delta
+
+    parser = argparse.ArgumentParser(
+        'Replay interactions through the incremental meta graph builder'
+    )
+    parser.add_argument('--interaction_path', required=True)
+    parser.add_argument('--max_time_distance', required=True,
+                        help='Example: 1-minutes, 2-hours, 15-days')
+    parser.add_argument('--retention', default=None,
+                        help='How long nodes are kept, the same format')
+    parser.add_argument('--given_topics', action='store_true')
+    parser.add_argument('--not_convert_time', action='store_true')
+    args = parser.parse_args()
+
+    preprune_secs = parse_time_delta(args.max_time_distance).total_seconds()
+    if args.retention:
+        retention_secs = parse_time_delta(args.retention).total_seconds()
+    else:
+        retention_secs = None
+
+    img = IncrementalMetaGraph(
+        preprune_secs,
+        retention_secs=retention_secs,
+        edge_cost_func=(make_edge_cost_func(cosine)
+                        if args.given_topics else None),
+        convert_time=not args.not_convert_time
+    )
+    start = datetime.now()
+    for _ in img.add_all(replay_interactions(
+            args.interaction_path,
+            convert_time=not args.not_convert_time)):
+        pass
+    secs = (datetime.now() - start).total_seconds()
+    print('{} interactions in {:.2f} secs'.format(img.n_added, secs))
+    print('#nodes={}, #edges={}, #expired={}'.format(
+        img.g.number_of_nodes(), img.g.number_of_edges(), img.n_expired))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+# Index of interactions by message id, shared by event summaries
+#
+# Built once over the corpus, then each lookup is O(1),
+# so summarizing k events costs O(total event size)
+# instead of re-indexing the corpus per event and per stat.
+#
+# People are also integer-coded on demand(`people_columns`):
+# senders as an array and recipients/participants as CSR matrices,
+# so that per-edge and per-node statistics can be done in numpy.
+
+import numpy as np
+
+from collections import namedtuple
+from scipy.sparse import csr_matrix
+
+PeopleColumns = namedtuple('PeopleColumns',
+                           ['person_ids', 'senders',
+                            'recipients', 'participants'])
+
+
+def _csr_of_lists(lists, code):
+    """indptr and indices of CSR rows"""
+    indptr = [0]
+    indices = []
+    for ids in lists:
+        if ids:
+            indices.extend(code(p) for p in ids)
+        indptr.append(len(indices))
+    return indptr, indices
+
+
+class InteractionIndex(object):
+    """
+    Message id -> row offset into columnar fields:
+
+    - subjects, bodies
+    - senders, recipients(directed) or participants(undirected)
+
+    Iterating over it gives the interactions, so it can be passed
+    wherever a list of interactions is expected.
+    """
+    def __init__(self, interactions):
+        self.interactions = list(interactions)
+        self.id2row = {}
+        self.subjects = []
+        self.bodies = []
+        self.senders = []
+        self.recipients = []
+        self.participants = []
+        for row, i in enumerate(self.interactions):
+            # later duplicates win, as in a dict built over the list
+            self.id2row[i['message_id']] = row
+            self.subjects.append(i.get('subject'))
+            self.bodies.append(i.get('body'))
+            self.senders.append(i.get('sender_id'))
+            self.recipients.append(i.get('recipient_ids'))
+            self.participants.append(i.get('participant_ids'))
+        self._people_columns = None
+
+    @classmethod
+    def ensure(cls, interactions):
+        """`interactions` itself if it is an index already"""
+        if isinstance(interactions, cls):
+            return interactions
+        return cls(interactions)
+
+    def __len__(self):
+        return len(self.interactions)
+
+    def __iter__(self):
+        return iter(self.interactions)
+
+    def __contains__(self, message_id):
+        return message_id in self.id2row
+
+    def __getitem__(self, message_id):
+        return self.interactions[self.id2row[message_id]]
+
+    def rows(self, message_ids):
+        return [self.id2row[mid] for mid in message_ids]
+
+    def subject(self, message_id):
+        return self.subjects[self.id2row[message_id]]
+
+    def text(self, message_id):
+        """subject and body"""
+        row = self.id2row[message_id]
+        return u"{} {}".format(self.subjects[row], self.bodies[row])
+
+    def sender(self, message_id):
+        return self.senders[self.id2row[message_id]]
+
+    def recipient_ids(self, message_id):
+        return self.recipients[self.id2row[message_id]]
+
+    def participant_ids(self, message_id):
+        return self.participants[self.id2row[message_id]]
+
+    def people_columns(self):
+        """
+        `PeopleColumns`, built once:
+
+        - person_ids: code -> person id
+        - senders: array of sender codes by row
+        - recipients, participants: row x person count matrices
+        """
+        if self._people_columns is None:
+            person2code = {}
+
+            def code(p):
+                return person2code.setdefault(p, len(person2code))
+
+            senders = np.array([code(p) for p in self.senders],
+                               dtype=np.int64)
+            recipients = _csr_of_lists(self.recipients, code)
+            participants = _csr_of_lists(self.participants, code)
+
+            shape = (len(self.interactions), len(person2code))
+            person_ids = [None] * len(person2code)
+            for p, c in person2code.iteritems():
+                person_ids[c] = p
+            self._people_columns = PeopleColumns(
+                person_ids,
+                senders,
+                *[csr_matrix((np.ones(len(indices), dtype=np.int64),
+                              indices, indptr),
+                             shape=shape)
+                  for indptr, indices in (recipients, participants)]
+            )
+        return self._people_columns
+
+    def row_array(self, message_ids):
+        return np.array(self.rows(message_ids), dtype=np.int64)
+
+
+def contains(m, rows, cols):
+    """whether m[rows[i], cols[i]] is non-zero, for each i"""
+    if len(rows) == 0:
+        return np.zeros(0, dtype=bool)
+    return np.asarray(m[rows, cols]).ravel() > 0
+
+
+def column_counts(m, rows):
+    """sum of the `rows` of m(repeated rows included)"""
+    if len(rows) == 0:
+        return np.zeros(m.shape[1], dtype=m.dtype)
+    return np.asarray(m[rows].sum(axis=0)).ravel()
@@ -20,6 +20,7 @@ from scipy.spatial.distance import jaccard
 
 from util import load_items_by_line, get_datetime, compose, json_load
 from hig import construct_hig_from_interactions
+from topic_cache import TopicMatrix
 from meta_graph import convert_to_meta_graph, \
     convert_to_meta_graph_undirected
 
@@ -46,6 +47,8 @@ class InteractionsUtil(object):
     stoplist = load_items_by_line(os.path.join(CURDIR, 'lemur-stopwords.txt'))
     # valid_token_regexp = re.compile('^[a-z]+$')
     valid_token_regexp = re.compile('^[a-zA-Z][a-zA-Z0-9]?[_()\-a-zA-Z0-9]+$')
+    MIN_TOKEN_LEN = 2
+    MAX_TOKEN_LEN = 15
 
     @classmethod
     def clean_interactions(self, interactions, undirected=False,
@@ -188,6 +191,28 @@ class InteractionsUtil(object):
                 convert_time=convert_time
             )
 
+        return cls.get_meta_graph_from_cleaned(
+            interactions,
+            undirected=undirected,
+            preprune_secs=preprune_secs,
+            decomposed=decompose_interactions,
+            remove_singleton=remove_singleton,
+            given_topics=given_topics,
+            apply_pagerank=apply_pagerank
+        )
+
+    @classmethod
+    def get_meta_graph_from_cleaned(cls, interactions,
+                                    undirected=False,
+                                    preprune_secs=None,
+                                    decomposed=False,
+                                    remove_singleton=True,
+                                    given_topics=False,
+                                    apply_pagerank=False):
+        """
+        `get_meta_graph` for interactions that are cleaned
+        (and decomposed if `decomposed`) already
+        """
         if not undirected:
             logger.info('processing **directed** interactions')
             g = convert_to_meta_graph(*cls.unzip_interactions(interactions),
@@ -200,7 +225,7 @@ class InteractionsUtil(object):
             )
         for i in interactions:
             n = i['message_id']
-            if decompose_interactions:
+            if decomposed:
                 g.node[n]['message_id'] = i['original_message_id']
             else:
                 g.node[n]['message_id'] = i['message_id']
@@ -218,7 +243,7 @@ class InteractionsUtil(object):
 
             g.node[n][cls.VERTEX_REWARD_KEY] = 1
 
-            if decompose_interactions:
+            if decomposed:
                 g.node[n]['peers'] = i['peers']
 
             if undirected:
@@ -268,12 +293,18 @@ class InteractionsUtil(object):
             word for word in nltk.word_tokenize(doc.lower())
             if (word not in cls.stoplist and
                 cls.valid_token_regexp.match(word) and
-                len(word) > 2 and len(word) < 15)
+                len(word) > cls.MIN_TOKEN_LEN and
+                len(word) < cls.MAX_TOKEN_LEN)
         ]
 
     @classmethod
-    def add_topics_to_graph(cls, g, lda_model, dictionary, msg_ids):
+    def add_topics_to_graph(cls, g, lda_model, dictionary, msg_ids,
+                            topic_matrix=None):
         """
+        topic_matrix: `topic_cache.TopicMatrix` of `lda_model`,
+        built from `lda_model` and `msg_ids` if not given.
+
+        Node topics are rows of the topic matrix(no copy is made)
         """
         
         if isinstance(g.nodes()[0], int):
@@ -281,38 +312,51 @@ class InteractionsUtil(object):
         else:
             convert_id = lambda s: s    
 
-        mid2topic = {
-            convert_id(mid): topic
-            for topic, mid in izip(lda_model.load_document_topics(), msg_ids)
-            }
+        if topic_matrix is None:
+            topic_matrix = TopicMatrix.from_lda(
+                lda_model, map(convert_id, msg_ids)
+            )
+        else:
+            # share the matrix, only the index is converted
+            topic_matrix = TopicMatrix(
+                topic_matrix.matrix,
+                map(convert_id, topic_matrix.msg_ids)
+            )
 
         N = g.number_of_nodes()
         for i, n in enumerate(g.nodes_iter()):
             if i % 1000 == 0:
                 logger.debug('adding topics: {} / {}'.format(i, N))
-            # doc = u'{} {}'.format(g.node[n]['subject'], g.node[n]['body'])
-            # bow = dictionary.doc2bow(cls.tokenize_document(doc))
-            # topic_dist = lda_model.get_document_topics(
-            #     bow,
-            #     minimum_probability=0
-            # )
-            # g.node[n]['topics'] = np.asarray([v for _, v in topic_dist],
-            #                                  dtype=np.float)
-            # g.node[n]['doc_bow'] = bow
-            topic = np.asarray([w for t, w in  mid2topic[g.node[n]['message_id']]])
-            g.node[n]['topics'] = topic
+            g.node[n]['topics'] = topic_matrix[g.node[n]['message_id']]
             
         return g
 
     @classmethod
-    def build_bow_matrix(cls, g, dictionary):
+    def build_bow_matrix(cls, g, dictionary, token_cache=None):
+        """
+        token_cache: `token_cache.TokenCache`, if given,
+        BoW rows are read from/written to the cache by message id
+        """
         logger.debug('Building BoW matrix...')
         N = g.number_of_nodes()
+        n2i = {n: i
+               for i, n in enumerate(g.nodes_iter())}
+
+        if token_cache is not None:
+            mid2node = {g.node[n]['message_id']: n
+                        for n in g.nodes_iter()}
+            id2text = lambda mid: u'{} {}'.format(
+                g.node[mid2node[mid]]['subject'],
+                g.node[mid2node[mid]]['body'])
+            return (n2i,
+                    token_cache.bow_matrix(
+                        [g.node[n]['message_id'] for n in g.nodes_iter()],
+                        id2text,
+                        dictionary))
+
         row_ind = []
         col_ind = []
         data = []
-        n2i = {n: i
-               for i, n in enumerate(g.nodes_iter())}
         for i, n in enumerate(g.nodes_iter()):
             if i % 1000 == 0:
                 logger.debug('adding BoW: {} / {}'.format(i, N))
@@ -350,8 +394,9 @@ class InteractionsUtil(object):
         return g
     
     @classmethod
-    def add_bow_to_graph(cls, g, dictionary):
-        node2row, bow_mat = cls.build_bow_matrix(g, dictionary)
+    def add_bow_to_graph(cls, g, dictionary, token_cache=None):
+        node2row, bow_mat = cls.build_bow_matrix(g, dictionary,
+                                                 token_cache=token_cache)
         
         tfidf = TfidfTransformer()
         tfidf_mat = tfidf.fit_transform(bow_mat)
@@ -446,61 +491,84 @@ class InteractionsUtil(object):
         return g
 
     @classmethod
-    def assign_edge_weights(cls, g,
-                            dist_func,
-                            fields_with_weights={'topics': 1}):
+    def field_distance(cls, dist_func, field, value1, value2):
+        """distance between the `field` values of two nodes
         """
+        if issparse(value1):
+            array1 = np.array(value1.todense()).ravel()
+        else:
+            array1 = np.array(value1)
+
+        if issparse(value2):
+            array2 = np.array(value2.todense()).ravel()
+        else:
+            array2 = np.array(value2)
+
+        # at least one is all-zero
+        if not array1.any() or not array2.any():
+            return 1
+        else:
+            if field == 'hashtag_bow':
+                # special treatment to `hashtag_bow`
+                d = jaccard(array1, array2)
+            else:
+                d = dist_func(array1, array2)
+            assert not np.isinf(d)
+            return d
+
+    @classmethod
+    def compute_edge_distances(cls, g, dist_func, fields, edges=None):
+        """
+        Return (edges, N_edges x N_fields distance matrix)
+
+        edges: row order of the matrix, `g.edges()` if not given
+
+        The matrix does not depend on the field weights,
+        so it can be reused by `apply_edge_weights`
+        for different weightings
+
         TODO: can be parallelized
         """
-        N = g.number_of_edges()
-        dists_mat = np.zeros((N, len(fields_with_weights)))
+        if edges is None:
+            edges = g.edges()
+        N = len(edges)
+        dists_mat = np.zeros((N, len(fields)))
 
-        fields, fields_weight = fields_with_weights.keys(), \
-                                fields_with_weights.values()
-        for i, (s, t) in enumerate(g.edges_iter()):
+        for i, (s, t) in enumerate(edges):
             if i % 10000 == 0:
                 logger.debug('adding edge cost: {}/{}'.format(i, N))
 
             for j, f in enumerate(fields):
-                if issparse(g.node[s][f]):
-                    array1 = np.array(g.node[s][f].todense()).ravel()
-                else:
-                    array1 = np.array(g.node[s][f])
-
-                if issparse(g.node[t][f]):
-                    array2 = np.array(g.node[t][f].todense()).ravel()
-                else:
-                    array2 = np.array(g.node[t][f])
-
-                # at least one is all-zero
-                if not array1.any() or not array2.any():
-                    dists_mat[i, j] = 1
-                else:
-                    if f == 'hashtag_bow':
-                        # special treatment to `hashtag_bow`
-                        dists_mat[i, j] = jaccard(
-                            array1,
-                            array2
-                        )
-                    else:
-                        dists_mat[i, j] = dist_func(
-                            array1,
-                            array2
-                        )
-
-                    assert not np.isinf(dists_mat[i, j])
-
-        weight_mat = np.matrix([fields_weight]).T
-
-        dist_mat = np.abs(np.matrix(dists_mat) * weight_mat)
+                dists_mat[i, j] = cls.field_distance(
+                    dist_func, f, g.node[s][f], g.node[t][f]
+                )
+        return edges, dists_mat
 
-        for i, (s, t) in enumerate(g.edges_iter()):
-            g[s][t][cls.EDGE_COST_KEY] = dist_mat[i, 0]
-            assert not np.isinf(g[s][t][cls.EDGE_COST_KEY]), \
-                (g.node[s]['bow'].nonzero(),
-                 g.node[t]['bow'].nonzero())
-        
+    @classmethod
+    def apply_edge_weights(cls, g, edges, dists_mat, fields,
+                           fields_with_weights):
+        """
+        edge cost = |dists_mat * weights|,
+        fields missing in `fields_with_weights` get weight 0
+        """
+        weights = np.array([fields_with_weights.get(f, 0)
+                            for f in fields],
+                           dtype=np.float64)
+        costs = np.abs(dists_mat.dot(weights))
+
+        for (s, t), c in izip(edges, costs.tolist()):
+            assert not np.isinf(c), (s, t)
+            g[s][t][cls.EDGE_COST_KEY] = c
         return g
+
+    @classmethod
+    def assign_edge_weights(cls, g,
+                            dist_func,
+                            fields_with_weights={'topics': 1}):
+        fields = fields_with_weights.keys()
+        edges, dists_mat = cls.compute_edge_distances(g, dist_func, fields)
+        return cls.apply_edge_weights(g, edges, dists_mat, fields,
+                                      fields_with_weights)
         
     @classmethod
     def get_topic_meta_graph_from_synthetic(cls,
@@ -529,6 +597,8 @@ class InteractionsUtil(object):
                              apply_pagerank=False,
                              distance_weights={'topics': 1},
                              convert_time=True,
+                             token_cache=None,
+                             topic_matrix=None,
                              # consider_recency=False,
                              # alpha=1.0, tau=0.8,
                              # timestamp_converter=lambda s: s,
@@ -554,13 +624,15 @@ class InteractionsUtil(object):
                     mg,
                     lda_model,
                     dictionary,
-                    msg_ids=msg_ids
+                    msg_ids=msg_ids,
+                    topic_matrix=topic_matrix
                 )
             if 'bow' in distance_weights and distance_weights['bow'] > 0:
                 logger.debug('adding bow...')
                 mg = cls.add_bow_to_graph(
                     mg,
-                    dictionary
+                    dictionary,
+                    token_cache=token_cache
                 )
 
             if 'hashtag_bow' in distance_weights and \
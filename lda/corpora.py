@@ -1,7 +1,12 @@
+import os
 import re
 import codecs
 import nltk
+import shutil
 import logging
+import tempfile
+
+from multiprocessing import Pool
 
 from nltk.stem.porter import PorterStemmer
 
@@ -30,6 +35,18 @@ class CorpusEnron(corpora.TextCorpus):
 
     MAX_WORD_LEN = 15
 
+    @classmethod
+    def tokenize(cls, doc, stoplist=None):
+        if stoplist is None:
+            stoplist = cls.stoplist
+        return [
+            word for word in nltk.word_tokenize(doc.lower())
+            if (word not in stoplist and
+                cls.valid_token_regexp.match(word) and
+                len(word) > cls.MIN_WORD_LEN and
+                len(word) < cls.MAX_WORD_LEN)
+        ]
+
     def get_texts(self):
         """
         Parse documents from the .cor file provided in the constructor. Lowercase
@@ -42,22 +59,162 @@ class CorpusEnron(corpora.TextCorpus):
                 if (i+1) % 1000 == 0:
                     logger.debug('{} lines processed'.format(i+1))
 
-                yield [
-                    word for word in nltk.word_tokenize(doc.lower())
-                    if (word not in CorpusEnron.stoplist and
-                        CorpusEnron.valid_token_regexp.match(word) and
-                        len(word) > CorpusEnron.MIN_WORD_LEN and
-                        len(word) < CorpusEnron.MAX_WORD_LEN)
-                ]
+                yield CorpusEnron.tokenize(doc)
 
     def __len__(self):
         """Define this so we can use `len(corpus)`"""
         if 'length' not in self.__dict__:
-            logger.info("caching corpus size (calculating number of documents)")
-            self.length = sum(1 for doc in self.get_texts())
+            self.length = read_corpus_length(self.input)
+            if self.length is None:
+                logger.info("caching corpus size (calculating number of documents)")
+                self.length = sum(1 for doc in self.get_texts())
         return self.length
 
 
+def corpus_length_path(input_path):
+    """where the number of documents of `input_path` is recorded
+    """
+    return input_path + '.len'
+
+
+def _file_stamp(path):
+    st = os.stat(path)
+    return '{} {!r}'.format(st.st_size, st.st_mtime)
+
+
+def write_corpus_length(input_path, n_docs):
+    """record the number of documents with the size and mtime of the input
+    """
+    with open(corpus_length_path(input_path), 'w') as f:
+        f.write('{} {}'.format(n_docs, _file_stamp(input_path)))
+
+
+def read_corpus_length(input_path):
+    """the recorded number of documents,
+    None if not recorded or the input has changed since
+    """
+    length_path = corpus_length_path(input_path)
+    if not os.path.exists(length_path):
+        return None
+    with open(length_path) as f:
+        fields = f.read().strip().split(' ', 1)
+    if len(fields) != 2 or fields[1] != _file_stamp(input_path):
+        return None
+    return int(fields[0])
+
+
+def shard_offsets(path, n_shards):
+    """split the file into `n_shards` byte ranges
+    whose boundaries fall on line starts
+    """
+    size = os.path.getsize(path)
+    offsets = [0]
+    with open(path, 'rb') as f:
+        for i in xrange(1, n_shards):
+            f.seek(max(size * i / n_shards, offsets[-1]))
+            if f.tell() > 0:
+                f.readline()  # move to the start of next line
+            offsets.append(min(f.tell(), size))
+    offsets.append(size)
+    return zip(offsets[:-1], offsets[1:])
+
+
+def _tokenize_shard(args):
+    """
+    tokenize lines within [start, end) of the input file,
+    write the tokens(one document per line) to `output_path`
+
+    Return the number of documents and the shard's dictionary
+    """
+    input_path, start, end, output_path, stoplist = args
+    dictionary = corpora.Dictionary()
+    n_docs = 0
+    with open(input_path, 'rb') as f, \
+            codecs.open(output_path, 'w', 'utf8') as out:
+        f.seek(start)
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            # bytes are split on \n only, while iterating over
+            # the decoded file(as `get_texts` does) also splits on
+            # \r, \x0b, \x0c, \x1c-\x1e, \x85, \u2028 and \u2029
+            for doc in line.decode('utf8').splitlines(True):
+                tokens = CorpusEnron.tokenize(doc, stoplist)
+                dictionary.add_documents([tokens])
+                out.write(u' '.join(tokens) + u'\n')
+                n_docs += 1
+    return n_docs, dictionary
+
+
+def build_corpus(messages_path, mm_output_path,
+                 n_jobs=1, no_below=2, stoplist=None):
+    """
+    Multi-process version of building the dictionary and
+    the .mm corpus from the .cor file
+
+    1. shard the input file by byte offset
+    2. tokenize and filter each shard in parallel
+    3. merge the per-shard dictionaries(counts are merged as well)
+    4. write the .mm output in one pass over the tokenized shards
+
+    Documents are split as when iterating over the decoded file.
+    The document count is recorded next to `messages_path`
+    (with its size and mtime, see `read_corpus_length`)
+    so that `len(CorpusEnron(...))` needs no extra scan.
+
+    Return the dictionary and the number of documents
+    """
+    if stoplist is None:
+        stoplist = CorpusEnron.stoplist
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        tasks = [(messages_path, start, end,
+                  os.path.join(tmp_dir, 'shard-{}.txt'.format(i)),
+                  stoplist)
+                 for i, (start, end) in enumerate(
+                         shard_offsets(messages_path, n_jobs))]
+
+        logger.info('tokenizing {} shards'.format(len(tasks)))
+        if n_jobs > 1:
+            pool = Pool(n_jobs)
+            try:
+                results = pool.map(_tokenize_shard, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = map(_tokenize_shard, tasks)
+
+        logger.info('merging dictionaries')
+        dictionary = corpora.Dictionary()
+        n_docs = 0
+        for shard_n_docs, shard_dict in results:
+            dictionary.merge_with(shard_dict)
+            n_docs += shard_n_docs
+
+        logger.info('dictionary: {}'.format(dictionary))
+        dictionary.filter_extremes(no_below=no_below)
+        logger.info('dictionary after filtering: {}'.format(dictionary))
+
+        def vectors():
+            for _, _, _, shard_path, _ in tasks:
+                with codecs.open(shard_path, 'r', 'utf8') as f:
+                    for line in f:
+                        yield dictionary.doc2bow(line.split())
+
+        logger.info('dumping .mm')
+        corpora.MmCorpus.serialize(mm_output_path, vectors(),
+                                   id2word=dictionary)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    write_corpus_length(messages_path, n_docs)
+
+    return dictionary, n_docs
+
+
 if __name__ == "__main__":
     from argparse import ArgumentParser
     import cPickle as pkl
@@ -75,6 +232,8 @@ if __name__ == "__main__":
                         help="Path to output file in .mm")
     parser.add_argument('--stoplist_paths', '-s', nargs='*',
                         help="paths of stoplist files")
+    parser.add_argument('--n_jobs', '-j', type=int, default=1,
+                        help="number of processes for tokenization")
 
     logger.info('start')
     arg = parser.parse_args()
@@ -89,23 +248,15 @@ if __name__ == "__main__":
         print('WARN: stoplist empty!')
         CorpusEnron.stoplist = set()
     
-    c = CorpusEnron(arg.messages_path)
-    
-    logger.info('building dict')
-    dictionary = corpora.Dictionary(c.get_texts())
-
-    logger.info('filtering dict')
-    print(dictionary)
-    dictionary.filter_extremes(no_below=2)
-    print(dictionary)
+    dictionary, n_docs = build_corpus(arg.messages_path,
+                                      arg.mm_output_path,
+                                      n_jobs=arg.n_jobs,
+                                      no_below=2)
+    logger.info('{} documents'.format(n_docs))
 
     logger.info('saving dict')
     dictionary.save(arg.dict_path)
     
-    logger.info('dumping .mm')
-    vectors = [dictionary.doc2bow(tokens) for tokens in c.get_texts()]
-    corpora.MmCorpus.serialize(arg.mm_output_path, vectors)
-    
     logger.info('saving id2token')
     id2token = {i: t
                 for t, i in dictionary.token2id.items()}
@@ -1,11 +1,13 @@
 import itertools
 import scipy
 import numpy as np
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 from networkx.classes.digraph import DiGraph
 from networkx.algorithms.dag import topological_sort
 
+from dag_util import binarize_dag_to_arrays
+
 
 def dp_dag_general(G, r, U,
                    cost_func,
@@ -207,13 +209,16 @@ def lst_dag(G, r, U,
             edge_cost_key='c',
             edge_weight_decimal_point=None,
             fixed_point_func=round,
-            debug=False):
+            debug=False,
+            memo=None):
     """
     Param:
     -------------
     binary_dag: a DAG in networkx format. Each node can have at most 2 child
     r: root node in dag
     U: the maximum threshold of edge weight sum
+    memo: `LstMemo` to share per-node DP tables across rooted DAGs
+        of the same meta graph(see `LstMemo` for the requirements)
 
     Return:
     maximum-sum subtree rooted at r whose sum of edge weights <= A
@@ -234,6 +239,13 @@ def lst_dag(G, r, U,
     if debug:
         print('U => {}'.format(U))
 
+    if memo is not None:
+        return _lst_dag_memo(G, r, U, memo,
+                             (U, edge_weight_decimal_point,
+                              fixed_point_func.__name__),
+                             node_reward_key=node_reward_key,
+                             edge_cost_key=edge_cost_key)
+
     ns = G.nodes()
     if debug:
         print("total #nodes {}".format(len(ns)))
@@ -336,3 +348,279 @@ def lst_dag(G, r, U,
             stack.append((child, grandchild, cost2))
 
     return tree
+
+
+def _post_order(left, right, root):
+    """positions reachable from root, children first
+    """
+    order = []
+    visited = [False] * len(left)
+    stack = [(root, False)]
+    while stack:
+        i, expanded = stack.pop()
+        if expanded:
+            order.append(i)
+            continue
+        if visited[i]:
+            continue
+        visited[i] = True
+        stack.append((i, True))
+        for c in (left[i], right[i]):
+            if c >= 0 and not visited[c]:
+                stack.append((c, False))
+    return order
+
+
+def lst_dag_compact(G, r, U,
+                    node_reward_key='r',
+                    edge_cost_key='c',
+                    edge_weight_decimal_point=None,
+                    fixed_point_func=round):
+    """
+    `lst_dag` on the binarized version of G, with the input being
+    the **unbinarized** DAG and the output the unbinarized tree.
+
+    Binarization and fixed point rounding produce integer arrays
+    (`dag_util.binarize_dag_to_arrays`) instead of networkx copies.
+
+    As in `lst_dag`, the edge costs of the tree are the rounded ones
+    (multiplied by 10^edge_weight_decimal_point) if
+    `edge_weight_decimal_point` is given
+    """
+    if edge_weight_decimal_point is not None:
+        multiplier = 10**edge_weight_decimal_point
+        cost_func = lambda c: int(fixed_point_func(c * multiplier))
+        U = int(U * multiplier)
+    else:
+        cost_func = None
+
+    arrays = binarize_dag_to_arrays(G, node_reward_key, edge_cost_key,
+                                    cost_func=cost_func)
+    nodes, n_real = arrays.nodes, arrays.n_real
+    left, right = arrays.left.tolist(), arrays.right.tolist()
+    left_cost, right_cost = (arrays.left_cost.tolist(),
+                             arrays.right_cost.tolist())
+    rewards = arrays.reward.tolist()
+    root = nodes.index(r)
+
+    A, D, BP = {}, {}, {}
+    for n in _post_order(left, right, root):
+        reward = rewards[n]
+        A[n] = {0: reward}  # maximum sum of node u at a cost i
+        D[n] = {0: frozenset([n])}  # nodes included
+        BP[n] = {0: ()}  # backpointers
+
+        lchild, rchild = left[n], right[n]
+        if lchild >= 0 and rchild < 0:
+            w = left_cost[n]
+            for i in xrange(U, w - 1, -1):
+                if (i-w) in A[lchild]:
+                    A[n][i] = A[lchild][i-w] + reward
+                    D[n][i] = D[lchild][i-w] | {n}
+                    BP[n][i] = ((lchild, i-w), )
+        elif lchild >= 0:
+            lw, rw = left_cost[n], right_cost[n]
+            for child, w in ((lchild, lw), (rchild, rw)):
+                for i in A[child]:
+                    c = w + i
+                    if c <= U:
+                        if A[n].get(c) is None or \
+                           A[child][i] + reward > A[n][c]:
+                            A[n][c] = A[child][i] + reward
+                            D[n][c] = D[child][i] | {n}
+                            BP[n][c] = ((child, i), )
+
+            for i in A[lchild]:
+                for j in A[rchild]:
+                    c = lw + rw + i + j
+                    if c <= U:
+                        if (A[n].get(c) is None or
+                            A[lchild][i] + A[rchild][j] + reward > A[n][c]) and \
+                           len(D[lchild][i] & D[rchild][j]) == 0:
+                            A[n][c] = A[lchild][i] + A[rchild][j] + reward
+                            D[n][c] = D[lchild][i] | D[rchild][j] | {n}
+                            BP[n][c] = ((lchild, i), (rchild, j))
+
+    best_cost = max(xrange(U + 1),
+                    key=lambda i: A[root][i] if i in A[root]
+                    else float('-inf'))
+
+    # unbinarize on the fly:
+    # edges out of dummy nodes are attached to their real ancestor
+    tree = DiGraph()
+    tree.add_node(r)
+    tree.node[r] = G.node[r]
+    stack = [(root, child, cost) for child, cost in BP[root][best_cost]]
+    while stack:
+        parent, child, cost = stack.pop()
+        if child >= n_real:  # dummy
+            stack.extend((parent, gc, c) for gc, c in BP[child][cost])
+            continue
+        u, v = nodes[parent], nodes[child]
+        tree.add_edge(u, v)
+        tree[u][v][edge_cost_key] = (
+            G[u][v][edge_cost_key] if cost_func is None
+            else cost_func(G[u][v][edge_cost_key])
+        )
+        tree.node[u] = G.node[u]
+        tree.node[v] = G.node[v]
+        stack.extend((child, gc, c) for gc, c in BP[child][cost])
+    return tree
+
+
+class LstMemo(object):
+    """
+    Cross-root memo of `lst_dag`'s per-node DP tables, with LRU eviction.
+
+    The table of node n only depends on the sub-DAG reachable from n
+    and on U. Within a rooted DAG from `get_rooted_subgraph_within_timespan`,
+    that sub-DAG is determined by n and the latest datetime in it,
+    which is used as part of the key.
+
+    Requirements:
+
+    - all rooted DAGs come from the same meta graph
+    - they are binarized by `binarize_dag(..., deterministic=True)`
+    - edges are not removed per root(e.g, no dijkstra pruning)
+    """
+    def __init__(self, max_size=100000, datetime_key='datetime'):
+        self.max_size = max_size
+        self.datetime_key = datetime_key
+        self._tables = OrderedDict()
+        self.n_hits = 0
+        self.n_misses = 0
+
+    def __len__(self):
+        return len(self._tables)
+
+    def get(self, key):
+        table = self._tables.pop(key, None)
+        if table is None:
+            self.n_misses += 1
+        else:
+            self.n_hits += 1
+            self._tables[key] = table  # most recently used
+        return table
+
+    def put(self, key, table):
+        self._tables[key] = table
+        if len(self._tables) > self.max_size:
+            self._tables.popitem(last=False)
+
+    @property
+    def reuse_rate(self):
+        total = self.n_hits + self.n_misses
+        return self.n_hits / float(total) if total else 0.0
+
+
+def effective_cutoffs(G, datetime_key='datetime'):
+    """latest datetime in the sub-DAG reachable from each node
+    (dummy nodes have no datetime)
+    """
+    cutoff = {}
+    for n in topological_sort(G, reverse=True):
+        times = [cutoff[c] for c in G.neighbors(n)
+                 if cutoff[c] is not None]
+        if not G.node[n].get('dummy'):
+            assert datetime_key in G.node[n], \
+                '{} has no {}'.format(n, datetime_key)
+            times.append(G.node[n][datetime_key])
+        cutoff[n] = max(times) if times else None
+    return cutoff
+
+
+def _lst_dag_memo(G, r, U, memo, key_suffix,
+                  node_reward_key='r',
+                  edge_cost_key='c'):
+    """
+    Same DP as `lst_dag`, but tables of memoized nodes are reused and
+    their descendants are not visited.
+
+    Instead of back pointers, the tree edges for each cost are kept
+    (E[n][i]) so that memoized tables are self-contained
+    """
+    cutoff = effective_cutoffs(G, memo.datetime_key)
+    is_dummy = lambda n: G.node[n].get('dummy', False)
+    make_key = lambda n: (n, cutoff[n]) + key_suffix
+
+    A, D, E = {}, {}, {}
+
+    # post order from r, stopping at memoized nodes
+    order = []
+    visited = set()
+    stack = [(r, False)]
+    while stack:
+        n, expanded = stack.pop()
+        if expanded:
+            order.append(n)
+            continue
+        if n in visited:
+            continue
+        visited.add(n)
+        if not is_dummy(n):
+            table = memo.get(make_key(n))
+            if table is not None:
+                A[n], D[n], E[n] = table
+                continue
+        stack.append((n, True))
+        stack.extend((c, False) for c in G.neighbors(n)
+                     if c not in visited)
+
+    for n in order:
+        reward = G.node[n][node_reward_key]
+        A[n] = {0: reward}
+        D[n] = {0: frozenset([n])}
+        E[n] = {0: ()}
+
+        children = G.neighbors(n)
+        if len(children) == 1:
+            child = children[0]
+            w = G[n][child][edge_cost_key]
+            for i in xrange(U, w - 1, -1):
+                if (i-w) in A[child]:
+                    A[n][i] = A[child][i-w] + reward
+                    D[n][i] = D[child][i-w] | {n}
+                    E[n][i] = E[child][i-w] + ((n, child), )
+        elif len(children) > 1:
+            lchild, rchild = children
+            lw = G[n][lchild][edge_cost_key]
+            rw = G[n][rchild][edge_cost_key]
+
+            for child, w in ((lchild, lw), (rchild, rw)):
+                for i in A[child]:
+                    c = w + i
+                    if c <= U:
+                        if A[n].get(c) is None or \
+                           A[child][i] + reward > A[n][c]:
+                            A[n][c] = A[child][i] + reward
+                            D[n][c] = D[child][i] | {n}
+                            E[n][c] = E[child][i] + ((n, child), )
+
+            for i in A[lchild]:
+                for j in A[rchild]:
+                    c = lw + rw + i + j
+                    if c <= U:
+                        if (A[n].get(c) is None or
+                            A[lchild][i] + A[rchild][j] + reward > A[n][c]) and \
+                           len(D[lchild][i] & D[rchild][j]) == 0:
+                            A[n][c] = A[lchild][i] + A[rchild][j] + reward
+                            D[n][c] = D[lchild][i] | D[rchild][j] | {n}
+                            E[n][c] = (E[lchild][i] + E[rchild][j] +
+                                       ((n, lchild), (n, rchild)))
+
+        if not is_dummy(n):
+            memo.put(make_key(n), (A[n], D[n], E[n]))
+
+    best_cost = max(xrange(U + 1),
+                    key=lambda i: A[r][i] if i in A[r] else float('-inf'))
+
+    tree = DiGraph()
+    tree.add_node(r)
+    for parent, child in E[r][best_cost]:
+        tree.add_edge(parent, child)
+
+        # copy the attributes
+        tree[parent][child] = G[parent][child]
+        tree.node[parent] = G.node[parent]
+        tree.node[child] = G.node[child]
+    return tree
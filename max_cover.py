@@ -36,3 +36,60 @@ def k_best_trees(cand_trees, K):
     selected_ids = argmax_k_coverage(nodes_of_trees, K)
     pred_trees = [cand_trees[i] for i in selected_ids]
     return pred_trees
+
+
+class IncrementalKCoverage(object):
+    """
+    `argmax_k_coverage` over a growing list of sets.
+
+    The greedy trajectory(covered nodes before each round, the pick
+    and its gain) is kept. A new set, being the last one, only wins a
+    round if its gain is strictly larger than the pick's(ties go to the
+    lower index), so the trajectory is replayed from the first such
+    round only.
+    """
+    def __init__(self, k):
+        self.k = k
+        self.sets = []
+        self.covered = set()
+        # (covered before the round, picked index, gain)
+        self._rounds = []
+
+    def _greedy_from(self, j):
+        del self._rounds[j:]
+        if j > 0:
+            covered_before, i, _ = self._rounds[j - 1]
+            covered = covered_before | self.sets[i]
+        else:
+            covered = set()
+        for _ in xrange(j, self.k):
+            gains = [len(s - covered) for s in self.sets]
+            i = int(np.argmax(gains))
+            self._rounds.append((covered, i, gains[i]))
+            covered = covered | self.sets[i]
+        self.covered = covered
+
+    def add(self, s):
+        """add one set, return True if the selection changes"""
+        self.sets.append(s)
+        n = len(self.sets)
+        if n <= self.k:
+            # all sets are selected
+            self.covered = self.covered | s
+            return True
+        elif n == self.k + 1:
+            self._greedy_from(0)
+            return True
+        else:
+            for j, (covered_before, _, gain) in enumerate(self._rounds):
+                if len(s - covered_before) > gain:
+                    self._greedy_from(j)
+                    return True
+            return False
+
+    @property
+    def selected(self):
+        """indices of the selected sets"""
+        if len(self.sets) <= self.k:
+            return range(len(self.sets))
+        return [i for _, i, _ in self._rounds]
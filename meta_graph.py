@@ -16,11 +16,13 @@ logger.setLevel(logging.DEBUG)
 
 def convert_to_meta_graph(interaction_names, sources,
                           targets, datetimes,
-                          preprune_secs=None):
+                          preprune_secs=None,
+                          check_cycle=True):
     """
     sources: list of source node id for each interaction
     targets: list of target node ids for each interaction
     datetimes: happening time of the interactions
+    check_cycle: assert the result is a DAG
 
     All four fields shall be sorted from earliest to lastest
     according to datetimes
@@ -87,6 +89,11 @@ def convert_to_meta_graph(interaction_names, sources,
                     if (preprune_secs is None or
                         time_diff(time2, time1) <= preprune_secs):
                         g.add_edge(i1, i2)
+
+    if check_cycle:
+        # dag_util -> interactions -> meta_graph
+        from dag_util import assert_no_cycle
+        assert_no_cycle(g)
     return g
 
 
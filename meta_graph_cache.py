@@ -0,0 +1,555 @@
+# Content-addressed cache of meta graphs
+#
+# Every stage of `InteractionsUtil.get_topic_meta_graph` is cached
+# separately under a key derived from the hash of its inputs and
+# the full(normalized) parameters:
+#
+# - base: graph from `get_meta_graph`
+#     (interactions, preprune_secs, ...)
+# - topics: node topics(base, LDA model, message ids)
+# - bow: node tf-idf BoW(base, dictionary, tokenizer)
+# - hashtag_bow: node hashtag tf-idf(base)
+# - edge_dists: per-field edge distances(feature, dist_func),
+#     assembled into a N_edges x N_fields matrix
+# - weighted: graph with edge costs(features used, dist_func,
+#     distance_weights)
+#
+# so that changing only `distance_weights` costs
+# one matrix-vector product, see also `build_grid`.
+
+import os
+import hashlib
+import logging
+import cPickle as pkl
+import gensim
+import ujson as json
+import numpy as np
+import networkx as nx
+
+from datetime import timedelta
+from scipy.sparse import issparse, csr_matrix, vstack
+
+from interactions import InteractionsUtil as IU
+from compact_meta_graph import save_compact_meta_graph, load_meta_graph, \
+    COMPACT_SUFFIX
+from token_cache import tokenizer_signature
+from util import load_interactions
+
+logging.basicConfig(format="%(asctime)s;%(levelname)s;%(message)s",
+                    datefmt="%Y-%m-%d %H:%M:%S")
+logger = logging.getLogger("meta_graph_cache")
+logger.setLevel(logging.DEBUG)
+
+FEATURE_STAGES = ('topics', 'bow', 'hashtag_bow')
+
+
+def _code_signature(code):
+    """byte code, constants(nested code recursively) and names"""
+    consts = [_code_signature(c) if hasattr(c, 'co_code') else repr(c)
+              for c in code.co_consts]
+    return repr((code.co_code, consts, code.co_names))
+
+
+def _value_signature(v):
+    if callable(v):
+        return callable_signature(v)
+    if isinstance(v, np.ndarray):
+        # repr elides the middle of large arrays
+        return repr((v.dtype.str, v.shape,
+                     hashlib.sha1(v.tobytes()).hexdigest()))
+    return repr(v)
+
+
+def callable_signature(func):
+    """module and name of `func`,
+    plus hash of the code, defaults and closure values for lambdas
+    (which share the same name)
+    """
+    name = '{}.{}'.format(getattr(func, '__module__', None),
+                          getattr(func, '__name__', repr(func)))
+    code = getattr(func, 'func_code', None)
+    if code is not None and func.__name__ == '<lambda>':
+        cells = []
+        for cell in (func.func_closure or ()):
+            try:
+                cells.append(_value_signature(cell.cell_contents))
+            except ValueError:  # empty cell
+                cells.append(None)
+        defaults = map(_value_signature, func.func_defaults or ())
+        name += ':' + hashlib.sha1(
+            repr((_code_signature(code), defaults, cells))
+        ).hexdigest()[:12]
+    return name
+
+
+def normalize_param(v):
+    """make parameter values json-serializable without losing precision
+    """
+    if isinstance(v, bool) or v is None:
+        return v
+    elif isinstance(v, timedelta):
+        return repr(v.total_seconds())
+    elif isinstance(v, (int, long, float, np.number)):
+        return repr(float(v))
+    elif isinstance(v, dict):
+        return [[k, normalize_param(v[k])] for k in sorted(v)]
+    elif isinstance(v, (list, tuple)):
+        return [normalize_param(e) for e in v]
+    elif callable(v):
+        return callable_signature(v)
+    else:
+        return unicode(v)
+
+
+def params_signature(**params):
+    return hashlib.sha1(
+        json.dumps(normalize_param(params))
+    ).hexdigest()
+
+
+def hash_file(path, block_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+class MetaGraphCache(object):
+    """
+    Files under `cache_dir`:
+
+    - {stage}--{key}.pkl: graphs(gpickle)
+    - {stage}--{key}.npy or .npz: node features,
+      with {stage}--{key}.nodes.pkl as the row index
+    - {stage}--{key}.mg: weighted graph in compact format
+    - edges--{key}.pkl: edge order of the base graph
+    - edge_dists--{key}.npy: edge distances of one field, in edge order
+    - file_hashes.json: content hash of input files,
+      indexed by (path, size, mtime) to avoid re-hashing
+    """
+    def __init__(self, cache_dir):
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.cache_dir = cache_dir
+        self.file_hashes_path = os.path.join(cache_dir, 'file_hashes.json')
+        if os.path.exists(self.file_hashes_path):
+            with open(self.file_hashes_path) as f:
+                self.file_hashes = json.load(f)
+        else:
+            self.file_hashes = {}
+
+    def file_hash(self, path):
+        st = os.stat(path)
+        ident = '{}:{}:{!r}'.format(os.path.abspath(path),
+                                  st.st_size, st.st_mtime)
+        if ident not in self.file_hashes:
+            logger.debug('hashing {}'.format(path))
+            self.file_hashes[ident] = hash_file(path)
+            with open(self.file_hashes_path, 'w') as f:
+                json.dump(self.file_hashes, f)
+        return self.file_hashes[ident]
+
+    def key(self, stage, parents=(), **params):
+        """
+        parents: keys or file hashes the stage depends on
+        """
+        h = hashlib.sha1(stage)
+        for p in parents:
+            h.update(p)
+        h.update(params_signature(**params))
+        return h.hexdigest()[:16]
+
+    def path(self, stage, key, ext=''):
+        return os.path.join(self.cache_dir,
+                            '{}--{}{}'.format(stage, key, ext))
+
+    def load_graph(self, stage, key):
+        path = self.path(stage, key, '.pkl')
+        if os.path.exists(path):
+            logger.info('{} graph cache hit: {}'.format(stage, path))
+            return nx.read_gpickle(path)
+
+    def save_graph(self, stage, key, g):
+        nx.write_gpickle(g, self.path(stage, key, '.pkl'))
+
+    def load_feature(self, stage, key):
+        """node -> feature row, or None if not cached
+        """
+        nodes_path = self.path(stage, key, '.nodes.pkl')
+        if not os.path.exists(nodes_path):
+            return None
+        logger.info('{} feature cache hit: {}'.format(stage, nodes_path))
+        nodes = pkl.load(open(nodes_path, 'rb'))
+        if os.path.exists(self.path(stage, key, '.npy')):
+            mat = np.load(self.path(stage, key, '.npy'), mmap_mode='r')
+        else:
+            arrays = np.load(self.path(stage, key, '.npz'))
+            mat = csr_matrix((arrays['data'],
+                              arrays['indices'],
+                              arrays['indptr']),
+                             shape=tuple(arrays['shape']))
+        return {n: mat[i] for i, n in enumerate(nodes)}
+
+    def save_feature(self, stage, key, g):
+        nodes = g.nodes()
+        values = [g.node[n][stage] for n in nodes]
+        if all(issparse(v) for v in values):
+            mat = vstack(values, format='csr')
+            with open(self.path(stage, key, '.npz'), 'wb') as f:
+                np.savez(f,
+                         data=mat.data, indices=mat.indices,
+                         indptr=mat.indptr, shape=np.asarray(mat.shape))
+        else:
+            np.save(self.path(stage, key, '.npy'), np.vstack(values))
+        # written last as the completion marker
+        pkl.dump(nodes, open(self.path(stage, key, '.nodes.pkl'), 'wb'),
+                 protocol=pkl.HIGHEST_PROTOCOL)
+
+
+class CachedMetaGraphBuilder(object):
+    """
+    Build meta graphs like `InteractionsUtil.get_topic_meta_graph`
+    but through `MetaGraphCache`.
+
+    Inputs are loaded lazily, only when some stage is missing
+    """
+    def __init__(self, cache,
+                 interaction_path,
+                 msg_ids_path=None,
+                 lda_model_path=None,
+                 corpus_dict_path=None,
+                 given_topics=False,
+                 token_cache=None,
+                 topic_matrix_loader=None):
+        """
+        topic_matrix_loader: function (lda_model, msg_ids) -> TopicMatrix
+        """
+        self.cache = cache
+        self.interaction_path = interaction_path
+        self.msg_ids_path = msg_ids_path
+        self.lda_model_path = lda_model_path
+        self.corpus_dict_path = corpus_dict_path
+        self.given_topics = given_topics
+        self.token_cache = token_cache
+        self.topic_matrix_loader = topic_matrix_loader
+        self._inputs = {}
+
+    def _lazy(self, name, load_func):
+        if name not in self._inputs:
+            self._inputs[name] = load_func()
+        return self._inputs[name]
+
+    @property
+    def interactions(self):
+        return self._lazy('interactions',
+                          lambda: load_interactions(self.interaction_path))
+
+    @property
+    def msg_ids(self):
+        def load():
+            with open(self.msg_ids_path) as f:
+                return [l.strip() for l in f]
+        return self._lazy('msg_ids', load)
+
+    @property
+    def lda_model(self):
+        return self._lazy(
+            'lda_model',
+            lambda: gensim.models.wrappers.LdaMallet.load(
+                self.lda_model_path)
+        )
+
+    @property
+    def dictionary(self):
+        return self._lazy(
+            'dictionary',
+            lambda: gensim.corpora.dictionary.Dictionary.load(
+                self.corpus_dict_path)
+        )
+
+    def base_key(self, **graph_kws):
+        return self.cache.key(
+            'base',
+            [self.cache.file_hash(self.interaction_path)],
+            given_topics=self.given_topics,
+            **graph_kws
+        )
+
+    def feature_key(self, stage, base_key):
+        if self.given_topics:
+            # part of the base graph
+            return self.cache.key(stage, [base_key])
+        elif stage == 'topics':
+            parents = [base_key,
+                       self.cache.file_hash(self.lda_model_path),
+                       self.cache.file_hash(self.msg_ids_path)]
+            return self.cache.key(stage, parents)
+        elif stage == 'bow':
+            parents = [base_key,
+                       self.cache.file_hash(self.corpus_dict_path)]
+            return self.cache.key(stage, parents,
+                                  tokenizer=tokenizer_signature())
+        else:
+            return self.cache.key(stage, [base_key])
+
+    def weighted_path(self, weighted_key, meta_graph_format):
+        return self.cache.path(
+            'weighted', weighted_key,
+            COMPACT_SUFFIX if meta_graph_format == 'compact' else '.pkl'
+        )
+
+    def _base_graph(self, key, graph_kws):
+        mg = self.cache.load_graph('base', key)
+        if mg is None:
+            logger.debug('getting meta graph...')
+            mg = IU.get_meta_graph(self.interactions,
+                                   given_topics=self.given_topics,
+                                   **graph_kws)
+            self.cache.save_graph('base', key, mg)
+        return mg
+
+    def _add_feature(self, mg, stage, key):
+        node2row = self.cache.load_feature(stage, key)
+        if node2row is None:
+            logger.debug('adding {}...'.format(stage))
+            if stage == 'topics':
+                if self.topic_matrix_loader is not None:
+                    topic_matrix = self.topic_matrix_loader(
+                        self.lda_model, self.msg_ids
+                    )
+                else:
+                    topic_matrix = None
+                IU.add_topics_to_graph(mg, self.lda_model, self.dictionary,
+                                       msg_ids=self.msg_ids,
+                                       topic_matrix=topic_matrix)
+            elif stage == 'bow':
+                IU.add_bow_to_graph(mg, self.dictionary,
+                                    token_cache=self.token_cache)
+            else:
+                IU.add_hastag_bow_to_graph(mg)
+            self.cache.save_feature(stage, key, mg)
+        else:
+            for n in mg.nodes_iter():
+                mg.node[n][stage] = node2row[n]
+        return mg
+
+    def _graph_kws(self, preprune_secs, **kws):
+        if isinstance(preprune_secs, timedelta):
+            preprune_secs = preprune_secs.total_seconds()
+        kws['preprune_secs'] = preprune_secs
+        return kws
+
+    def _edge_distances(self, mg, base_key, dist_func, fields, field_keys):
+        """
+        N_edges x N_fields distance matrix,
+        each column is cached separately so that any
+        combination of fields can be assembled without recomputation
+        """
+        edges_path = self.cache.path('edges', base_key, '.pkl')
+        if os.path.exists(edges_path):
+            edges = pkl.load(open(edges_path, 'rb'))
+        else:
+            edges = mg.edges()
+            pkl.dump(edges, open(edges_path, 'wb'),
+                     protocol=pkl.HIGHEST_PROTOCOL)
+
+        columns = []
+        for f in fields:
+            key = self.cache.key('edge_dists', [field_keys[f]],
+                                 dist_func=dist_func)
+            path = self.cache.path('edge_dists', key, '.npy')
+            if os.path.exists(path):
+                logger.info('edge distance cache hit: {}'.format(path))
+                columns.append(np.load(path, mmap_mode='r'))
+            else:
+                logger.debug('computing edge distances of {}'.format(f))
+                _, col = IU.compute_edge_distances(mg, dist_func, [f],
+                                                   edges=edges)
+                np.save(path, col[:, 0])
+                columns.append(col[:, 0])
+        return edges, np.column_stack(columns)
+
+    def _build(self, dist_func, weight_grid, graph_kws,
+               meta_graph_format, recompute):
+        """
+        Return (meta graph weighted by the last missing weights or None,
+        paths of the weighted meta graphs)
+        """
+        base_key = self.base_key(**graph_kws)
+
+        for weights in weight_grid:
+            for k in weights:
+                assert k in FEATURE_STAGES
+            if self.given_topics:
+                assert weights.keys() == ['topics'], \
+                    'only topics are available when topics are given'
+        used_fields = [[f for f in FEATURE_STAGES if weights.get(f, 0) > 0]
+                       for weights in weight_grid]
+        fields = [f for f in FEATURE_STAGES
+                  if any(f in fs for fs in used_fields)]
+        field_keys = {f: self.feature_key(f, base_key) for f in fields}
+
+        paths = []
+        missing = []
+        for weights, fs in zip(weight_grid, used_fields):
+            weighted_key = self.cache.key(
+                'weighted', [base_key] + [field_keys[f] for f in fs],
+                dist_func=dist_func,
+                distance_weights=weights
+            )
+            path = self.weighted_path(weighted_key, meta_graph_format)
+            paths.append(path)
+            if recompute or not os.path.exists(path):
+                missing.append((weights, path))
+            else:
+                logger.info('weighted meta graph cache hit: {}'.format(path))
+
+        if not missing:
+            return None, paths
+
+        mg = self._base_graph(base_key, graph_kws)
+        if self.given_topics:
+            logger.info('topics are given')
+            for n in mg.nodes_iter():
+                mg.node[n]['topics'] = np.array(mg.node[n]['topics'])
+        else:
+            for f in fields:
+                mg = self._add_feature(mg, f, field_keys[f])
+
+        edges, dists_mat = self._edge_distances(mg, base_key, dist_func,
+                                                fields, field_keys)
+        for weights, path in missing:
+            logger.debug('assiging edge weights: {}'.format(weights))
+            IU.apply_edge_weights(mg, edges, dists_mat, fields, weights)
+            if meta_graph_format == 'compact':
+                save_compact_meta_graph(
+                    IU.compactize_meta_graph(mg, map_nodes=False), path
+                )
+            else:
+                nx.write_gpickle(
+                    IU.compactize_meta_graph(mg, map_nodes=False), path
+                )
+        return mg, paths
+
+    def build(self, dist_func,
+              distance_weights={'topics': 1},
+              preprune_secs=None,
+              undirected=False,
+              decompose_interactions=True,
+              remove_singleton=True,
+              apply_pagerank=False,
+              convert_time=True,
+              meta_graph_format='gpickle',
+              recompute=False):
+        """
+        Return (meta graph, path of the cached weighted meta graph)
+
+        recompute: ignore the weighted graph cache
+        (cached base graph, node features and edge distances are still used)
+        """
+        graph_kws = self._graph_kws(
+            preprune_secs,
+            undirected=undirected,
+            decompose_interactions=decompose_interactions,
+            remove_singleton=remove_singleton,
+            apply_pagerank=apply_pagerank,
+            convert_time=convert_time)
+        g, paths = self._build(dist_func, [distance_weights], graph_kws,
+                               meta_graph_format, recompute)
+        if g is None:
+            g = load_meta_graph(paths[0], features=('topics', ))
+        return g, paths[0]
+
+    def build_grid(self, dist_func,
+                   weight_grid,
+                   preprune_secs=None,
+                   undirected=False,
+                   decompose_interactions=True,
+                   remove_singleton=True,
+                   apply_pagerank=False,
+                   convert_time=True,
+                   meta_graph_format='gpickle',
+                   recompute=False):
+        """
+        Build one weighted meta graph per distance weights in `weight_grid`,
+        edge distances are computed once for all of them.
+
+        Return the paths of the weighted meta graphs
+        """
+        graph_kws = self._graph_kws(
+            preprune_secs,
+            undirected=undirected,
+            decompose_interactions=decompose_interactions,
+            remove_singleton=remove_singleton,
+            apply_pagerank=apply_pagerank,
+            convert_time=convert_time)
+        _, paths = self._build(dist_func, weight_grid, graph_kws,
+                               meta_graph_format, recompute)
+        return paths
+
+
+def parse_weight_grid(strs, fields=FEATURE_STAGES):
+    """['0.2,0.8,0', ...] -> [{'topics': 0.2, 'bow': 0.8}, ...]
+    """
+    grid = []
+    for s in strs:
+        values = map(float, s.split(','))
+        assert len(values) == len(fields), \
+            '{} weights expected: {}'.format(len(fields), s)
+        grid.append({f: v for f, v in zip(fields, values) if v > 0})
+    return grid
+
+
+def main():
+    import argparse
+    from scipy.spatial.distance import euclidean, cosine
+    from util import parse_time_delta
+
+    parser = argparse.ArgumentParser(
+        'Build cached meta graphs for a grid of distance weights'
+    )
+    parser.add_argument('--cache_dir', required=True)
+    parser.add_argument('--interaction_path', required=True)
+    parser.add_argument('--msg_ids_path')
+    parser.add_argument('--lda_path')
+    parser.add_argument('--corpus_dict_path')
+    parser.add_argument('--dist', choices=('euclidean', 'cosine'),
+                        default='cosine')
+    parser.add_argument('--max_time_distance', required=True,
+                        help='Example: 1-minutes, 2-hours, 15-days')
+    parser.add_argument('--weight_grid', nargs='+', required=True,
+                        help=("Weights of topics,bow,hashtag_bow, "
+                              "e.g, 0.2,0.8,0 1,0,0"))
+    parser.add_argument('--given_topics', action='store_true')
+    parser.add_argument('--not_convert_time', action='store_true')
+    parser.add_argument('--meta_graph_format',
+                        choices=('gpickle', 'compact'),
+                        default='gpickle')
+    args = parser.parse_args()
+
+    builder = CachedMetaGraphBuilder(
+        MetaGraphCache(args.cache_dir),
+        args.interaction_path,
+        msg_ids_path=args.msg_ids_path,
+        lda_model_path=args.lda_path,
+        corpus_dict_path=args.corpus_dict_path,
+        given_topics=args.given_topics
+    )
+    paths = builder.build_grid(
+        {'euclidean': euclidean, 'cosine': cosine}[args.dist],
+        parse_weight_grid(args.weight_grid),
+        preprune_secs=parse_time_delta(args.max_time_distance),
+        decompose_interactions=False,
+        convert_time=not args.not_convert_time,
+        meta_graph_format=args.meta_graph_format
+    )
+    for p in paths:
+        print(p)
+
+
+if __name__ == '__main__':
+    main()
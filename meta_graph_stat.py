@@ -5,9 +5,15 @@ import itertools
 import networkx as nx
 from pprint import pformat
 from collections import Counter
+from datetime import datetime
+from multiprocessing import Pool
 
 from interactions import InteractionsUtil as IU
+from interaction_index import InteractionIndex, contains, column_counts
+from node_times import NodeTimes
 from util import load_summary_related_data
+from token_cache import bow_to_gensim
+from topic_cache import EventTopicCache
 
 
 class MetaGraphStat(object):
@@ -22,28 +28,21 @@ class MetaGraphStat(object):
         for kw in kws:
             assert hasattr(self, kw) and callable(getattr(self, kw))
         self.kws = kws
+        self._node_times = None
+
+    @property
+    def node_times(self):
+        """`NodeTimes` of the graph, built on first use"""
+        if self._node_times is None:
+            self._node_times = NodeTimes(self.g)
+        return self._node_times
 
     def time_span(self):
-        if len(self.g.nodes()) == 0:
-            return {'start_time': None,
-                    'end_time': None}
-        else:
-            ds = [self.g.node[i]['datetime']
-                  for i in self.g.nodes()]
-            return {'start_time': min(ds),
-                    'end_time': max(ds)}
-            
+        return self.node_times.time_span()
+
     def temporal_traffic(self, time_resolution='day'):
-        time_fields = ('year', 'month', 'day', 'hour', 'minute', 'second')
-        assert time_resolution in time_fields
-
-        selected_attrs = time_fields[0: time_fields.index(time_resolution) + 1]
-        slice_datetime = (lambda dt: tuple([getattr(dt, attr)
-                                            for attr in selected_attrs]))
-        time_signatures = [slice_datetime(self.g.node[n]['datetime'])
-                           for n in self.g.nodes()]
-        return {'email_count_hist': sorted(Counter(time_signatures).items())}
-        
+        return self.node_times.temporal_traffic(time_resolution)
+
     def edge_costs(self, max_values=[1.0]):
         costs = np.asarray([self.g[s][t]['c'] for s, t in self.g.edges()])
         data = {'histogram(all)': np.histogram(costs)}
@@ -85,9 +84,8 @@ class MetaGraphStat(object):
         }
 
     def email_content(self, interactions, top_k=5, unique=True):
-        id2subject = {}
-        for m in interactions:
-            id2subject[m['message_id']] = m['subject']
+        """interactions: list or `InteractionIndex`"""
+        index = InteractionIndex.ensure(interactions)
 
         msgs = []
         mids = [self.g.node[n]['message_id']
@@ -96,14 +94,14 @@ class MetaGraphStat(object):
         if unique:
             msgs = set()
             for mid in mids:
-                cand_msg = id2subject[mid]
+                cand_msg = index.subject(mid)
                 if cand_msg not in msgs:
                     msgs.add(cand_msg)
                 if len(msgs) == top_k:
                     break
             msgs = list(msgs)
         else:
-            msgs = [id2subject[id] for id in mids[:top_k]]
+            msgs = [index.subject(id) for id in mids[:top_k]]
         return {
             'subjects(top{})'.format(top_k): msgs
         }
@@ -127,25 +125,44 @@ class MetaGraphStat(object):
 
         return np.mean(diffs)
 
-    def topics(self, interactions, dictionary, lda, top_k=10):
-        id2msg = {}
-        for m in interactions:
-            id2msg[m['message_id']] = u"{} {}".format(
-                m['subject'], m['body']
-            )
+    def concatenated_bow(self, interactions, dictionary, token_cache=None):
+        """BoW of the concatenated messages in the graph
+
+        Return (message ids, bow)
+        """
+        index = InteractionIndex.ensure(interactions)
 
-        # topic_dist
         message_ids = [self.g.node[n]['message_id']
                        for n in self.g.nodes()]
-        concated_msg = ' '.join([id2msg[mid] for mid in message_ids])
-        bow = dictionary.doc2bow(IU.tokenize_document(concated_msg))
-        topic_dist = lda.__getitem__(bow, iterations=100)
-        print("topic inference done")
-        # topic_dist = lda.get_document_topics(
-        #     bow,
-        #     minimum_probability=0
-        # )
-        topic_dist = np.asarray([v for _, v in topic_dist])
+        if token_cache is not None:
+            bow = bow_to_gensim(
+                token_cache.bow_matrix(message_ids, index.text,
+                                       dictionary).sum(axis=0)
+            )
+        else:
+            concated_msg = ' '.join([index.text(mid) for mid in message_ids])
+            bow = dictionary.doc2bow(IU.tokenize_document(concated_msg))
+        return message_ids, bow
+
+    def topics(self, interactions, dictionary, lda, top_k=10,
+               token_cache=None, topic_cache=None):
+        """
+        topic_cache: `topic_cache.EventTopicCache`,
+        if given, inference result is cached by the message ids
+        """
+        # topic_dist
+        message_ids, bow = self.concatenated_bow(interactions, dictionary,
+                                                 token_cache=token_cache)
+        if topic_cache is not None:
+            topic_dist = np.array(topic_cache.get(message_ids, bow))
+        else:
+            topic_dist = lda.__getitem__(bow, iterations=100)
+            print("topic inference done")
+            # topic_dist = lda.get_document_topics(
+            #     bow,
+            #     minimum_probability=0
+            # )
+            topic_dist = np.asarray([v for _, v in topic_dist])
 
         # some mask to filter out trivial topics
         topic_dist[topic_dist < 0.05] = 0
@@ -175,29 +192,40 @@ class MetaGraphStat(object):
                 # 'topic_divergence': topic_divergence
                 }
 
-    def frequent_terms(self, interactions, top_k=10):
-        id2msg = {}
-        for m in interactions:
-            id2msg[m['message_id']] = u"{} {}".format(
-                m['subject'], m['body']
-            )
+    def frequent_terms(self, interactions, top_k=10, token_cache=None):
+        index = InteractionIndex.ensure(interactions)
 
         # topic_dist
         message_ids = [self.g.node[n]['message_id']
                        for n in self.g.nodes()]
-        concated_msg = ' '.join([id2msg[mid] for mid in message_ids])
-        tokens = IU.tokenize_document(concated_msg)
+        if token_cache is not None:
+            tokens = list(itertools.chain(
+                *token_cache.tokens(message_ids, index.text)
+            ))
+        else:
+            concated_msg = ' '.join([index.text(mid) for mid in message_ids])
+            tokens = IU.tokenize_document(concated_msg)
         freqs = Counter(tokens)
         terms = [t for t, _ in freqs.most_common(top_k)]
         print 'frequent_terms', terms
         return terms
 
-    def tfidf_terms(self, interactions, dictionary, top_k=10):
-        text = '\n'.join(['{} {}'.format(m['subject'], m['body'])
-                   for m in interactions])
+    def tfidf_terms(self, interactions, dictionary, top_k=10,
+                    token_cache=None):
         tfidf_vec = pkl.load(open('/cs/home/hxiao/code/lst/tmp/tfidf.pkl'))
-        counts = dictionary.doc2bow(
-            IU.tokenize_document(text)
+        if token_cache is not None:
+            index = InteractionIndex.ensure(interactions)
+            counts = bow_to_gensim(
+                token_cache.bow_matrix([m['message_id']
+                                        for m in interactions],
+                                       index.text,
+                                       dictionary).sum(axis=0)
+            )
+        else:
+            text = '\n'.join(['{} {}'.format(m['subject'], m['body'])
+                              for m in interactions])
+            counts = dictionary.doc2bow(
+                IU.tokenize_document(text)
             )
         raw_vect = np.zeros(len(dictionary.keys()))
         for word, cnt in counts:
@@ -228,63 +256,28 @@ class MetaGraphStat(object):
 
         peopleid2info = {r['id']: people_repr_template.format(**r)
                          for r in people_info}
-        id2interaction = {i['message_id']: i
-                          for i in interactions}
+        index = InteractionIndex.ensure(interactions)
+        cols = index.people_columns()
+        rows = index.row_array([self.g.node[n]['message_id']
+                                for n in self.g.nodes_iter()])
         result = {}
         if not undirected:
-            def populate_user_info(counter):
-                data = dict(map(lambda (people_id, count):
-                                (peopleid2info[people_id], count),
-                                counter.items()))
-                return Counter(data)
-
-            result['sender_count'] = Counter(
-                [peopleid2info.get(
-                    id2interaction[self.g.node[n]['message_id']]['sender_id'],
-                    'unknown')
-                 for n in self.g.nodes()]
-            )
-
-            # result['sender_count'] = populate_user_info(result['sender_count'])
-
-            # result['recipient_count'] = Counter([
-            #     r
-            #     for n in self.g.nodes()
-            #     for r in \
-            #     id2interaction[self.g.node[n]['message_id']]['recipient_ids']
-            # ])
-            # result['recipient_count'] = populate_user_info(
-            #     result['recipient_count']
-            # )
-            
-            # result['participant_count'] = (result['sender_count'] +
-            #                                result['recipient_count'])
+            counts = np.bincount(cols.senders[rows],
+                                 minlength=len(cols.person_ids))
+            # people ids can share the same repr
+            sender_count = Counter()
+            for c in np.nonzero(counts)[0]:
+                sender_count[peopleid2info.get(cols.person_ids[c],
+                                               'unknown')] += int(counts[c])
+            result['sender_count'] = sender_count
             result['participant_count'] = result['sender_count']
-
-            # result['sender_entropy'] = scipy.stats.entropy(
-            #     result['sender_count'].values())
-            # result['recipient_entropy'] = scipy.stats.entropy(
-            #     result['recipient_count'].values())
             result['participant_entropy'] = scipy.stats.entropy(
                 result['participant_count'].values())
-            
-            # for key in ('sender_count', 'recipient_count',
-            #             'participant_count'):
-            #     result[key] = sorted(result[key].items(),
-            #                          key=lambda (info, c): (c, info),
-            #                          reverse=True)[:top_k]
-            
         else:
-            cnt = Counter(
-                itertools.chain(
-                    *[
-                        map(
-                            lambda k: peopleid2info[k],
-                            id2interaction[self.g.node[n]['message_id']]['participant_ids']
-                        )
-                        for n in self.g.nodes_iter()
-                  ]
-                ))
+            counts = column_counts(cols.participants, rows)
+            cnt = Counter()
+            for c in np.nonzero(counts)[0]:
+                cnt[peopleid2info[cols.person_ids[c]]] += int(counts[c])
             result['participant_count'] = cnt
 
         result['participant_count'] = sorted(
@@ -295,36 +288,42 @@ class MetaGraphStat(object):
 
     def link_type_freq(self, interactions, undirected=False):
         if not undirected:
-            id2i = {}
-            for m in interactions:
-                id2i[m['message_id']] = m
-
-            counter = Counter()
-            for k in ('broadcast', 'reply', 'relay'):
-                counter[k] = 0
-            for s, t in self.g.edges_iter():
-                src_sender_id, src_recipient_ids = id2i[s]['sender_id'],\
-                                                   set(id2i[s]['recipient_ids'])
-                tar_sender_id, tar_recipient_ids = id2i[t]['sender_id'],\
-                                                   set(id2i[t]['recipient_ids'])
-                if src_sender_id == tar_sender_id:
-                    counter['broadcast'] += 1
-                elif tar_sender_id in src_recipient_ids:
-                    if src_sender_id in tar_recipient_ids:
-                        counter['reply'] += 1
-                    else:
-                        counter['relay'] += 1
-                else:
-                    raise ValueError('Invalid lin type')
-            return dict(counter)
+            index = InteractionIndex.ensure(interactions)
+            cols = index.people_columns()
+            edges = self.g.edges()
+            src = index.row_array([s for s, _ in edges])
+            tar = index.row_array([t for _, t in edges])
+            src_senders = cols.senders[src]
+            tar_senders = cols.senders[tar]
+
+            broadcast = (src_senders == tar_senders)
+            # target sender among the source recipients and vice versa
+            forwarded = contains(cols.recipients, src, tar_senders)
+            replied = contains(cols.recipients, tar, src_senders)
+            if np.any(~broadcast & ~forwarded):
+                raise ValueError('Invalid lin type')
+            return {
+                'broadcast': int(broadcast.sum()),
+                'reply': int((~broadcast & forwarded & replied).sum()),
+                'relay': int((~broadcast & forwarded & ~replied).sum())
+            }
         else:
             return 'not available for undirected graph'
 
-    def summary_dict(self):
-        return {m: getattr(self, m)(**self.kws[m])
-                for m in self.kws.keys()
-                if callable(getattr(self, m))
-        }
+    def summary_dict(self, timings=None):
+        """
+        timings: dict, seconds spent in each section are added to it
+        """
+        d = {}
+        for m in self.kws.keys():
+            if not callable(getattr(self, m)):
+                continue
+            start = datetime.now()
+            d[m] = getattr(self, m)(**self.kws[m])
+            if timings is not None:
+                timings[m] = timings.get(m, 0) + \
+                    (datetime.now() - start).total_seconds()
+        return d
 
     def summary(self):
         return pformat(self.summary_dict())
@@ -332,9 +331,13 @@ class MetaGraphStat(object):
 
 def build_default_summary_kws(interactions, people_info,
                               dictionary, lda, people_repr_template,
-                              undirected=False):
-    interactions = IU.clean_interactions(interactions,
-                                         undirected=undirected)
+                              undirected=False,
+                              token_cache=None,
+                              topic_cache=None):
+    # indexed once, shared by all stats and events
+    interactions = InteractionIndex(
+        IU.clean_interactions(interactions, undirected=undirected)
+    )
     summary_kws = {
         'basic_structure_stats': {},
         'time_span': {},
@@ -343,7 +346,9 @@ def build_default_summary_kws(interactions, people_info,
             'interactions': interactions,
             'dictionary': dictionary,
             'lda': lda,
-            'top_k': 10
+            'top_k': 10,
+            'token_cache': token_cache,
+            'topic_cache': topic_cache
         },
         'email_content': {
             'interactions': interactions,
@@ -362,12 +367,14 @@ def build_default_summary_kws(interactions, people_info,
         },
         # 'frequent_terms': {
         #     'interactions': interactions,
-        #     'top_k': 10
+        #     'top_k': 10,
+        #     'token_cache': token_cache
         # },
         # 'tfidf_terms': {
         #     'interactions': interactions,
         #     'dictionary': dictionary,
-        #     'top_k': 10
+        #     'top_k': 10,
+        #     'token_cache': token_cache
         # }
     }
     return summary_kws
@@ -376,13 +383,118 @@ def build_default_summary_kws(interactions, people_info,
 def build_default_summary_kws_from_path(
         interactions_path, people_path,
         corpus_dict_path, lda_model_path, people_repr_template,
-        undirected=False):
+        undirected=False,
+        token_cache=None,
+        cache_event_topics=False):
+    interactions, people_info, dictionary, lda = load_summary_related_data(
+        interactions_path, people_path,
+        corpus_dict_path, lda_model_path
+    )
+    if cache_event_topics:
+        topic_cache = EventTopicCache(lda)
+    else:
+        topic_cache = None
     return build_default_summary_kws(
-        *load_summary_related_data(
-            interactions_path, people_path,
-            corpus_dict_path, lda_model_path
-        ),
+        interactions, people_info, dictionary, lda,
         people_repr_template=people_repr_template,
-        undirected=undirected
+        undirected=undirected,
+        token_cache=token_cache,
+        topic_cache=topic_cache
     )
-    
+
+
+def prefetch_event_topics(events, summary_kws):
+    """infer the topics of all events in one go
+    if `topic_cache` is given in `summary_kws`
+    """
+    kws = summary_kws.get('topics')
+    if not kws or kws.get('topic_cache') is None:
+        return
+    kws['topic_cache'].prefetch(
+        [MetaGraphStat(e).concatenated_bow(
+            kws['interactions'], kws['dictionary'],
+            token_cache=kws.get('token_cache'))
+         for e in events]
+    )
+
+
+def use_interaction_index(summary_kws, index=None):
+    """
+    Copy of `summary_kws` whose `interactions` are all the same
+    `InteractionIndex`, `index` if given, otherwise built once
+    over the first interactions found
+    """
+    new_kws = {}
+    for method, kws in summary_kws.items():
+        if 'interactions' in kws:
+            if index is None:
+                index = InteractionIndex.ensure(kws['interactions'])
+            kws = dict(kws, interactions=index)
+        new_kws[method] = kws
+    return new_kws
+
+
+# set in each worker of `summarize_events`,
+# inherited from the parent process instead of pickled per event
+_worker_summary_kws = None
+
+
+def _init_summary_worker(summary_kws):
+    global _worker_summary_kws
+    _worker_summary_kws = summary_kws
+
+
+def _summarize_event(e):
+    timings = {}
+    d = MetaGraphStat(e, _worker_summary_kws).summary_dict(timings)
+    return d, timings
+
+
+def summarize_events(events, summary_kws, n_jobs=1,
+                     interaction_index=None, timings=None):
+    """
+    Generator of `MetaGraphStat.summary_dict` of events, in order.
+
+    The interactions are indexed once and the event topics are inferred
+    in one go if `topic_cache` is given(always if `n_jobs` > 1,
+    as Mallet inference cannot run in several processes at once),
+    the rest of the summaries are done by `n_jobs` processes,
+    which share the loaded data.
+
+    interaction_index: see `use_interaction_index`
+    timings: dict, seconds spent in each section(over all events)
+        are added to it
+    """
+    summary_kws = use_interaction_index(summary_kws, interaction_index)
+    topic_kws = summary_kws.get('topics')
+    if n_jobs > 1 and topic_kws and topic_kws.get('topic_cache') is None:
+        # Mallet infers through fixed temporary files,
+        # so the workers should only read the prefetched topics
+        summary_kws['topics'] = dict(
+            topic_kws, topic_cache=EventTopicCache(topic_kws['lda'])
+        )
+    if timings is not None:
+        start = datetime.now()
+    prefetch_event_topics(events, summary_kws)
+    if timings is not None:
+        timings['topics_prefetch'] = timings.get('topics_prefetch', 0) + \
+            (datetime.now() - start).total_seconds()
+
+    if n_jobs == 1:
+        _init_summary_worker(summary_kws)
+        results = (_summarize_event(e) for e in events)
+        pool = None
+    else:
+        pool = Pool(n_jobs, initializer=_init_summary_worker,
+                    initargs=(summary_kws, ))
+        results = pool.imap(_summarize_event, events)
+    try:
+        for d, event_timings in results:
+            if timings is not None:
+                for m, secs in event_timings.items():
+                    timings[m] = timings.get(m, 0) + secs
+            yield d
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
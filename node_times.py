@@ -0,0 +1,108 @@
+# Node datetimes of a graph as one datetime64 array
+#
+# Time spans and traffic histograms are computed with
+# datetime64 truncation and np.unique/bincount,
+# for the whole graph or for many subgraphs(node index arrays) at once.
+
+import numpy as np
+
+from datetime import datetime
+
+TIME_FIELDS = ('year', 'month', 'day', 'hour', 'minute', 'second')
+TIME_UNITS = {'year': 'Y', 'month': 'M', 'day': 'D',
+              'hour': 'h', 'minute': 'm', 'second': 's'}
+
+
+class NodeTimes(object):
+    """
+    g: graph whose nodes have `datetime`,
+        either datetime objects or numbers(timestamps)
+    nodes: node order, `g.nodes()` if None
+    """
+    def __init__(self, g, nodes=None):
+        if nodes is None:
+            nodes = g.nodes()
+        self.nodes = nodes
+        self.node2i = {n: i for i, n in enumerate(nodes)}
+        ds = [g.node[n]['datetime'] for n in nodes]
+        self.is_datetime = bool(ds) and isinstance(ds[0], datetime)
+        if self.is_datetime:
+            self.times = np.array(ds, dtype='datetime64[us]')
+        else:
+            self.times = np.array(ds)
+
+    def indices(self, nodes):
+        return np.array([self.node2i[n] for n in nodes], dtype=np.int64)
+
+    def _select(self, idx):
+        if idx is None:
+            return self.times
+        return self.times[idx]
+
+    def time_span(self, idx=None):
+        times = self._select(idx)
+        if len(times) == 0:
+            return {'start_time': None,
+                    'end_time': None}
+        return {'start_time': times.min().item(),
+                'end_time': times.max().item()}
+
+    def time_spans(self, idx_list):
+        """`time_span` of each index array"""
+        sizes = np.array([len(idx) for idx in idx_list], dtype=np.int64)
+        spans = [{'start_time': None, 'end_time': None}
+                 for _ in idx_list]
+        non_empty = np.nonzero(sizes)[0]
+        if len(non_empty) == 0:
+            return spans
+        times = self.times[np.concatenate([idx_list[i] for i in non_empty])]
+        offsets = np.concatenate([[0], np.cumsum(sizes[non_empty])[:-1]])
+        starts = np.minimum.reduceat(times, offsets)
+        ends = np.maximum.reduceat(times, offsets)
+        for i, s, e in zip(non_empty, starts, ends):
+            spans[i] = {'start_time': s.item(), 'end_time': e.item()}
+        return spans
+
+    def _truncate(self, times, time_resolution):
+        assert time_resolution in TIME_FIELDS
+        assert self.is_datetime or len(times) == 0, \
+            'temporal traffic requires datetime objects'
+        unit = TIME_UNITS[time_resolution]
+        return times.astype('datetime64[{}]'.format(unit))
+
+    def _signature(self, t, time_resolution):
+        fields = TIME_FIELDS[0: TIME_FIELDS.index(time_resolution) + 1]
+        dt = t.astype('datetime64[us]').item()
+        return tuple([getattr(dt, f) for f in fields])
+
+    def temporal_traffic(self, time_resolution='day', idx=None):
+        truncated = self._truncate(self._select(idx), time_resolution)
+        keys, inverse = np.unique(truncated, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(keys))
+        return {'email_count_hist': [
+            (self._signature(k, time_resolution), int(c))
+            for k, c in zip(keys, counts)
+        ]}
+
+    def temporal_traffics(self, idx_list, time_resolution='day'):
+        """`temporal_traffic` of each index array"""
+        results = [{'email_count_hist': []} for _ in idx_list]
+        sizes = [len(idx) for idx in idx_list]
+        if sum(sizes) == 0:
+            return results
+        groups = np.repeat(np.arange(len(idx_list)), sizes)
+        truncated = self._truncate(
+            self.times[np.concatenate([idx for idx in idx_list
+                                       if len(idx) > 0])],
+            time_resolution
+        )
+        keys, key_codes = np.unique(truncated, return_inverse=True)
+        # (group, time key) pairs in ascending order
+        pairs, pair_inverse = np.unique(groups * len(keys) + key_codes,
+                                        return_inverse=True)
+        counts = np.bincount(pair_inverse)
+        signatures = [self._signature(k, time_resolution) for k in keys]
+        for p, c in zip(pairs, counts):
+            group, k = divmod(int(p), len(keys))
+            results[group]['email_count_hist'].append((signatures[k], int(c)))
+        return results
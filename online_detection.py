@@ -0,0 +1,322 @@
+# Sliding-window online event detection
+#
+# Interactions are fed into an `IncrementalMetaGraph`.
+# At every tick(in stream time):
+#
+# 1. roots whose `timespan` window has closed are finalized,
+#    i.e, their rooted DAG can no longer grow
+# 2. finalized roots are prioritized like `AdaptiveSampler`
+#    (explore by quota upperbound / exploit by node scores of found trees)
+#    and candidate trees are computed until the per-tick budget runs out
+# 3. the max-coverage selection over trees rooted in the last
+#    `selection_window_secs` is refreshed
+
+import bisect
+import logging
+import random
+import numpy as np
+
+from collections import deque
+from datetime import datetime
+
+from gen_candidate_trees import calc_tree
+from incremental_meta_graph import IncrementalMetaGraph
+from interactions import InteractionsUtil as IU
+from max_cover import k_best_trees
+from sampler import AdaptiveSampler, quota_upperbound, log_x_density
+
+logging.basicConfig(format="%(asctime)s;%(levelname)s;%(message)s",
+                    datefmt="%Y-%m-%d %H:%M:%S")
+logger = logging.getLogger("online_detection")
+logger.setLevel(logging.DEBUG)
+
+
+class OnlineAdaptiveSampler(AdaptiveSampler):
+    """
+    `AdaptiveSampler` whose candidate roots are added as they are finalized
+    instead of being known upfront
+    """
+    def __init__(self, g, B, timespan_secs, node_score_func=log_x_density):
+        # the roots are not known yet, skip AdaptiveSampler.__init__
+        super(AdaptiveSampler, self).__init__(g, timespan_secs)
+        self.B = B
+        self.node_score_func = node_score_func
+        self.covered_nodes = set()
+        self.node2score = {}
+
+        # (-upperbound, root) in ascending order
+        self._pending = []
+        self.root2upperbound = {}
+
+    def add_root(self, r, dag):
+        ub = quota_upperbound(dag, r, self.B)
+        self.root2upperbound[r] = ub
+        bisect.insort(self._pending, (-ub, r))
+
+    def remove_root(self, r):
+        """Return True if `r` was pending"""
+        if r in self.root2upperbound:
+            ub = self.root2upperbound.pop(r)
+            self._pending.remove((-ub, r))
+            return True
+        self.node2score.pop(r, None)
+        return False
+
+    @property
+    def n_pending(self):
+        return len(self._pending)
+
+    @property
+    def roots_sorted_by_upperbound(self):
+        return [r for _, r in self._pending]
+
+    @property
+    def n_nodes_to_cover(self):
+        return max(1, len(self.covered_nodes) + len(self._pending))
+
+    def random_action(self, debug=False):
+        best_ub = -self._pending[0][0]
+        scores = [self.node2score[r] for _, r in self._pending
+                  if r in self.node2score]
+        best_score = max(scores) if scores else 0
+        if random.random() < best_ub / float(best_ub + best_score):
+            return 'explore'
+        else:
+            return 'exploit'
+
+    def take(self):
+        """take one pending root, None if there is none
+        """
+        while self._pending:
+            if self.random_action() == 'explore':
+                _, r = self._pending[0]
+            else:
+                r = max((r for _, r in self._pending
+                         if r in self.node2score),
+                        key=lambda n: self.node2score[n])
+            self.remove_root(r)
+            if r not in self.covered_nodes:
+                return self.root_and_dag(r)
+        return None
+
+
+class OnlineEventDetector(object):
+    """
+    gen_tree_func: e.g, `lst_dag` with bound parameters, as in
+        `gen_candidate_trees.run`
+    timespan_secs: maximum time span of one event
+    preprune_secs: maximum time difference of an edge
+    edge_cost_func: see `incremental_meta_graph.make_edge_cost_func`
+    tick_secs: how often(in stream time) roots are finalized
+    tick_budget_secs: wall-clock seconds per tick for tree computation,
+        at least one tree is computed per tick
+    selection_window_secs: trees rooted within the last window are
+        considered by the max-coverage selection.
+        Older trees are dropped at each tick, so between ticks
+        `trees` can hold trees up to
+        `selection_window_secs + tick_secs` old
+    k: number of events to select
+    """
+    def __init__(self, gen_tree_func,
+                 U, timespan_secs, preprune_secs,
+                 edge_cost_func,
+                 tick_secs,
+                 tick_budget_secs,
+                 selection_window_secs,
+                 k=10,
+                 should_binarize_dag=False,
+                 dijkstra=False,
+                 retention_secs=None,
+                 convert_time=True):
+        if retention_secs is None:
+            retention_secs = max(2 * timespan_secs, selection_window_secs)
+        assert retention_secs > timespan_secs
+
+        self.gen_tree_func = gen_tree_func
+        self.U = U
+        self.timespan_secs = timespan_secs
+        self.tick_secs = tick_secs
+        self.tick_budget_secs = tick_budget_secs
+        self.selection_window_secs = selection_window_secs
+        self.k = k
+        self.should_binarize_dag = should_binarize_dag
+        self.gen_tree_kws = {'timespan': timespan_secs,
+                             'U': U,
+                             'dijkstra': dijkstra}
+
+        self.meta_graph = IncrementalMetaGraph(
+            preprune_secs,
+            retention_secs=retention_secs,
+            edge_cost_func=edge_cost_func,
+            on_expire=self._on_expire,
+            convert_time=convert_time
+        )
+        self.sampler = OnlineAdaptiveSampler(
+            self.meta_graph.g, U, timespan_secs
+        )
+
+        # nodes whose timespan window is not closed yet, in time order
+        self._open = deque()
+        # (root time, tree) in the order of computation
+        self.trees = []
+        self.selected_trees = []
+
+        self.last_tick = None
+        self._finalized_at = {}  # root -> wall-clock time
+        self.latencies = []  # wall-clock secs from finalization to tree
+        self.n_interactions = 0
+        self.n_dropped = 0
+        self.n_ticks = 0
+        self._start = None
+
+    def _time_diff(self, t1, t2):
+        return self.meta_graph._time_diff(t1, t2)
+
+    def _on_expire(self, n, attrs):
+        if self.sampler.remove_root(n):
+            # expired before any budget was left for it
+            self.n_dropped += 1
+        self._finalized_at.pop(n, None)
+
+    def add(self, interaction):
+        if self._start is None:
+            self._start = datetime.now()
+        n = self.meta_graph.add(interaction)
+        if n is None:
+            return
+        self.n_interactions += 1
+        now = self.meta_graph.latest_time
+        self._open.append((now, n))
+
+        if self.last_tick is None:
+            self.last_tick = now
+        elif self._time_diff(now, self.last_tick) >= self.tick_secs:
+            self.tick(now)
+
+    def finalize_roots(self, now, close_all=False):
+        g = self.meta_graph.g
+        while self._open and \
+                (close_all or
+                 self._time_diff(now, self._open[0][0]) > self.timespan_secs):
+            _, r = self._open.popleft()
+            if r in g and g.out_degree(r) > 0:
+                dag = IU.get_rooted_subgraph_within_timespan(
+                    g, r, self.timespan_secs
+                )
+                self.sampler.add_root(r, dag)
+                self._finalized_at[r] = datetime.now()
+
+    def compute_trees(self, budget_secs=None):
+        start = datetime.now()
+        while True:
+            taken = self.sampler.take()
+            if taken is None:
+                break
+            r, dag = taken
+            tree = calc_tree(len(self.trees), r, dag, self.U,
+                             self.gen_tree_func,
+                             self.gen_tree_kws,
+                             print_summary=False,
+                             should_binarize_dag=self.should_binarize_dag)
+            self.sampler.update(r, tree)
+            self.trees.append((self.meta_graph.g.node[r]['datetime'], tree))
+            self.latencies.append(
+                (datetime.now() - self._finalized_at.pop(r)).total_seconds()
+            )
+            if budget_secs is not None and \
+                    (datetime.now() - start).total_seconds() >= budget_secs:
+                break
+
+    def select(self, now):
+        self.trees = [(t, tree) for t, tree in self.trees
+                      if self._time_diff(now, t) <=
+                      self.selection_window_secs]
+        cand_trees = [tree for _, tree in self.trees
+                      if tree.number_of_edges() > 0]
+        self.selected_trees = k_best_trees(cand_trees, self.k)
+        return self.selected_trees
+
+    def tick(self, now):
+        self.n_ticks += 1
+        self.last_tick = now
+        self.finalize_roots(now)
+        self.compute_trees(self.tick_budget_secs)
+        self.select(now)
+
+    def flush(self):
+        """close all windows and compute all remaining trees,
+        e.g, at the end of a replay
+        """
+        now = self.meta_graph.latest_time
+        self.finalize_roots(now, close_all=True)
+        self.compute_trees()
+        return self.select(now)
+
+    def metrics(self):
+        secs = (datetime.now() - self._start).total_seconds() \
+            if self._start else 0
+        latencies = np.asarray(self.latencies)
+        return {
+            'n_interactions': self.n_interactions,
+            'n_trees': len(self.latencies),
+            'n_dropped_roots': self.n_dropped,
+            'n_pending_roots': self.sampler.n_pending,
+            'n_ticks': self.n_ticks,
+            'interactions_per_sec': (self.n_interactions / secs
+                                     if secs else 0),
+            'trees_per_sec': len(self.latencies) / secs if secs else 0,
+            'mean_latency': (latencies.mean()
+                             if len(latencies) else 0),
+            'p95_latency': (np.percentile(latencies, 95)
+                            if len(latencies) else 0)
+        }
+
+
+def main():
+    import argparse
+    from pprint import pprint
+    from scipy.spatial.distance import cosine
+
+    from lst import lst_dag
+    from incremental_meta_graph import replay_interactions, \
+        make_edge_cost_func
+    from util import parse_time_delta
+
+    parser = argparse.ArgumentParser(
+        'Replay interactions(with given topics) through online detection'
+    )
+    parser.add_argument('--interaction_path', required=True)
+    parser.add_argument('--U', type=float, default=0.5)
+    parser.add_argument('--max_time_distance', required=True,
+                        help='Example: 1-minutes, 2-hours, 15-days')
+    parser.add_argument('--max_time_span', required=True)
+    parser.add_argument('--tick', required=True)
+    parser.add_argument('--selection_window', required=True)
+    parser.add_argument('--tick_budget_secs', type=float, default=1.0)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--fixed_point', type=int, default=1)
+    args = parser.parse_args()
+
+    secs = lambda s: parse_time_delta(s).total_seconds()
+    detector = OnlineEventDetector(
+        lambda g, r, U: lst_dag(g, r, U,
+                                edge_weight_decimal_point=args.fixed_point,
+                                debug=False),
+        args.U,
+        secs(args.max_time_span),
+        secs(args.max_time_distance),
+        make_edge_cost_func(cosine),
+        tick_secs=secs(args.tick),
+        tick_budget_secs=args.tick_budget_secs,
+        selection_window_secs=secs(args.selection_window),
+        k=args.k,
+        should_binarize_dag=True
+    )
+    for i in replay_interactions(args.interaction_path):
+        detector.add(i)
+    detector.flush()
+    pprint(detector.metrics())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
 import pandas as pd
-import networkx as nx
 import argparse
 
+from compact_meta_graph import load_meta_graph
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
 
@@ -12,7 +13,7 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     df = pd.read_json(args.json_path)
-    g = nx.read_gpickle(args.meta_graph_path)
+    g = load_meta_graph(args.meta_graph_path, features=())
 
     node_ids = set([g.node[n]['message_id'] for n in g.nodes_iter()])
 
@@ -2,6 +2,7 @@ import random
 import numpy as np
 import networkx as nx
 from interactions import InteractionsUtil as IU
+from experiment_util import weighted_sample_without_replacement
 
 
 def quota_upperbound(g,
@@ -120,6 +121,28 @@ class RandomSampler(RootedTreeSampler):
         return self.root_and_dag(n)
 
 
+class WeightedSampler(RootedTreeSampler):
+    """
+    Roots are drawn without replacement with probability
+    proportional to `weight_func`(out degree by default)
+    """
+    def __init__(self, g, timespan_secs, weight_func=None):
+        super(WeightedSampler, self).__init__(g, timespan_secs)
+        if weight_func is None:
+            weight_func = g.out_degree
+        nodes = g.nodes()
+        order = weighted_sample_without_replacement(
+            [weight_func(n) for n in nodes],
+            len(nodes)
+        )
+        # reversed so that `take` pops from the end
+        self.nodes = [nodes[i] for i in order[::-1]]
+
+    def take(self):
+        n = self.nodes.pop()
+        return self.root_and_dag(n)
+
+
 class DeterministicSampler(RootedTreeSampler):
     def __init__(self, g, roots, timespan_secs):
         super(DeterministicSampler, self).__init__(g, timespan_secs)
@@ -7,6 +7,7 @@ import matplotlib.pyplot as plt
 
 from check_k_best_trees import k_best_trees
 from dag_util import get_roots
+from max_cover import IncrementalKCoverage
 
 def correct_roots_ratio(acc_trees, true_trees):
     pass
@@ -56,7 +57,70 @@ def roots(acc_trees, true_trees, k):
     return len(roots & true_roots) / float(len(true_roots))
 
 
+# metrics that `evaluate_curves` computes incrementally
+INCREMENTAL_METRICS = set([k_max_setcover, precision, recall, f1, roots])
+
+
+def evaluate_curves(pred_trees, true_trees, metric_names, k):
+    """
+    Curves of the metrics(name -> scores, one per tree prefix),
+    as `evaluate` gives for each metric, computed in one pass.
+
+    The k best trees selection and the covered nodes are updated
+    as trees arrive(see `max_cover.IncrementalKCoverage`)
+    """
+    cover = IncrementalKCoverage(k)
+    wanted = set(metric_names)
+    # as with the per-metric functions,
+    # only what the requested metrics need is computed
+    need_correct = bool(wanted & set(['precision', 'recall', 'f1']))
+    need_recall = bool(wanted & set(['recall', 'f1']))
+    need_roots = 'roots' in wanted
+    if need_correct:
+        true_nodes = set([n for t in true_trees for n in t.nodes_iter()])
+    if need_roots:
+        true_roots = set([get_roots(t)[0] for t in true_trees])
+    correct_roots = set()
+    n_correct = 0.
+
+    curves = {name: [] for name in metric_names}
+    for tree in pred_trees:
+        # if the current tree is None, repeat the score from last iteration
+        if tree is None:
+            for scores in curves.values():
+                scores.append(scores[-1])
+            continue
+
+        if cover.add(set(tree.nodes())) and need_correct:
+            n_correct = float(len(cover.covered & true_nodes))
+
+        n_pred = len(cover.covered)
+        values = {'k_max_setcover': n_pred}
+        if need_correct:
+            prec = n_correct / n_pred
+            values['precision'] = prec
+        if need_recall:
+            rec = n_correct / len(true_nodes)
+            values['recall'] = rec
+            if 'f1' in wanted:
+                values['f1'] = (0 if prec == 0 and rec == 0
+                                else 2 * prec * rec / (prec + rec))
+        if need_roots:
+            rs = get_roots(tree)
+            if rs and rs[0] in true_roots:
+                correct_roots.add(rs[0])
+            values['roots'] = len(correct_roots) / float(len(true_roots))
+        for name, scores in curves.items():
+            scores.append(values[name])
+    return curves
+
+
 def evaluate(pred_trees, true_trees, metric, *args, **kwargs):
+    if metric in INCREMENTAL_METRICS:
+        k = kwargs['k'] if 'k' in kwargs else args[0]
+        return evaluate_curves(pred_trees, true_trees,
+                               [metric.__name__], k)[metric.__name__]
+
     scores = []
     for i in xrange(len(pred_trees)):
         acc_trees = pred_trees[:i+1]
@@ -98,30 +162,35 @@ def main():
         # 'roots': roots
     }
 
-    data = {}
     for metric_name in args.metrics:
-        metric = metric_map[metric_name]
-        data[metric_name] = []
-        for experiment_path, legend in zip(sorted(args.experiment_paths),
-                                           sorted(args.legends)):
-            paths = pkl.load(open(experiment_path))
-            result_path = paths['result']
-            # true_events_path = paths['true_events']
-
-            assert legend in result_path, (legend, result_path)
-
-            data[metric_name].append(
-                evaluate(
-                    pkl.load(open(result_path)),
-                    None,
-                    # pkl.load(open(true_events_path)),
-                    metric,
-                    k=args.k
-                )
+        assert metric_name in metric_map, metric_name
+
+    # all curves of one experiment in one pass
+    curves = []
+    for experiment_path, legend in zip(sorted(args.experiment_paths),
+                                       sorted(args.legends)):
+        paths = pkl.load(open(experiment_path))
+        result_path = paths['result']
+        # true_events_path = paths['true_events']
+
+        assert legend in result_path, (legend, result_path)
+
+        curves.append(
+            evaluate_curves(
+                pkl.load(open(result_path)),
+                None,
+                # pkl.load(open(true_events_path)),
+                [metric_map[m].__name__ for m in args.metrics],
+                k=args.k
             )
-        data[metric_name] = pd.DataFrame(data[metric_name],
+        )
+
+    data = {}
+    for metric_name in args.metrics:
+        rows = [c[metric_map[metric_name].__name__] for c in curves]
+        data[metric_name] = pd.DataFrame(rows,
                                          index=sorted(args.legends),
-                                         columns=np.arange(len(data[metric_name][0]))
+                                         columns=np.arange(len(rows[0]))
         )
 
     print(data)
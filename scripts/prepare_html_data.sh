@@ -1,15 +1,22 @@
 #! /bin/bash
 
-if [ -z $1 ]; then
-	echo "events pickle dir is not given"
+if [ -z $3 ]; then
+	echo "usage: $0 <events pickle dir> <interactions path> <people path>"
 	exit -1
 fi
 
 pickle_dir=$1
-for p in $(ls $pickle_dir); do
-	echo "${p}"
-	python dump_events_to_json.py ${pickle_dir}/${p} html/data
-done
+interactions_path=$2
+people_path=$3
+
+# interactions and people are loaded once for all pickles
+python dump_batch.py \
+	--candidate_tree_paths ${pickle_dir}/*.pkl \
+	--interactions_path ${interactions_path} \
+	--people_path ${people_path} \
+	--formats json \
+	--no_format_subdir \
+	--output_dir html/data
 
 cd html
 python ../dump_all_events_paths.py data > data/all_results.json
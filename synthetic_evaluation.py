@@ -5,6 +5,7 @@ import numpy as np
 
 from collections import defaultdict
 from glob import glob
+from multiprocessing import Pool
 from sklearn import metrics
 from nose.tools import assert_equal
 from util import json_load
@@ -46,17 +47,58 @@ def get_interaction_ids(path):
             for i in json_load(path)]
 
 
+def load_pickle(path):
+    return pkl.load(open(path))
+
+
+# loader name -> (path, loaded object), one per process
+_artifact_cache = {}
+
+
+def load_artifact(path, loader):
+    """load the artifact at `path` once per process.
+
+    Only the last artifact of each loader is kept,
+    as cells sharing it are evaluated next to each other
+    """
+    cached = _artifact_cache.get(loader.__name__)
+    if cached is None or cached[0] != path:
+        # drop the previous artifact before loading the next one
+        _artifact_cache.pop(loader.__name__, None)
+        _artifact_cache[loader.__name__] = (path, loader(path))
+    return _artifact_cache[loader.__name__][1]
+
+
+def evaluate_cell(args):
+    """scores of one (method, x tick) cell, None if the result is absent.
+
+    Interactions and true events are shared by the methods,
+    so they go through the artifact cache
+    """
+    result_path, interactions_path, events_path, metrics, K = args
+    if result_path is None:
+        return None
+    return evaluate_meta_tree_result(
+        load_artifact(events_path, load_pickle),
+        k_best_trees(load_pickle(result_path), K),
+        load_artifact(interactions_path, get_interaction_ids),
+        metrics
+    )
+
+
 def evaluate_general(
         result_paths, interactions_paths, events_paths, metrics,
         x_axis_name, x_axis_type,
         group_key, group_key_name_func, sort_keyfunc=None,
         xticks=[],
-        K=10):
+        K=10,
+        n_jobs=1):
     """
     Return a 3D table
     group_key: the legend part
     metrics: the y axis
     x_axis_name, sort_keyfunc: the x axis
+    n_jobs: number of processes to evaluate the cells
     """
     groups = group_paths(result_paths, group_key, sort_keyfunc)
 
@@ -65,7 +107,7 @@ def evaluate_general(
         xticks = set()
         for k, paths in groups:
             xticks |= set(get_values_by_key(
-                    groups[0][1],
+                    paths,
                     x_axis_name,
                     x_axis_type)
                           )
@@ -75,20 +117,6 @@ def evaluate_general(
     legend_names = [group_key_name_func(k)
                     for k in group_keys]
 
-    # get metric names
-    example_true_events = pkl.load(open(events_paths[0]))
-    example_all_entry_ids = get_interaction_ids(
-        interactions_paths[0]
-    )
-    metric_names = evaluate_meta_tree_result(
-        example_true_events,
-        k_best_trees(
-            pkl.load(open(groups[0][1][0])), K
-        ),
-        example_all_entry_ids,
-        metrics
-    ).keys()  # extra computing
-
     # enchance groups with other paths
     result_path2all_paths = {
         tpl[0]: tpl
@@ -108,20 +136,39 @@ def evaluate_general(
                 # the result is absent
                 enhanced_groups[k].append((None, None, None))
 
-    data3d = []
-    for method, _ in groups:
-        data2d = []
-        for result_path, interactions_path, events_path in enhanced_groups[method]:
-            if result_path is None:
-                data2d.append([np.nan for m in metric_names])
-            else:
-                data2d.append(evaluate_meta_tree_result(
-                    pkl.load(open(events_path)),
-                    k_best_trees(pkl.load(open(result_path)), K),
-                    get_interaction_ids(interactions_path),
-                    metrics).values()
-                              )
-        data3d.append(data2d)
+    # cells sharing the same interactions and events are
+    # next to each other, so that a worker loads them once
+    cells = [(result_path, interactions_path, events_path, metrics, K)
+             for method, _ in groups
+             for result_path, interactions_path, events_path
+             in enhanced_groups[method]]
+    order = sorted(xrange(len(cells)),
+                   key=lambda i: cells[i][1:3])
+    if n_jobs == 1:
+        scores = map(evaluate_cell, [cells[i] for i in order])
+    else:
+        pool = Pool(n_jobs)
+        try:
+            scores = pool.map(evaluate_cell, [cells[i] for i in order])
+        finally:
+            pool.close()
+            pool.join()
+    _artifact_cache.clear()
+    cell_scores = [None] * len(cells)
+    for i, s in zip(order, scores):
+        cell_scores[i] = s
+
+    present_scores = [s for s in cell_scores if s is not None]
+    if not present_scores:
+        raise ValueError('no result is present for any method and x tick')
+    metric_names = present_scores[0].keys()
+    n_xticks = len(xticks)
+    data3d = [
+        [[np.nan] * len(metric_names) if s is None
+         else [s.get(m, np.nan) for m in metric_names]
+         for s in cell_scores[i * n_xticks: (i + 1) * n_xticks]]
+        for i in xrange(len(groups))
+    ]
     print metric_names
     # method, x_axis, metric
 
@@ -158,7 +205,7 @@ metrics = [metrics.adjusted_rand_score,
            metrics.v_measure_score]
 
 def evaluate_against_noise(result_paths, interactions_paths, events_paths,
-                           metrics, xticks):
+                           metrics, xticks, n_jobs=1):
     assert_equal(len(result_paths),
                  len(interactions_paths))
     assert_equal(len(interactions_paths),
@@ -174,14 +221,15 @@ def evaluate_against_noise(result_paths, interactions_paths, events_paths,
         group_key=lambda p: p['args'][0],
         group_key_name_func=lambda m: m,
         sort_keyfunc=lambda k: float(k['fraction']),
-        K=1
+        K=1,
+        n_jobs=n_jobs
     )
     return result
 
 
 def evaluate_against_event_size(
     result_paths, interactions_paths, events_paths,    
-    metrics, xticks):
+    metrics, xticks, n_jobs=1):
     assert_equal(len(result_paths),
                  len(interactions_paths))
     assert_equal(len(interactions_paths),
@@ -196,7 +244,8 @@ def evaluate_against_event_size(
         group_key=lambda p: p['args'][0],
         group_key_name_func=lambda m: m,
         sort_keyfunc=lambda k: float(k['event_size']),
-        K=1
+        K=1,
+        n_jobs=n_jobs
     )
     return result
 
@@ -212,6 +261,7 @@ def main():
                         nargs='+')
     parser.add_argument('--output_path', required=True)
     parser.add_argument('--experiment', choices=('noise', 'event_size'), required=True)
+    parser.add_argument('--n_jobs', type=int, default=1)
 
     args = parser.parse_args()
 
@@ -226,7 +276,8 @@ def main():
          'noise': evaluate_against_noise}
     eval_func = m[args.experiment]
     result = eval_func(
-        result_paths, interactions_paths, events_paths, metrics=[], xticks=args.xticks
+        result_paths, interactions_paths, events_paths, metrics=[], xticks=args.xticks,
+        n_jobs=args.n_jobs
     )
     pkl.dump(result, open(args.output_path, 'w'))
 
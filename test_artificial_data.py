@@ -330,6 +330,51 @@ def test_gen_event_with_known_tree_structure():
     assert_true(nx.is_arborescence(event))
 
 
+def test_gen_event_reproducible():
+    kws = dict(event_size=200,
+               participants=range(10),
+               start_time=10, end_time=210,
+               event_topic_param=random_topic(10, topic_noise=0.0001)[0],
+               topic_noise=1,
+               alpha=1.0, tau=0.8,
+               forward_proba=0.3,
+               reply_proba=0.5,
+               create_new_proba=0.2)
+    e1 = gen_event_with_known_tree_structure(
+        random_state=np.random.RandomState(1), **kws)
+    e2 = gen_event_with_known_tree_structure(
+        random_state=np.random.RandomState(1), **kws)
+    assert_equal(sorted(e1.edges(data=True)), sorted(e2.edges(data=True)))
+    for n in e1.nodes_iter():
+        assert_equal(e1.node[n]['sender_id'], e2.node[n]['sender_id'])
+        np.testing.assert_array_equal(e1.node[n]['topics'],
+                                      e2.node[n]['topics'])
+    assert_true(nx.is_arborescence(e1))
+
+
+def test_random_events_parallel_same_as_sequential():
+    params = dict(n_events=4, event_size_mu=50, event_size_sigma=0.00001,
+                  n_total_participants=20,
+                  participant_mu=5, participant_sigma=1,
+                  min_time=10, max_time=600,
+                  event_duration_mu=100, event_duration_sigma=0.0001,
+                  n_topics=10, topic_scaling_factor=1000,
+                  topic_noise=0.00001,
+                  alpha=1.0, tau=0.8,
+                  forward_proba=0.3,
+                  reply_proba=0.5,
+                  create_new_proba=0.2)
+    np.random.seed(1)
+    events, _ = random_events(n_jobs=1, **params)
+    np.random.seed(1)
+    parallel_events, _ = random_events(n_jobs=2, **params)
+    for e1, e2 in zip(events, parallel_events):
+        assert_equal(sorted(e1.edges()), sorted(e2.edges()))
+        for n in e1.nodes_iter():
+            assert_equal(e1.node[n]['recipient_ids'],
+                         e2.node[n]['recipient_ids'])
+
+
 def test_get_gen_cand_tree_params():
     event_size = 100
     participants_n = 10
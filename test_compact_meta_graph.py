@@ -0,0 +1,90 @@
+import unittest
+import shutil
+import tempfile
+import numpy as np
+import networkx as nx
+
+from datetime import datetime
+from nose.tools import assert_equal, assert_true
+from scipy.sparse import issparse
+
+from .interactions import InteractionsUtil as IU
+from .compact_meta_graph import save_compact_meta_graph, CompactMetaGraph, \
+    load_meta_graph, convert_gpickle, is_compact_meta_graph
+from .util import json_load
+from .test_util import make_path
+
+
+class CompactMetaGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.g = IU.get_meta_graph(
+            json_load(make_path('test/data/enron_test.json')),
+            decompose_interactions=False
+        )
+        for i, (s, t) in enumerate(self.g.edges_iter()):
+            self.g[s][t][IU.EDGE_COST_KEY] = i / 10.
+        for n in self.g.nodes_iter():
+            self.g.node[n]['topics'] = np.random.random(4)
+        self.g = IU.add_hastag_bow_to_graph(self.g)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = self.tmp_dir + '/mg.mg'
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def assert_same_graph(self, expected, actual, features=()):
+        assert_equal(sorted(expected.nodes()), sorted(actual.nodes()))
+        assert_equal(sorted(expected.edges()), sorted(actual.edges()))
+        for s, t in expected.edges_iter():
+            assert_equal(expected[s][t], actual[s][t])
+        for n in expected.nodes_iter():
+            for key, value in expected.node[n].items():
+                if key in features:
+                    if issparse(value):
+                        value = value.toarray()
+                        actual_value = actual.node[n][key].toarray()
+                    else:
+                        actual_value = actual.node[n][key]
+                    np.testing.assert_array_almost_equal(value, actual_value)
+                elif key not in ('topics', 'hashtag_bow'):
+                    assert_equal(value, actual.node[n][key])
+
+    def test_save_and_load(self):
+        save_compact_meta_graph(self.g, self.path)
+        assert_true(is_compact_meta_graph(self.path))
+
+        mg = CompactMetaGraph(self.path)
+        assert_equal(self.g.number_of_nodes(), mg.number_of_nodes)
+        assert_equal(self.g.number_of_edges(), mg.number_of_edges)
+        assert_equal(['hashtag_bow', 'topics'], mg.feature_names)
+        assert_true(isinstance(mg.column('datetime')[0], datetime))
+        assert_true(isinstance(mg.column('recipient_ids')[0], list))
+
+        # features are not loaded unless asked
+        g = mg.to_networkx()
+        assert_true('topics' not in g.node[g.nodes()[0]])
+        self.assert_same_graph(self.g, g)
+
+        g = mg.to_networkx(features=('topics', 'hashtag_bow'))
+        self.assert_same_graph(self.g, g,
+                               features=('topics', 'hashtag_bow'))
+
+    def test_convert_gpickle(self):
+        pkl_path = self.tmp_dir + '/mg.pkl'
+        nx.write_gpickle(self.g, pkl_path)
+        output_path = convert_gpickle(pkl_path)
+        assert_equal(self.tmp_dir + '/mg.mg', output_path)
+        self.assert_same_graph(load_meta_graph(pkl_path),
+                               load_meta_graph(output_path),
+                               features=('topics', 'hashtag_bow'))
+
+    def test_other_edge_attributes(self):
+        for i, (s, t) in enumerate(self.g.edges_iter()):
+            self.g[s][t]['orig_c'] = self.g[s][t][IU.EDGE_COST_KEY] + 1
+            if i % 2 == 0:  # some edges without it
+                self.g[s][t]['recency'] = i / 100.
+        save_compact_meta_graph(self.g, self.path)
+
+        mg = CompactMetaGraph(self.path)
+        assert_equal(['orig_c', 'recency'], mg.edge_column_names)
+        self.assert_same_graph(self.g, mg.to_networkx())
@@ -1,12 +1,18 @@
+import random
 import networkx as nx
 import unittest
 from .dag_util import (binarize_dag, is_binary,
+                       binarize_dag_to_arrays,
                        unbinarize_dag,
                        remove_edges_via_dijkstra,
-                       shrink_by_transitive_closure)
+                       shortest_path_arborescence,
+                       all_simple_paths_from_source,
+                       longest_path, longest_path_lengths, count_paths,
+                       shrink_by_transitive_closure,
+                       find_cycle, assert_no_cycle)
 from .test_lst_dag import get_example_6
 from .interactions import InteractionsUtil
-from nose.tools import assert_equal, assert_true
+from nose.tools import assert_equal, assert_true, assert_raises
 
 
 def _get_example_dag():
@@ -79,6 +85,62 @@ def test_binarize_dag():
             assert_true(g.node[n].get('dummy'))
 
 
+def test_binarize_dag_deterministic():
+    g = _get_example_dag()
+    # same graph, different insertion order
+    g_reversed = nx.DiGraph()
+    g_reversed.add_nodes_from(reversed(g.nodes(data=True)))
+    g_reversed.add_edges_from(reversed(g.edges(data=True)))
+
+    kws = dict(vertex_weight_key=InteractionsUtil.VERTEX_REWARD_KEY,
+               edge_weight_key=InteractionsUtil.EDGE_COST_KEY,
+               dummy_node_name_prefix='d_',
+               deterministic=True)
+    binary_g = binarize_dag(g, **kws)
+    assert_true(is_binary(binary_g))
+    assert_equal(sorted(binary_g.edges()),
+                 sorted(binarize_dag(g_reversed, **kws).edges()))
+    # dummy nodes are named after their parents
+    assert_equal(['d_1_1', 'd_2_1', 'd_2_2', 'd_2_3'],
+                 sorted(n for n in binary_g.nodes()
+                        if binary_g.node[n].get('dummy')))
+
+
+def test_binarize_dag_to_arrays():
+    g = _get_example_dag()
+    arrays = binarize_dag_to_arrays(
+        g,
+        vertex_weight_key=InteractionsUtil.VERTEX_REWARD_KEY,
+        edge_weight_key=InteractionsUtil.EDGE_COST_KEY
+    )
+    # same number of dummy nodes as `binarize_dag`
+    assert_equal(12, arrays.n_real)
+    assert_equal(16, len(arrays.left))
+    assert_equal([0] * 4, arrays.reward[12:].tolist())
+
+    # each real edge appears once, from its parent or a dummy under it
+    nodes = arrays.nodes
+    owner = {}
+    for i in xrange(arrays.n_real):
+        stack = [i]
+        while stack:
+            j = stack.pop()
+            for c in (arrays.left[j], arrays.right[j]):
+                if c >= arrays.n_real:
+                    owner[c] = i
+                    stack.append(c)
+
+    edges = []
+    for i in xrange(len(arrays.left)):
+        for c, cost in ((arrays.left[i], arrays.left_cost[i]),
+                        (arrays.right[i], arrays.right_cost[i])):
+            if 0 <= c < arrays.n_real:
+                u, v = nodes[owner.get(i, i)], nodes[c]
+                assert_equal(g[u][v][InteractionsUtil.EDGE_COST_KEY], cost)
+                edges.append((u, v))
+    assert_equal(sorted(g.edges()), sorted(edges))
+
+
 def test_unbinarize_dag():
     g1 = _get_example_dag()
     binary_g = binarize_dag(g1,
@@ -106,6 +168,118 @@ class EdgeRemovalTest(unittest.TestCase):
         t = remove_edges_via_dijkstra(g, source=0)
         assert_equal(expected_edges, set(t.edges()))
 
+    def test_same_distances_as_dijkstra(self):
+        g = _get_example_dag()
+        n_edges = g.number_of_edges()
+        t = remove_edges_via_dijkstra(g, source=1)
+        assert_true(nx.is_arborescence(t))
+        assert_equal(n_edges, g.number_of_edges())  # g is untouched
+        key = InteractionsUtil.EDGE_COST_KEY
+        assert_equal(nx.single_source_dijkstra_path_length(g, 1, weight=key),
+                     nx.single_source_dijkstra_path_length(t, 1, weight=key))
+        assert_true(t.node[2] is g.node[2])
+
+    def test_unreachable_nodes(self):
+        g = _get_example_dag()
+        g.add_node(13)  # isolated
+        reachable = set([2, 4, 5, 6, 7, 8, 10, 11, 12])
+
+        t = shortest_path_arborescence(g, source=2)
+        assert_equal(reachable, set(t.nodes()))
+
+        # the node set of g is kept, as before
+        t = remove_edges_via_dijkstra(g, source=2)
+        assert_equal(set(g.nodes()), set(t.nodes()))
+        for n in set(g.nodes()) - reachable:
+            assert_equal(0, t.degree(n))
+            assert_true(t.node[n] is g.node[n])
+        assert_true(nx.is_arborescence(t.subgraph(reachable)))
+
+
+class PathDPTest(unittest.TestCase):
+    def setUp(self):
+        self.g = _get_example_dag()
+        self.paths = list(all_simple_paths_from_source(self.g, 1))
+
+    def path_cost(self, path):
+        return sum(self.g[s][t][InteractionsUtil.EDGE_COST_KEY]
+                   for s, t in zip(path[:-1], path[1:]))
+
+    def test_longest_path(self):
+        path = longest_path(self.g, 1)
+        assert_true(path in self.paths)
+        assert_equal(max(map(len, self.paths)), len(path))
+
+    def test_longest_path_weighted(self):
+        path = longest_path(self.g, 1, weight=InteractionsUtil.EDGE_COST_KEY)
+        assert_true(path in self.paths)
+        assert_equal(max(map(self.path_cost, self.paths)),
+                     self.path_cost(path))
+
+    def test_longest_path_lengths(self):
+        lengths = longest_path_lengths(self.g, 1)
+        assert_equal(0, lengths[1])
+        for n in self.g.nodes_iter():
+            if n != 1:
+                assert_equal(max(len(p) - 1 for p in self.paths
+                                 if p[-1] == n),
+                             lengths[n])
+
+    def test_count_paths(self):
+        counts = count_paths(self.g, 1)
+        assert_equal(1, counts[1])
+        for n in self.g.nodes_iter():
+            if n != 1:
+                assert_equal(len([p for p in self.paths if p[-1] == n]),
+                             counts[n])
+
+    def test_not_from_graph_root(self):
+        # only nodes reachable from the given root are considered
+        assert_equal([4, 5, 6, 7, 8, 10, 11, 12],
+                     sorted(n for n in count_paths(self.g, 2) if n != 2))
+        assert_equal(2, longest_path_lengths(self.g, 2)[12])
+        assert_equal(3, len(longest_path(self.g, 2)))
+
+    def test_same_tie_break_as_path_enumeration(self):
+        rng = random.Random(12345)
+        graphs = [self.g]
+        for _ in xrange(20):
+            g = nx.DiGraph()
+            g.add_nodes_from(range(12))
+            g.add_edges_from((i, j)
+                             for i in xrange(12)
+                             for j in xrange(i + 1, 12)
+                             if rng.random() < 0.3)
+            graphs.append(g)
+        for g in graphs:
+            for r in g.nodes_iter():
+                if g.out_degree(r) > 0:
+                    assert_equal(
+                        max(all_simple_paths_from_source(g, r), key=len),
+                        longest_path(g, r)
+                    )
+
+
+class CycleTest(unittest.TestCase):
+    def test_acyclic(self):
+        g = _get_example_dag()
+        assert_equal(None, find_cycle(g))
+        assert_no_cycle(g)
+
+    def test_cyclic(self):
+        g = _get_example_dag()
+        g.add_edge(12, 2)
+        cycle = find_cycle(g)
+        for s, t in zip(cycle, cycle[1:] + cycle[:1]):
+            assert_true(g.has_edge(s, t))
+        assert_true(2 in cycle and 12 in cycle)
+        assert_raises(AssertionError, assert_no_cycle, g)
+
+    def test_self_loop(self):
+        g = _get_example_dag()
+        g.add_edge(5, 5)
+        assert_equal([5], find_cycle(g))
+
 
 class ShrinkTransitiveClosureTestCase(unittest.TestCase):
     def setUp(self):
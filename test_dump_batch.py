@@ -0,0 +1,142 @@
+import os
+import shutil
+import codecs
+import gensim
+import ujson as json
+import numpy as np
+import networkx as nx
+import cPickle as pkl
+from collections import defaultdict
+from datetime import datetime
+
+from nose.tools import assert_equal, assert_true, assert_raises, \
+    with_setup
+
+from .dump_batch import DumpResources, run
+from .meta_graph_stat import build_default_summary_kws
+from .topic_cache import EventTopicCache
+from .test_util import make_path
+
+OUTPUT_DIR = make_path('test/data/tmp/batch')
+
+
+def teardown_func():
+    if os.path.exists(OUTPUT_DIR):
+        shutil.rmtree(OUTPUT_DIR)
+
+
+def make_resources():
+    resources = DumpResources(make_path('test/data/enron_test.json'),
+                              make_path('test/data/people.json'))
+    # fake people and content, as in test_dump_events_to_json
+    resources._loaded['id2people'] = defaultdict(lambda: {'name': 'fake'})
+    resources._loaded['id2interaction'] = defaultdict(
+        lambda: {'body': 'fake', 'subject': 'fake'}
+    )
+    return resources
+
+
+@with_setup(teardown=teardown_func)
+def test_run():
+    pkl_paths = [make_path('test/data/candidate_trees.pkl'),
+                 make_path('test/data/candidate_trees_decompose=False.pkl')]
+    for n_jobs in (1, 2):
+        resources = make_resources()
+        output_paths = run(pkl_paths, ['json'], OUTPUT_DIR, resources,
+                           n_jobs=n_jobs, k=5)
+        assert_equal(
+            [os.path.join(OUTPUT_DIR, 'json', name)
+             for name in ('candidate_trees.json',
+                          'candidate_trees_decompose=False.json')],
+            output_paths
+        )
+        for path in output_paths:
+            with codecs.open(path, 'r', 'utf8') as f:
+                obj = json.loads(f.read())
+            assert_equal(5, len(obj))
+            assert_true(all('sender' in n
+                            for o in obj for n in o['nodes']))
+        assert_true('dump:json' in resources.timings)
+
+
+@with_setup(teardown=teardown_func)
+def test_run_with_meta_info_and_no_format_subdir():
+    pkl_path = make_path('test/data/candidate_trees.pkl')
+    resources = make_resources()
+    output_paths = run([pkl_path], ['json'], OUTPUT_DIR, resources,
+                       meta_info=True, format_subdir=False, k=5)
+    # the names that html/js/main.js reads
+    assert_equal(
+        [os.path.join(OUTPUT_DIR, name)
+         for name in ('id2interactions.json', 'id2people.json',
+                      'candidate_trees.json')],
+        output_paths
+    )
+    assert_true(all(map(os.path.exists, output_paths)))
+
+
+def test_run_several_formats_without_format_subdir():
+    assert_raises(ValueError, run, [], ['json', 'nvd3'], OUTPUT_DIR,
+                  make_resources(), format_subdir=False)
+
+
+class ParentOnlyLda(object):
+    """fails if inference runs in another process"""
+    num_topics = 3
+
+    def __init__(self, dictionary):
+        self.pid = os.getpid()
+        self.id2word = dictionary
+        self.wordtopics = np.ones((self.num_topics, len(dictionary)))
+        self.n_infer_calls = 0
+
+    def __getitem__(self, bow, iterations=100):
+        assert_equal(self.pid, os.getpid())
+        self.n_infer_calls += 1
+        return [[(0, 1.0)] for _ in bow]
+
+
+@with_setup(teardown=teardown_func)
+def test_run_timeline_in_parallel():
+    def make_message(id, sender_id, recipient_id, dt):
+        return {'message_id': id, 'sender_id': sender_id,
+                'recipient_ids': [recipient_id],
+                'subject': 'item {}'.format(id), 'body': '',
+                'datetime': datetime(*dt)}
+
+    def make_graph(nodes):
+        g = nx.DiGraph()
+        g.add_path(nodes)
+        for n in nodes:
+            g.node[n]['message_id'] = n
+            g.node[n]['datetime'] = datetime(2014, 1, n)
+        return g
+
+    dictionary = gensim.corpora.dictionary.Dictionary.load(
+        make_path('test/data/test_dictionary.gsm')
+    )
+    lda = ParentOnlyLda(dictionary)
+    resources = make_resources()
+    resources._loaded['summary_kws'] = build_default_summary_kws(
+        [make_message(1, 'a', 'b', (2014, 1, 1)),
+         make_message(2, 'b', 'a', (2014, 1, 2)),
+         make_message(3, 'a', 'c', (2014, 1, 3)),
+         make_message(4, 'c', 'a', (2014, 1, 4))],
+        [{'id': 'a'}, {'id': 'b'}, {'id': 'c'}],
+        dictionary, lda, '{id}',
+        topic_cache=EventTopicCache(lda)
+    )
+
+    os.makedirs(OUTPUT_DIR)
+    pkl_paths = [os.path.join(OUTPUT_DIR, 'trees-{}.pkl'.format(i))
+                 for i in (1, 2)]
+    for path in pkl_paths:
+        pkl.dump([make_graph([1, 2]), make_graph([1, 3, 4])],
+                 open(path, 'wb'))
+
+    output_paths = run(pkl_paths, ['timeline'], OUTPUT_DIR, resources,
+                       n_jobs=2, k=2)
+    assert_equal(2, len(output_paths))
+    # all inferred in the parent, in one go
+    assert_equal(1, lda.n_infer_calls)
+    assert_true('topics_prefetch' in resources.timings)
@@ -6,7 +6,8 @@ from sklearn import metrics
 from .evaluation import precision_recall_f1, \
     convert_to_cluster_assignment_array, \
     evaluate_clustering_result, \
-    evaluate_meta_tree_result
+    evaluate_meta_tree_result, \
+    evaluate_clustering_results
 
 
 class EvaluationTest(unittest.TestCase):
@@ -94,6 +95,35 @@ class EvaluationTest(unittest.TestCase):
             )
         )
 
+    def test_evaluate_clustering_results_same_as_sklearn(self):
+        methods = [metrics.adjusted_rand_score,
+                   metrics.adjusted_mutual_info_score,
+                   metrics.homogeneity_score,
+                   metrics.completeness_score,
+                   metrics.v_measure_score]
+        rng = np.random.RandomState(0)
+        cases = [self.args]
+        for _ in xrange(5):
+            entries = rng.permutation(50)
+            true_clusters = [entries[:10].tolist(), entries[10:25].tolist()]
+            pred_clusters = [entries[5:12].tolist(), entries[30:40].tolist(),
+                             entries[20:24].tolist()]
+            cases.append((true_clusters, pred_clusters, range(50)))
+
+        for true_clusters, pred_clusters, all_entry_ids in cases:
+            scores = evaluate_clustering_results(
+                true_clusters, pred_clusters, all_entry_ids, methods
+            )
+            for m in methods:
+                for true_only, suffix in ((True, ''), (False, '(all)')):
+                    assert_almost_equal(
+                        evaluate_clustering_result(
+                            true_clusters, pred_clusters, all_entry_ids,
+                            metric=m, true_only=true_only
+                        ),
+                        scores[m.__name__ + suffix]
+                    )
+
     def test_evaluate_meta_tree_result(self):
         scores = evaluate_meta_tree_result(
             self.true_events,
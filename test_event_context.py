@@ -2,7 +2,7 @@ import networkx as nx
 from datetime import datetime
 from nose.tools import assert_true, assert_equal
 
-from .event_context import extract_event_context
+from .event_context import extract_event_context, EventContext
 from .test_util import load_meta_graph_necessities
 from .interactions import InteractionsUtil as IU
 
@@ -43,3 +43,44 @@ def test_extract_event_context():
     for i in (range(1, 4) + range(7, 107)):
         assert_true(i in nodes_set)
     
+
+
+def test_event_context_window():
+    interactions, event_tree = load_example()
+    ctx = EventContext(interactions)
+    start = datetime.fromtimestamp(989587576)
+    end = datetime.fromtimestamp(989587578)
+    expected = sorted(i['message_id'] for i in interactions
+                      if start <= i['datetime'] <= end)
+    assert_equal(expected,
+                 sorted(i['message_id'] for i in ctx.window(start, end)))
+
+
+def test_event_context_from_meta_graph():
+    interactions, event_tree = load_example()
+    expected = extract_event_context(interactions, event_tree)
+
+    meta_graph = IU.get_meta_graph(interactions,
+                                   decompose_interactions=False,
+                                   remove_singleton=False)
+    ctx = EventContext(interactions, meta_graph=meta_graph)
+    for _ in xrange(2):
+        context_dag = ctx.context(event_tree)
+        assert_equal(sorted(expected.nodes()), sorted(context_dag.nodes()))
+        assert_equal(sorted(expected.edges()), sorted(context_dag.edges()))
+        # annotating the context leaves the meta graph untouched
+        n = context_dag.nodes()[0]
+        context_dag.node[n]['event'] = True
+        assert_true('event' not in meta_graph.node[n])
+
+
+def test_event_context_cached_window():
+    interactions, event_tree = load_example()
+    ctx = EventContext(interactions)
+    g1 = ctx.context(event_tree)
+    g2 = ctx.context(event_tree)
+    assert_equal(1, len(ctx._window_graphs))
+    assert_equal(sorted(g1.edges()), sorted(g2.edges()))
+    n = g1.nodes()[0]
+    g1.node[n]['event'] = True
+    assert_true('event' not in g2.node[n])
@@ -1,5 +1,4 @@
 import unittest
-import random
 import networkx as nx
 import os
 import numpy as np
@@ -14,6 +13,7 @@ from .experiment_util import sample_rooted_binary_graphs_within_timespan,\
     experiment_signature,\
     sample_nodes_by_weight,\
     sample_nodes_by_out_degree,\
+    weighted_sample_without_replacement,\
     get_number_and_percentage, \
     parse_result_path
 
@@ -32,7 +32,7 @@ def test_experiment_signature():
 
 
 def test_sample_nodes_by_weight():
-    random.seed(123456)
+    np.random.seed(1)  # the sampler draws from numpy's global state
     g = nx.DiGraph()
     g.add_node(0, w=100)
     g.add_node(1, w=10)
@@ -49,7 +49,7 @@ def test_sample_nodes_by_weight():
 
 
 def test_sample_nodes_by_out_degree():
-    random.seed(123456)
+    np.random.seed(123456)
     g = nx.DiGraph()
     n = 5
     for i in xrange(n):
@@ -61,14 +61,38 @@ def test_sample_nodes_by_out_degree():
         all_results += sample_nodes_by_out_degree(g, 1)
 
     cnt = Counter(all_results)
-    
-    assert_equal(399, cnt[0])
-    assert_equal(293, cnt[1])
-    assert_equal(197, cnt[2])
-    assert_equal(111, cnt[3])
+
+    # proportional to out degree: 4, 3, 2, 1, 0
+    for i, expected in enumerate([400, 300, 200, 100]):
+        assert_true(abs(cnt[i] - expected) < 50)
     assert_equal(0, cnt[4])
 
 
+def test_weighted_sample_without_replacement():
+    rng = np.random.RandomState(1)
+    weights = [0, 1, 2, 0, 3]
+    samples = weighted_sample_without_replacement(weights, 10,
+                                                  random_state=rng)
+    assert_equal([1, 2, 4], sorted(samples))
+
+    # frequency of the first draw is proportional to the weight
+    cnt = Counter(weighted_sample_without_replacement(weights, 2,
+                                                      random_state=rng)[0]
+                  for _ in xrange(6000))
+    for i, expected in zip([1, 2, 4], [1000, 2000, 3000]):
+        assert_true(abs(cnt[i] - expected) < 200)
+    assert_equal([], list(weighted_sample_without_replacement([0, 0], 1)))
+
+
+def test_weighted_sample_without_replacement_order():
+    # in the order of drawing, heavier items almost surely first
+    rng = np.random.RandomState(0)
+    for _ in xrange(5):
+        assert_equal([0, 1, 2],
+                     list(weighted_sample_without_replacement(
+                         [10**6, 10**3, 1], 3, random_state=rng)))
+
+
 def test_get_cand_n_number_and_percetnge():
     total = 100
     assert_equal(
@@ -1,4 +1,6 @@
 import random
+import shutil
+import tempfile
 import unittest
 import numpy
 import glob
@@ -9,7 +11,7 @@ from datetime import timedelta
 from nose.tools import assert_true, assert_equal, assert_almost_equal
 from subprocess import check_output
 
-from gen_candidate_trees import run
+from gen_candidate_trees import run, build_meta_graph
 from scipy.spatial.distance import cosine
 
 from .lst import lst_dag, make_variance_cost_func
@@ -18,6 +20,7 @@ from .baselines import greedy_grow_by_discounted_reward as greedy_grow, \
 from .test_util import remove_tmp_data, make_path
 from .budget_problem import binary_search_using_charikar
 from .dag_util import get_roots
+from .compact_meta_graph import load_meta_graph, is_compact_meta_graph
 
 
 directed_params = {
@@ -89,7 +92,7 @@ class GenCandidateTreeTest(unittest.TestCase):
         for t in trees:
             assert_true(len(t.edges()) > 0)
 
-        return trees, nx.read_gpickle(paths['meta_graph'])
+        return trees, load_meta_graph(paths['meta_graph'])
 
     def test_if_sender_and_recipient_information_saved(self):
         trees, _ = self.check('greedy', greedy_grow)
@@ -334,4 +337,42 @@ class GenCandidateTreeGivenTopicsTest(GenCandidateTreeTest):
         
     def tearDown(self):
         remove_tmp_data('test/data/tmp')
-        
+
+
+def test_compact_meta_graph_format():
+    tmp_dir = tempfile.mkdtemp()
+    msg_ids_path = tmp_dir + '/msg_ids.txt'
+    open(msg_ids_path, 'w').close()  # not used for given topics
+
+    def build():
+        return build_meta_graph(
+            make_path('test/data/given_topics/'
+                      'interactions--n_noisy_interactions_fraction=0.1.json'),
+            msg_ids_path,
+            None, None,
+            tmp_dir + '/meta-graph', '',
+            {'dist_func': cosine,
+             'preprune_secs': 8,
+             'distance_weights': distance_weights_1},
+            convert_time=False, calculate_graph=False,
+            given_topics=True, token_cache=None,
+            load_topic_matrix=lambda lda_model, msg_ids: None,
+            meta_graph_format='compact'
+        )
+    try:
+        mg, path = build()
+        assert_true(path.endswith('.mg'))
+        assert_true(is_compact_meta_graph(path))
+
+        # loaded from the compact cache this time
+        mg_2, path_2 = build()
+        assert_equal(path, path_2)
+        assert_equal(sorted(mg.nodes()), sorted(mg_2.nodes()))
+        assert_equal(sorted(mg.edges()), sorted(mg_2.edges()))
+        for s, t in mg.edges_iter():
+            assert_almost_equal(mg[s][t]['c'], mg_2[s][t]['c'])
+        for n in mg.nodes_iter():
+            numpy.testing.assert_array_almost_equal(mg.node[n]['topics'],
+                                                    mg_2.node[n]['topics'])
+    finally:
+        shutil.rmtree(tmp_dir)
@@ -0,0 +1,89 @@
+import unittest
+
+from nose.tools import assert_equal, assert_true
+from scipy.spatial.distance import cosine
+
+from .incremental_meta_graph import IncrementalMetaGraph, \
+    replay_interactions, make_edge_cost_func
+from .interactions import InteractionsUtil as IU
+from .util import json_load
+from .test_util import make_path
+
+
+class IncrementalMetaGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.path = make_path('test/data/enron-head-100.json')
+        self.preprune_secs = 28 * 86400
+
+    def test_same_as_batch_construction(self):
+        img = IncrementalMetaGraph(self.preprune_secs)
+        list(img.add_all(replay_interactions(self.path)))
+
+        expected = IU.get_meta_graph(json_load(self.path),
+                                     decompose_interactions=False,
+                                     remove_singleton=False,
+                                     preprune_secs=self.preprune_secs)
+        assert_equal(sorted(expected.nodes()), sorted(img.g.nodes()))
+        assert_equal(sorted(expected.edges()), sorted(img.g.edges()))
+
+    def test_without_preprune_secs(self):
+        img = IncrementalMetaGraph(None)
+        list(img.add_all(replay_interactions(self.path)))
+        assert_equal(img.n_added, img.window_size)
+
+        expected = IU.get_meta_graph(json_load(self.path),
+                                     decompose_interactions=False,
+                                     remove_singleton=False,
+                                     preprune_secs=None)
+        assert_true(expected.number_of_edges() > 0)
+        assert_equal(sorted(expected.edges()), sorted(img.g.edges()))
+
+    def test_state_bounded_by_window(self):
+        expired = []
+        img = IncrementalMetaGraph(
+            3600, retention_secs=7200,
+            on_expire=lambda n, attrs: expired.append(n)
+        )
+        for n in img.add_all(replay_interactions(self.path)):
+            for p in img.g.nodes_iter():
+                assert_true(
+                    (img.latest_time -
+                     img.g.node[p]['datetime']).total_seconds() <= 7200
+                )
+            for s, t in img.g.edges_iter():
+                assert_true(
+                    (img.g.node[t]['datetime'] -
+                     img.g.node[s]['datetime']).total_seconds() <= 3600
+                )
+        assert_equal(img.n_expired, len(expired))
+        assert_equal(img.n_added,
+                     img.n_expired + img.g.number_of_nodes())
+        assert_true(img.window_size <= img.g.number_of_nodes())
+
+    def test_out_of_order(self):
+        interactions = list(replay_interactions(self.path))
+        img = IncrementalMetaGraph(self.preprune_secs)
+        img.add(interactions[1])
+        self.assertRaises(ValueError, img.add, interactions[0])
+
+    def test_edge_cost_on_arrival(self):
+        path = make_path('test/data/given_topics/interactions.json')
+        img = IncrementalMetaGraph(
+            8, edge_cost_func=make_edge_cost_func(cosine),
+            convert_time=False
+        )
+        list(img.add_all(replay_interactions(path, convert_time=False)))
+
+        expected = IU.assign_edge_weights(
+            IU.get_meta_graph(json_load(path),
+                              decompose_interactions=False,
+                              remove_singleton=False,
+                              given_topics=True,
+                              convert_time=False,
+                              preprune_secs=8),
+            cosine
+        )
+        assert_true(expected.number_of_edges() > 0)
+        for s, t in expected.edges_iter():
+            self.assertAlmostEqual(expected[s][t][IU.EDGE_COST_KEY],
+                                   img.g[s][t][IU.EDGE_COST_KEY])
@@ -265,6 +265,28 @@ class InteractionsUtilTest(unittest.TestCase):
         
         self.check_weighted_dist(g, self.weight_cost_func_bow_topics)
 
+    def test_apply_edge_weights_reuses_distances(self):
+        # topics set directly, no LDA involved
+        rng = numpy.random.RandomState(0)
+        g = self.g_undecom.copy()
+        for n in g.nodes_iter():
+            g.node[n]['topics'] = rng.dirichlet(numpy.ones(4))
+        IU.add_bow_to_graph(g, self.dictionary)
+        fields = ['topics', 'bow']
+        edges, dists_mat = IU.compute_edge_distances(g, cosine, fields)
+        assert_equal((g.number_of_edges(), 2), dists_mat.shape)
+
+        IU.apply_edge_weights(g, edges, dists_mat, fields,
+                              {'topics': 0.2, 'bow': 0.8})
+        self.check_weighted_dist(g, self.weight_cost_func_bow_topics)
+
+        IU.apply_edge_weights(g, edges, dists_mat, fields, {'topics': 1.0})
+        for s, t in g.edges_iter():
+            numpy.testing.assert_array_almost_equal(
+                cosine(g.node[s]['topics'], g.node[t]['topics']),
+                g[s][t][IU.EDGE_COST_KEY]
+            )
+
     def test_decompose_interactions(self):
         d_interactions = IU.decompose_interactions(
             IU.clean_interactions(
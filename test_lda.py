@@ -1,6 +1,7 @@
 import os
+import codecs
 
-from nose.tools import assert_true
+from nose.tools import assert_true, assert_equal
 from subprocess import check_output
 
 from test_util import CURDIR, remove_tmp_data
@@ -25,3 +26,39 @@ def test_cmd():
     assert_true("traceback" not in output.lower())
 
     remove_tmp_data(os.path.join(CURDIR, 'test/data/tmp'))
+
+
+def test_corpora_cmd_in_parallel():
+    tmp_dir = os.path.join(CURDIR, 'test/data/tmp')
+    if not os.path.exists(tmp_dir):
+        os.makedirs(tmp_dir)
+    messages_path = os.path.join(tmp_dir, 'messages.txt')
+    with open(os.path.join(CURDIR, 'test/data/islamic-head-10.txt')) as f:
+        lines = f.readlines()
+    # line breaks other than \n split documents as well
+    lines.append(u'first\rsecond\x0cthird\u2028fourth\n'.encode('utf8'))
+    with open(messages_path, 'w') as f:
+        f.writelines(lines)
+    with codecs.open(messages_path, 'r', 'utf8') as f:
+        n_docs = sum(1 for _ in f)
+
+    cmd = """cd {} && python lda/corpora.py \
+    --messages_path {} \
+    --dict_path {} \
+    --id2token_path {} \
+    --mm_output_path {} \
+    --n_jobs 3""".format(
+        CURDIR,
+        messages_path,
+        os.path.join(tmp_dir, 'dict.pkl'),
+        os.path.join(tmp_dir, 'id2token.pkl'),
+        os.path.join(tmp_dir, 'corpus.mm')
+    )
+    output = check_output(cmd, shell=True)
+    assert_true("traceback" not in output.lower())
+    assert_true(os.path.exists(os.path.join(tmp_dir, 'corpus.mm')))
+    with open(messages_path + '.len') as f:
+        assert_equal(n_docs, int(f.read().split()[0]))
+    assert_equal(len(lines) + 3, n_docs)
+
+    remove_tmp_data(tmp_dir)
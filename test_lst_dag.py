@@ -1,15 +1,16 @@
 import unittest
 import math
 import numpy as np
-from nose.tools import assert_equal
+from nose.tools import assert_equal, assert_true
 from networkx.classes.digraph import DiGraph
 from scipy.spatial.distance import euclidean
 
 from .lst import lst_dag, dp_dag_general, \
     round_edge_weights_by_multiplying, \
     make_variance_cost_func,\
-    get_all_nodes
-from .dag_util import binarize_dag
+    get_all_nodes, LstMemo, lst_dag_compact
+from .dag_util import binarize_dag, unbinarize_dag
+from .interactions import InteractionsUtil as IU
 
 
 def get_example_1():
@@ -254,6 +255,116 @@ class LstDagTestCase(unittest.TestCase):
             assert_equal(expected, actual.edges())
         
 
+class LstDagMemoTest(unittest.TestCase):
+    def add_datetime(self, g):
+        for n in g.nodes_iter():
+            g.node[n]['datetime'] = n
+        return g
+
+    def test_same_as_without_memo(self):
+        for example in (get_example_1(), get_example_3()):
+            # one memo per graph
+            memo = LstMemo()
+            original_g, U, expected_edge_list = example
+            self.add_datetime(original_g)
+            for u, expected in zip(U, expected_edge_list):
+                actual = lst_dag(original_g.copy(), 1, u, memo=memo)
+                assert_equal(sorted(expected), sorted(actual.edges()))
+
+    def test_shared_across_roots(self):
+        rng = np.random.RandomState(1)
+        g = DiGraph()
+        n_nodes = 40
+        for i in xrange(n_nodes):
+            g.add_node(i, {'r': 1, 'datetime': i})
+        for i in xrange(n_nodes):
+            for j in xrange(i + 1, min(i + 8, n_nodes)):
+                if rng.rand() < 0.4:
+                    g.add_edge(i, j, {'c': rng.randint(1, 4)})
+
+        memo = LstMemo(max_size=1000)
+        for r in xrange(n_nodes):
+            dag = binarize_dag(
+                IU.get_rooted_subgraph_within_timespan(g, r, 10),
+                'r', 'c', deterministic=True
+            )
+            expected = unbinarize_dag(lst_dag(dag, r, 6), 'c')
+            actual = unbinarize_dag(lst_dag(dag, r, 6, memo=memo), 'c')
+            assert_equal(
+                sum(g.node[n]['r'] for n in expected.nodes_iter()),
+                sum(g.node[n]['r'] for n in actual.nodes_iter())
+            )
+            assert_true(sum(g[s][t]['c'] for s, t in actual.edges()) <= 6)
+        assert_true(memo.reuse_rate > 0)
+
+    def test_eviction(self):
+        memo = LstMemo(max_size=2)
+        for i in xrange(3):
+            memo.put(i, i)
+        assert_equal(2, len(memo))
+        assert_equal(None, memo.get(0))
+        assert_equal(2, memo.get(2))
+        assert_equal(0.5, memo.reuse_rate)
+
+
+class LstDagCompactTest(unittest.TestCase):
+    def run_case(self, example_data, **lst_kws):
+        g, U, expected_edge_list = example_data
+        for u, expected in zip(U, expected_edge_list):
+            actual = lst_dag_compact(g, 1, u, **lst_kws)
+            assert_equal(sorted(expected), sorted(actual.edges()))
+
+    def test_example_1(self):
+        self.run_case(get_example_1())
+
+    def test_example_2(self):
+        self.run_case(get_example_2(), edge_weight_decimal_point=2)
+
+    def test_same_as_binarized_lst_dag(self):
+        rng = np.random.RandomState(2)
+        g = DiGraph()
+        n_nodes = 30
+        for i in xrange(n_nodes):
+            # numeric timestamps for the timespan filter
+            g.add_node(i, {'r': rng.randint(1, 4), 'datetime': i})
+        for i in xrange(n_nodes):
+            for j in xrange(i + 1, min(i + 10, n_nodes)):
+                if rng.rand() < 0.5:
+                    g.add_edge(i, j, {'c': rng.rand()})
+
+        for r in xrange(0, n_nodes, 3):
+            dag = IU.get_rooted_subgraph_within_timespan(g, r, 10)
+            if dag.number_of_edges() == 0:
+                continue
+            expected = unbinarize_dag(
+                lst_dag(binarize_dag(dag, 'r', 'c'), r, 2.0,
+                        edge_weight_decimal_point=1),
+                'c'
+            )
+            actual = lst_dag_compact(dag, r, 2.0,
+                                     edge_weight_decimal_point=1)
+            assert_equal(
+                sum(g.node[n]['r'] for n in expected.nodes_iter()),
+                sum(g.node[n]['r'] for n in actual.nodes_iter())
+            )
+            # costs on the same scale as the binarized version
+            for s, t in actual.edges_iter():
+                assert_equal(int(round(g[s][t]['c'] * 10)),
+                             actual[s][t]['c'])
+            for s, t in expected.edges_iter():
+                assert_equal(int(round(g[s][t]['c'] * 10)),
+                             expected[s][t]['c'])
+            assert_true(sum(actual[s][t]['c']
+                            for s, t in actual.edges_iter()) <= 20)
+
+    def test_original_costs_without_rounding(self):
+        g, U, _ = get_example_1()
+        actual = lst_dag_compact(g, 1, U[-1])
+        assert_true(actual.number_of_edges() > 0)
+        for s, t in actual.edges_iter():
+            assert_equal(g[s][t]['c'], actual[s][t]['c'])
+
+
 class LstDagGeneralTest(unittest.TestCase):
     def setUp(self):
         def local_cost_func(n, D, g,
@@ -1,5 +1,7 @@
 import unittest
-from .max_cover import maximum_k_coverage, argmax_k_coverage
+import random
+from .max_cover import maximum_k_coverage, argmax_k_coverage, \
+    IncrementalKCoverage
 from nose.tools import assert_equal
 
 
@@ -94,3 +96,18 @@ class ArgmaxKCoverageTest(unittest.TestCase):
             [0, 1, 2, 3],
             argmax_k_coverage(example, 100)
         )
+
+
+class IncrementalKCoverageTest(unittest.TestCase):
+    def test_same_as_argmax_k_coverage_on_prefixes(self):
+        rng = random.Random(1)
+        sets = [set(rng.sample(xrange(30), rng.randint(1, 8)))
+                for _ in xrange(60)]
+        for k in (1, 3, 5):
+            cover = IncrementalKCoverage(k)
+            for i, s in enumerate(sets):
+                cover.add(s)
+                expected = argmax_k_coverage(sets[:i+1], k)
+                assert_equal(list(expected), cover.selected)
+                assert_equal(set().union(*[sets[j] for j in expected]),
+                             cover.covered)
@@ -0,0 +1,143 @@
+import os
+import unittest
+import shutil
+import tempfile
+
+from datetime import timedelta
+from nose.tools import assert_equal, assert_true, assert_false, \
+    assert_not_equal
+from scipy.spatial.distance import cosine, euclidean
+
+from .meta_graph_cache import MetaGraphCache, CachedMetaGraphBuilder, \
+    params_signature, parse_weight_grid
+from .compact_meta_graph import load_meta_graph
+from .interactions import InteractionsUtil as IU
+from .util import json_load
+from .test_util import make_path
+
+
+class ParamsSignatureTest(unittest.TestCase):
+    def test_sub_day_timedelta(self):
+        assert_not_equal(params_signature(secs=timedelta(hours=1)),
+                         params_signature(secs=timedelta(hours=2)))
+        assert_equal(params_signature(secs=timedelta(hours=1)),
+                     params_signature(secs=3600))
+
+    def test_callable(self):
+        assert_not_equal(params_signature(dist_func=cosine),
+                         params_signature(dist_func=euclidean))
+        assert_not_equal(params_signature(dist_func=lambda a, b: 0),
+                         params_signature(dist_func=lambda a, b: 1))
+        assert_not_equal(params_signature(dist_func=lambda a, b: a.x),
+                         params_signature(dist_func=lambda a, b: a.y))
+        assert_equal(params_signature(dist_func=lambda a, b: 0),
+                     params_signature(dist_func=lambda a, b: 0))
+
+    def test_callable_closure(self):
+        def make(w):
+            return lambda a, b: w * cosine(a, b)
+        assert_not_equal(params_signature(dist_func=make(1)),
+                         params_signature(dist_func=make(2)))
+        assert_equal(params_signature(dist_func=make(1)),
+                     params_signature(dist_func=make(1)))
+
+    def test_dict_order(self):
+        assert_equal(params_signature(w={'topics': 0.2, 'bow': 0.8}),
+                     params_signature(w={'bow': 0.8, 'topics': 0.2}))
+
+
+class CachedMetaGraphBuilderTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.interaction_path = os.path.join(self.cache_dir,
+                                             'interactions.json')
+        shutil.copy(make_path('test/data/given_topics/interactions.json'),
+                    self.interaction_path)
+        self.kws = {
+            'dist_func': cosine,
+            'preprune_secs': 8,
+            'distance_weights': {'topics': 1.0},
+            'decompose_interactions': False,
+            'convert_time': False
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def make_builder(self):
+        return CachedMetaGraphBuilder(MetaGraphCache(self.cache_dir),
+                                      self.interaction_path,
+                                      given_topics=True)
+
+    def test_same_as_without_cache(self):
+        g, path = self.make_builder().build(**self.kws)
+        assert_true(os.path.exists(path))
+
+        expected = IU.get_topic_meta_graph(
+            json_load(self.interaction_path),
+            None, cosine,
+            preprune_secs=8,
+            decompose_interactions=False,
+            given_topics=True,
+            convert_time=False
+        )
+        assert_equal(sorted(expected.edges()), sorted(g.edges()))
+        for s, t in expected.edges_iter():
+            self.assertAlmostEqual(expected[s][t][IU.EDGE_COST_KEY],
+                                   g[s][t][IU.EDGE_COST_KEY])
+
+    def test_weighted_graph_reused(self):
+        g, path = self.make_builder().build(**self.kws)
+
+        builder = self.make_builder()
+        g_2, path_2 = builder.build(**self.kws)
+        assert_equal(path, path_2)
+        assert_false('interactions' in builder._inputs)
+        assert_equal(sorted(g.edges()), sorted(g_2.edges()))
+
+    def test_base_graph_reused(self):
+        self.make_builder().build(**self.kws)
+
+        self.kws['dist_func'] = euclidean
+        builder = self.make_builder()
+        builder.build(**self.kws)
+        # edge weights are recomputed from the cached base graph
+        assert_false('interactions' in builder._inputs)
+
+    def test_input_change_detected(self):
+        builder = self.make_builder()
+        key = builder.base_key(preprune_secs=8)
+
+        with open(self.interaction_path, 'a') as f:
+            f.write('\n')
+        os.utime(self.interaction_path, (0, 0))
+        assert_not_equal(key, self.make_builder().base_key(preprune_secs=8))
+
+    def test_different_preprune_secs(self):
+        _, path = self.make_builder().build(**self.kws)
+        self.kws['preprune_secs'] = 9
+        _, path_2 = self.make_builder().build(**self.kws)
+        assert_not_equal(path, path_2)
+
+    def test_build_grid(self):
+        kws = self.kws.copy()
+        del kws['distance_weights']
+        paths = self.make_builder().build_grid(
+            weight_grid=[{'topics': 1.0}, {'topics': 0.5}],
+            **kws
+        )
+        assert_equal(2, len(set(paths)))
+        g1, g2 = map(load_meta_graph, paths)
+        for s, t in g1.edges_iter():
+            self.assertAlmostEqual(g1[s][t][IU.EDGE_COST_KEY] * 0.5,
+                                   g2[s][t][IU.EDGE_COST_KEY])
+
+        # single build is served by the grid
+        builder = self.make_builder()
+        _, path = builder.build(**self.kws)
+        assert_equal(paths[0], path)
+        assert_false('interactions' in builder._inputs)
+
+    def test_parse_weight_grid(self):
+        assert_equal([{'topics': 0.2, 'bow': 0.8}, {'hashtag_bow': 1.0}],
+                     parse_weight_grid(['0.2,0.8,0', '0,0,1']))
@@ -8,7 +8,10 @@ from datetime import datetime
 from nose.tools import assert_equal, assert_true, assert_almost_equal
 from .util import load_json_by_line, json_load
 from .interactions import InteractionsUtil as IU
-from .meta_graph_stat import MetaGraphStat
+from .meta_graph_stat import MetaGraphStat, use_interaction_index, \
+    summarize_events
+from .interaction_index import InteractionIndex
+from .node_times import NodeTimes
 from .test_util import make_path
 
 
@@ -128,6 +131,26 @@ class MetaGraphStatTest(unittest.TestCase):
         assert_equal(expected,
                      self.s.temporal_traffic(time_resolution='hour'))
 
+    def test_node_times_of_subgraphs(self):
+        times = NodeTimes(self.g)
+        nodes = self.g.nodes()
+        subsets = [nodes[:2], [], nodes[1:], nodes[::2]]
+        idx_list = [times.indices(ns) for ns in subsets]
+        for resolution in ('minute', 'second'):
+            assert_equal(
+                [times.temporal_traffic(resolution, idx)
+                 for idx in idx_list],
+                times.temporal_traffics(idx_list, resolution)
+            )
+        assert_equal([times.time_span(idx) for idx in idx_list],
+                      times.time_spans(idx_list))
+
+        ds = [self.g.node[n]['datetime'] for n in nodes[1:]]
+        assert_equal({'start_time': min(ds), 'end_time': max(ds)},
+                     times.time_span(idx_list[2]))
+        assert_equal({'email_count_hist': []},
+                     times.temporal_traffic('second', idx_list[1]))
+
     def test_topics(self):
         actual = self.s.topics(self.interactions,
                                self.dictionary,
@@ -221,6 +244,84 @@ class MetaGraphStatTest(unittest.TestCase):
             actual
         )
     
+    def test_same_with_interaction_index(self):
+        index = InteractionIndex(self.interactions)
+        assert_equal(self.s.email_content(self.interactions, top_k=2,
+                                          unique=False),
+                     self.s.email_content(index, top_k=2, unique=False))
+        assert_equal(self.s.link_type_freq(self.interactions),
+                     self.s.link_type_freq(index))
+        kws = dict(people_repr_template="{name}({email})", top_k=5)
+        assert_equal(
+            self.s.participants(self.people_info, self.interactions, **kws),
+            self.s.participants(self.people_info, index, **kws)
+        )
+
+    def test_use_interaction_index(self):
+        kws = use_interaction_index(self.s.kws)
+        indices = [k['interactions'] for k in kws.values()
+                   if 'interactions' in k]
+        assert_true(len(indices) > 1)
+        assert_true(all(i is indices[0] for i in indices))
+        assert_true(isinstance(indices[0], InteractionIndex))
+        # the original kws are untouched
+        assert_true(isinstance(self.s.kws['email_content']['interactions'],
+                               list))
+
+    def test_summarize_events(self):
+        kws = {m: self.s.kws[m]
+               for m in ('email_content', 'participants', 'link_type_freq')}
+        expected = [MetaGraphStat(g, kws).summary_dict()
+                    for g in (self.g, self.g)]
+        for n_jobs in (1, 2):
+            timings = {}
+            actual = list(summarize_events([self.g, self.g], kws,
+                                           n_jobs=n_jobs, timings=timings))
+            assert_equal(expected, actual)
+            assert_equal(set(kws.keys()) | {'topics_prefetch'},
+                         set(timings.keys()))
+            assert_true(all(secs >= 0 for secs in timings.values()))
+
+    def test_summarize_events_infers_topics_in_parent(self):
+        class ParentOnlyLda(object):
+            """fails if inference runs in another process"""
+            num_topics = 3
+
+            def __init__(self, dictionary):
+                self.pid = os.getpid()
+                self.id2word = dictionary
+                self.wordtopics = np.ones((self.num_topics, len(dictionary)))
+                self.n_infer_calls = 0
+
+            def __getitem__(self, bow, iterations=100):
+                assert_equal(self.pid, os.getpid())
+                self.n_infer_calls += 1
+                return [[(0, 1.0)] for _ in bow]
+
+        lda = ParentOnlyLda(self.dictionary)
+        kws = {'topics': {'interactions': self.interactions,
+                          'dictionary': self.dictionary,
+                          'lda': lda,
+                          'top_k': 5}}
+        actual = list(summarize_events([self.g, self.g], kws, n_jobs=2))
+        assert_equal(2, len(actual))
+        assert_equal(1, lda.n_infer_calls)
+        # the given kws are untouched
+        assert_true('topic_cache' not in kws['topics'])
+
+    def test_people_columns(self):
+        index = InteractionIndex(self.interactions)
+        cols = index.people_columns()
+        assert_true(cols is index.people_columns())
+        for row, i in enumerate(self.interactions):
+            assert_equal(i['sender_id'],
+                         cols.person_ids[cols.senders[row]])
+            assert_equal(
+                sorted(i['recipient_ids']),
+                sorted(cols.person_ids[c]
+                       for c in cols.recipients[row].indices)
+            )
+
     def test_link_type_freq_undirected(self):
         assert_true(
             'not available' in self.s_undirected.link_type_freq(
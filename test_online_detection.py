@@ -0,0 +1,74 @@
+import random
+import unittest
+import numpy as np
+import networkx as nx
+
+from nose.tools import assert_equal, assert_true
+from scipy.spatial.distance import cosine
+
+from .online_detection import OnlineEventDetector
+from .incremental_meta_graph import replay_interactions, make_edge_cost_func
+from .lst import lst_dag
+from .test_util import make_path
+
+
+class OnlineEventDetectorTest(unittest.TestCase):
+    def setUp(self):
+        random.seed(123456)
+        self.interactions = list(replay_interactions(
+            make_path('test/data/given_topics/interactions.json'),
+            convert_time=False
+        ))
+
+    def make_detector(self, tick_budget_secs):
+        return OnlineEventDetector(
+            lambda g, r, U: lst_dag(g, r, U,
+                                    edge_weight_decimal_point=2,
+                                    debug=False),
+            U=2.0,
+            timespan_secs=8,
+            preprune_secs=8,
+            edge_cost_func=make_edge_cost_func(cosine),
+            tick_secs=2,
+            tick_budget_secs=tick_budget_secs,
+            selection_window_secs=50,
+            k=5,
+            should_binarize_dag=True,
+            convert_time=False
+        )
+
+    def test_replay(self):
+        detector = self.make_detector(tick_budget_secs=10)
+        for i in self.interactions:
+            detector.add(i)
+            # trees rooted before the selection window are dropped
+            # at each tick, so they can be one tick older in between
+            for t, _ in detector.trees:
+                assert_true(detector.meta_graph.latest_time - t <= 50 + 2)
+
+        selected = detector.flush()
+        assert_true(0 < len(selected) <= 5)
+        for tree in selected:
+            assert_true(nx.is_arborescence(tree))
+            times = [tree.node[n]['datetime'] for n in tree.nodes_iter()]
+            assert_true(max(times) - min(times) <= 8)
+
+        metrics = detector.metrics()
+        assert_equal(len(self.interactions), metrics['n_interactions'])
+        assert_equal(0, metrics['n_pending_roots'])
+        assert_true(metrics['n_trees'] > 0)
+        assert_true(metrics['n_ticks'] > 0)
+
+    def test_budget(self):
+        # one tree per tick at most with no budget
+        detector = self.make_detector(tick_budget_secs=0)
+        n_trees = []
+        for i in self.interactions:
+            n_ticks = detector.n_ticks
+            n = len(detector.latencies)
+            detector.add(i)
+            if detector.n_ticks > n_ticks:
+                n_trees.append(len(detector.latencies) - n)
+        assert_true(len(n_trees) > 0)
+        assert_true(max(n_trees) <= 1)
+        assert_true(np.all(np.asarray(detector.latencies) >= 0))
@@ -7,7 +7,8 @@ from nose.tools import assert_equal, assert_true, \
 
 import networkx as nx
 from sampler import quota_upperbound, UBSampler, RandomSampler, \
-    node_scores_from_tree, AdaptiveSampler, DeterministicSampler
+    node_scores_from_tree, AdaptiveSampler, DeterministicSampler, \
+    WeightedSampler
     
 
 def test_node_scores_from_tree():
@@ -81,6 +82,12 @@ class UpperboundTest(unittest.TestCase):
         assert_false([s.take()[0] for i in xrange(4)] == range(4))
         assert_equal(0, len(s.nodes))
 
+    def test_weighted_sampler(self):
+        s = WeightedSampler(self.g, timespan_secs=3)
+        # the leaf has zero out degree
+        assert_equal([0, 1, 2], sorted(s.take()[0] for i in xrange(3)))
+        assert_raises(IndexError, s.take)
+
     def test_deterministic_sampler(self):
         s = DeterministicSampler(self.g, roots=[0, 1, 2], timespan_secs=3)
         assert_true(range(3), [s.take()[0] for i in xrange(3)])
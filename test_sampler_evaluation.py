@@ -1,7 +1,9 @@
 import unittest
+import random
 import networkx as nx
 from nose.tools import assert_equal, assert_true
-from sampler_evaluation import evaluate, k_max_setcover
+from sampler_evaluation import evaluate, k_max_setcover, \
+    precision, recall, f1, roots, evaluate_curves
 
 
 
@@ -26,3 +28,24 @@ class SamplerEvaluationTest(unittest.TestCase):
         self.acc_trees.append(None)
         scores = evaluate(self.acc_trees, self.true_trees, k_max_setcover, k=2)
         assert_equal([2, 3, 5, 5, 5], scores)
+
+
+def test_evaluate_curves_same_as_prefix_scoring():
+    rng = random.Random(1)
+
+    def random_tree(nodes):
+        t = nx.DiGraph()
+        t.add_star(nodes)
+        return t
+
+    true_trees = [random_tree(range(0, 10)), random_tree(range(20, 30))]
+    pred_trees = [random_tree(rng.sample(xrange(40), rng.randint(2, 8)))
+                  for _ in xrange(40)]
+    metrics = [k_max_setcover, precision, recall, f1, roots]
+    curves = evaluate_curves(pred_trees, true_trees,
+                             [m.__name__ for m in metrics], k=3)
+    for m in metrics:
+        expected = [m(pred_trees[:i+1], true_trees, 3)
+                    for i in xrange(len(pred_trees))]
+        assert_equal(expected, curves[m.__name__])
+        assert_equal(expected, evaluate(pred_trees, true_trees, m, k=3))
@@ -3,11 +3,12 @@ import unittest
 import pandas as pd
 import numpy as np
 import cPickle as pkl
-from nose.tools import assert_equal, assert_true, assert_almost_equal
+from nose.tools import assert_equal, assert_true, assert_almost_equal, \
+    assert_raises
 from sklearn import metrics
 
 from .synthetic_evaluation import group_paths, evaluate_against_noise,\
-    get_values_by_key
+    get_values_by_key, load_artifact, _artifact_cache
 from .test_util import make_path
 from .util import load_items_by_line, json_load
 from .max_cover import k_best_trees
@@ -78,7 +79,7 @@ class SyntheticEvaluationTest(unittest.TestCase):
              for p in actual[0][1]]
         )
 
-    def test_evaluate_against_noise(self):
+    def get_single_tree_paths(self):
         make_single_tree_path = (lambda p:
                                  make_path(
                                      'test/data/synthetic_single_tree/', p)
@@ -89,6 +90,11 @@ class SyntheticEvaluationTest(unittest.TestCase):
         events_paths = ['events--n_noisy_interactions_fraction=0.2.pkl',
                        'events--n_noisy_interactions_fraction=0.4.pkl']
         events_paths = sorted(map(make_single_tree_path, events_paths) * 2)
+        return make_single_tree_path, interactions_paths, events_paths
+
+    def test_evaluate_against_noise(self):
+        make_single_tree_path, interactions_paths, events_paths = \
+            self.get_single_tree_paths()
 
         actual = evaluate_against_noise(
             result_paths=self.result_paths_single_tree,
@@ -133,6 +139,45 @@ class SyntheticEvaluationTest(unittest.TestCase):
             actual_f1
         )
 
+    def test_evaluate_against_noise_in_parallel(self):
+        _, interactions_paths, events_paths = self.get_single_tree_paths()
+        kws = dict(result_paths=self.result_paths_single_tree,
+                   interactions_paths=interactions_paths,
+                   events_paths=events_paths,
+                   metrics=[metrics.adjusted_rand_score],
+                   xticks=[])
+        expected = evaluate_against_noise(**kws)
+        actual = evaluate_against_noise(n_jobs=2, **kws)
+        assert_equal(sorted(expected.keys()), sorted(actual.keys()))
+        for key in expected:
+            pd.util.testing.assert_frame_equal(expected[key], actual[key])
+
+    def test_evaluate_against_noise_without_any_result(self):
+        _, interactions_paths, events_paths = self.get_single_tree_paths()
+        assert_raises(ValueError, evaluate_against_noise,
+                      result_paths=self.result_paths_single_tree,
+                      interactions_paths=interactions_paths,
+                      events_paths=events_paths,
+                      metrics=[metrics.adjusted_rand_score],
+                      xticks=[0.9])  # no result at this x tick
+
+    def test_load_artifact(self):
+        loaded = []
+
+        def load(path):
+            loaded.append(path)
+            return path.upper()
+
+        try:
+            assert_equal('A', load_artifact('a', load))
+            assert_equal('A', load_artifact('a', load))
+            assert_equal('B', load_artifact('b', load))
+            # only the last artifact is kept
+            assert_equal([('b', 'B')], _artifact_cache.values())
+            assert_equal(['a', 'b'], loaded)
+        finally:
+            _artifact_cache.clear()
+
     def test_get_values_by_key(self):
         np.testing.assert_almost_equal(
             np.linspace(0.1, 1, num=10).tolist(),
@@ -0,0 +1,109 @@
+import os
+import unittest
+import shutil
+import tempfile
+import gensim
+import numpy as np
+
+from nose.tools import assert_equal, assert_true
+
+from .interactions import InteractionsUtil as IU
+from .token_cache import TokenCache, bow_to_gensim, dictionary_signature
+from .util import json_load
+from .test_util import make_path
+
+
+class TokenCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dictionary = gensim.corpora.dictionary.Dictionary.load(
+            make_path('test/data/test_dictionary.gsm')
+        )
+        self.g = IU.get_meta_graph(
+            json_load(make_path('test/data/enron_test.json')),
+            decompose_interactions=False
+        )
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_build_bow_matrix_with_cache(self):
+        n2i, expected = IU.build_bow_matrix(self.g, self.dictionary)
+        n2i_cached, actual = IU.build_bow_matrix(
+            self.g, self.dictionary,
+            token_cache=TokenCache(self.cache_dir)
+        )
+        assert_equal(n2i, n2i_cached)
+        np.testing.assert_array_equal(expected.toarray(), actual.toarray())
+
+    def test_cache_is_persistent(self):
+        mids = [self.g.node[n]['message_id'] for n in self.g.nodes_iter()]
+        id2text = {self.g.node[n]['message_id']: u'{} {}'.format(
+            self.g.node[n]['subject'], self.g.node[n]['body'])
+                   for n in self.g.nodes_iter()}
+        expected = TokenCache(self.cache_dir).bow_matrix(
+            mids, id2text.__getitem__, self.dictionary
+        )
+
+        cache = TokenCache(self.cache_dir)
+        sizes = [os.path.getsize(p) for p in
+                 (cache.tokens_path, cache.bow_path(
+                     dictionary_signature(self.dictionary)))]
+        actual = cache.bow_matrix(mids[::-1], id2text.__getitem__,
+                                  self.dictionary)
+        np.testing.assert_array_equal(expected.toarray()[::-1],
+                                      actual.toarray())
+        assert_equal([IU.tokenize_document(id2text[m]) for m in mids],
+                     cache.tokens(mids, id2text.__getitem__))
+        # nothing is tokenized or appended again
+        assert_equal(sizes,
+                     [os.path.getsize(p) for p in
+                      (cache.tokens_path, cache.bow_path(
+                          dictionary_signature(self.dictionary)))])
+
+    def test_same_ids_of_other_dataset(self):
+        mids = range(5)
+        texts1 = lambda m: u'enron california electricity {}'.format(m)
+        texts2 = lambda m: u'market price trading {}'.format(m)
+        TokenCache(self.cache_dir).tokens(mids, texts1)
+        cache = TokenCache(self.cache_dir)
+        assert_equal([IU.tokenize_document(texts2(m)) for m in mids],
+                     cache.tokens(mids, texts2))
+        assert_equal([IU.tokenize_document(texts1(m)) for m in mids],
+                     cache.tokens(mids, texts1))
+
+    def test_dictionary_signature_per_dictionary(self):
+        cache = TokenCache(self.cache_dir)
+        sig = cache._dictionary_signature(self.dictionary)
+        assert_equal(dictionary_signature(self.dictionary), sig)
+        assert_equal(sig, cache._dictionary_signature(self.dictionary))
+        assert_equal(1, len(cache._dict_sigs))
+
+        # recomputed once the vocabulary changes
+        self.dictionary.add_documents([[u'some_unseen_token']])
+        new_sig = cache._dictionary_signature(self.dictionary)
+        assert_true(new_sig != sig)
+        assert_equal(dictionary_signature(self.dictionary), new_sig)
+
+    def test_parallel_tokenization(self):
+        mids = range(50)
+        id2text = lambda m: u'enron california electricity {}'.format(m)
+        cache = TokenCache(self.cache_dir, n_jobs=2, chunk_size=10)
+        assert_equal([IU.tokenize_document(id2text(m)) for m in mids],
+                     cache.tokens(mids, id2text))
+
+    def test_bow_to_gensim(self):
+        mids = [self.g.node[n]['message_id'] for n in self.g.nodes_iter()]
+        id2text = {self.g.node[n]['message_id']: u'{} {}'.format(
+            self.g.node[n]['subject'], self.g.node[n]['body'])
+                   for n in self.g.nodes_iter()}
+        mat = TokenCache(self.cache_dir).bow_matrix(
+            mids, id2text.__getitem__, self.dictionary
+        )
+        expected = self.dictionary.doc2bow(
+            IU.tokenize_document(
+                ' '.join(id2text[m] for m in mids)
+            )
+        )
+        assert_true(len(expected) > 0)
+        assert_equal(sorted(expected), sorted(bow_to_gensim(mat.sum(axis=0))))
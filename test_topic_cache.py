@@ -0,0 +1,103 @@
+import unittest
+import shutil
+import tempfile
+import numpy as np
+
+from nose.tools import assert_equal, assert_true, assert_raises
+
+from .topic_cache import TopicMatrix, EventTopicCache, to_dense_topics
+
+
+class FakeMallet(object):
+    """mimics the interface of `LdaMallet` used by the caches
+    """
+    num_topics = 3
+
+    def __init__(self):
+        self.n_infer_calls = 0
+
+    def load_document_topics(self):
+        return iter([[(0, 0.5), (1, 0.5)],
+                     [(2, 1.0)],
+                     [(0, 0.2), (1, 0.3), (2, 0.5)]])
+
+    def __getitem__(self, bow, iterations=100):
+        self.n_infer_calls += 1
+        return [[(len(b) % 3, 1.0)] for b in bow]
+
+
+class TopicMatrixTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.lda = FakeMallet()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_from_lda(self):
+        tm = TopicMatrix.from_lda(self.lda, ['a', 'b', 'c'])
+        assert_equal(np.float32, tm.matrix.dtype)
+        assert_equal((3, 3), tm.matrix.shape)
+        np.testing.assert_array_almost_equal([0, 0, 1.0], tm['b'])
+        np.testing.assert_array_almost_equal([[0.2, 0.3, 0.5],
+                                              [0.5, 0.5, 0]],
+                                             tm.rows(['c', 'a']))
+
+    def test_load_or_build(self):
+        path = self.tmp_dir + '/topics'
+        expected = TopicMatrix.load_or_build(path, self.lda, ['a', 'b', 'c'])
+        # built once, loaded as memory mapped array later on
+        actual = TopicMatrix.load_or_build(path, self.lda, ['a', 'b', 'c'])
+        assert_true(isinstance(actual.matrix, np.memmap))
+        assert_equal(['a', 'b', 'c'], actual.msg_ids)
+        np.testing.assert_array_almost_equal(expected.matrix, actual.matrix)
+
+        # rebuilt for other message ids
+        actual = TopicMatrix.load_or_build(path, self.lda, ['c', 'b', 'a'])
+        assert_equal(['c', 'b', 'a'], actual.msg_ids)
+        np.testing.assert_array_almost_equal(expected.matrix, actual.matrix)
+        assert_equal(['c', 'b', 'a'],
+                     TopicMatrix.load(path).msg_ids)
+
+    def test_from_lda_with_other_number_of_ids(self):
+        assert_raises(AssertionError, TopicMatrix.from_lda,
+                      self.lda, ['a', 'b'])
+        assert_raises(AssertionError, TopicMatrix.from_lda,
+                      self.lda, ['a', 'b', 'c', 'd'])
+
+
+class EventTopicCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.lda = FakeMallet()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_prefetch_in_one_call(self):
+        cache = EventTopicCache(self.lda)
+        events = [([1, 2], [(0, 1)]),
+                  ([3], [(0, 1), (1, 1)]),
+                  ([2, 1], [(0, 1)])]  # same event as the first one
+        cache.prefetch(events)
+        assert_equal(1, self.lda.n_infer_calls)
+
+        for msg_ids, bow in events:
+            cache.get(msg_ids, bow)
+        assert_equal(1, self.lda.n_infer_calls)
+        np.testing.assert_array_almost_equal(
+            [0, 0, 1.0], cache.get([3], [(0, 1), (1, 1)])
+        )
+
+    def test_persistence(self):
+        path = self.tmp_dir + '/event_topics.pkl'
+        EventTopicCache(self.lda, path=path).get([1, 2], [(0, 1)])
+        cache = EventTopicCache(self.lda, path=path)
+        cache.get([1, 2], [(0, 1)])
+        assert_equal(1, self.lda.n_infer_calls)
+
+    def test_to_dense_topics(self):
+        np.testing.assert_array_almost_equal(
+            [0.3, 0, 0.7],
+            to_dense_topics([(0, 0.3), (2, 0.7)], 3)
+        )
@@ -1,8 +1,11 @@
+import ujson as json
 import networkx as nx
+from StringIO import StringIO
 from nose.tools import assert_equal, assert_true, assert_false
 
 from .event_context import extract_event_context
-from .viz_util import to_d3_graph, add_subgraph_specific_attributes_to_graph
+from .viz_util import to_d3_graph, add_subgraph_specific_attributes_to_graph, \
+    write_d3_graphs
 from .test_event_context import load_example
 
 
@@ -60,3 +63,26 @@ def test_merge_graphs_adding_special_attributes():
 
     assert_false('pair' in new_dag[3])
     assert_false('triple' in new_dag[3])
+
+
+def test_write_d3_graphs():
+    g = nx.DiGraph()
+    g.add_nodes_from([('a', {'topics': [0.5, 0.5], 'x': 1}),
+                      ('b', {'bow': [1], 'x': 2})])
+    g.add_edge('a', 'b', {'c': 0.1})
+    empty = nx.DiGraph()
+
+    f = StringIO()
+    write_d3_graphs((h for h in (g, empty, g)), f)
+    actual = json.loads(f.getvalue())
+    expected = [to_d3_graph(h) for h in (g, empty, g)]
+    assert_equal(expected, actual)
+    assert_equal([{'name': 'a', 'x': 1}, {'name': 'b', 'x': 2}],
+                 sorted(actual[0]['nodes']))
+    edge = actual[0]['edges'][0]
+    assert_equal(('a', 'b'), (actual[0]['nodes'][edge['source']]['name'],
+                              actual[0]['nodes'][edge['target']]['name']))
+
+    # the source graph is untouched
+    assert_equal({'topics': [0.5, 0.5], 'x': 1}, g.node['a'])
+    assert_equal({'c': 0.1}, g['a']['b'])
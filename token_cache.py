@@ -0,0 +1,225 @@
+# Persistent token and BoW cache keyed by message text and tokenizer config
+#
+# Shared by meta graph construction(`InteractionsUtil.build_bow_matrix`)
+# and event summaries(`MetaGraphStat.topics`, `frequent_terms`,
+# `tfidf_terms`) so that each message is tokenized only once
+
+import os
+import hashlib
+import logging
+import cPickle as pkl
+import numpy as np
+
+from multiprocessing import Pool
+from scipy.sparse import csr_matrix, vstack
+
+from interactions import InteractionsUtil as IU
+
+logging.basicConfig(format="%(asctime)s;%(levelname)s;%(message)s",
+                    datefmt="%Y-%m-%d %H:%M:%S")
+logger = logging.getLogger("TokenCache")
+logger.setLevel(logging.DEBUG)
+
+
+def tokenizer_signature(stoplist=IU.stoplist,
+                        token_regexp=IU.valid_token_regexp,
+                        min_len=IU.MIN_TOKEN_LEN,
+                        max_len=IU.MAX_TOKEN_LEN):
+    """hash of everything that affects the output of `tokenize_document`
+    """
+    h = hashlib.sha1()
+    h.update(u'\n'.join(sorted(stoplist)).encode('utf8'))
+    h.update(token_regexp.pattern.encode('utf8'))
+    h.update('{}-{}'.format(min_len, max_len))
+    return h.hexdigest()[:12]
+
+
+def dictionary_signature(dictionary):
+    h = hashlib.sha1()
+    for token, id_ in sorted(dictionary.token2id.items(),
+                             key=lambda item: item[1]):
+        h.update(u'{}:{}\n'.format(id_, token).encode('utf8'))
+    return h.hexdigest()[:12]
+
+
+def _tokenize_documents(docs):
+    # top level function so that it can be pickled by multiprocessing
+    return [IU.tokenize_document(doc) for doc in docs]
+
+
+def tokenize_documents(docs, n_jobs=1, chunk_size=1000):
+    if n_jobs == 1 or len(docs) <= chunk_size:
+        return _tokenize_documents(docs)
+
+    chunks = [docs[i: i + chunk_size]
+              for i in xrange(0, len(docs), chunk_size)]
+    pool = Pool(n_jobs)
+    try:
+        results = pool.map(_tokenize_documents, chunks)
+    finally:
+        pool.close()
+        pool.join()
+    return [tokens for chunk in results for tokens in chunk]
+
+
+def bow_to_gensim(row):
+    """convert a 1 x V sparse count row to gensim's [(word_id, count)]
+    """
+    row = csr_matrix(row)
+    return [(int(i), int(c))
+            for i, c in zip(row.indices, row.data)]
+
+
+def text_key(text):
+    """cache key of a message text"""
+    if isinstance(text, unicode):
+        text = text.encode('utf8')
+    return hashlib.sha1(text).hexdigest()
+
+
+def _load_log(path):
+    """all chunks appended to `path` by `_append_log`"""
+    chunks = []
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            while True:
+                try:
+                    chunks.append(pkl.load(f))
+                except EOFError:
+                    break
+    return chunks
+
+
+def _append_log(path, chunk):
+    with open(path, 'ab') as f:
+        pkl.dump(chunk, f, protocol=pkl.HIGHEST_PROTOCOL)
+
+
+class TokenCache(object):
+    """
+    Tokens and BoW rows of messages, stored under `cache_dir`.
+
+    Entries are keyed by the hash of the message text(`text_key`),
+    so datasets sharing `cache_dir` and message ids do not mix up.
+    New entries are appended, one chunk per batch of misses:
+
+    - tokens--{tokenizer_sig}.log: chunks of {text key: token list}
+    - bow--{tokenizer_sig}--{dictionary_sig}.log:
+      chunks of (text keys, CSR count rows)
+
+    Cache misses are tokenized by a process pool when `n_jobs` > 1.
+    """
+    def __init__(self, cache_dir, n_jobs=1, chunk_size=1000):
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.cache_dir = cache_dir
+        self.n_jobs = n_jobs
+        self.chunk_size = chunk_size
+        self.signature = tokenizer_signature()
+
+        self.key2tokens = {}
+        for chunk in _load_log(self.tokens_path):
+            self.key2tokens.update(chunk)
+
+        # dictionary signature -> (key2row, csr_matrix)
+        self._bow = {}
+        # (id, vocabulary size) of dictionary -> (dictionary, signature)
+        self._dict_sigs = {}
+
+    @property
+    def tokens_path(self):
+        return os.path.join(self.cache_dir,
+                            'tokens--{}.log'.format(self.signature))
+
+    def bow_path(self, dict_sig):
+        return os.path.join(self.cache_dir,
+                            'bow--{}--{}.log'.format(self.signature,
+                                                     dict_sig))
+
+    def _keys(self, msg_ids, id2text):
+        """message id -> text key, text key -> text"""
+        m2key = {}
+        key2text = {}
+        for m in set(msg_ids):
+            text = id2text(m)
+            m2key[m] = key = text_key(text)
+            key2text[key] = text
+        return m2key, key2text
+
+    def _tokens_of_keys(self, keys, key2text):
+        missing = [k for k in set(keys) if k not in self.key2tokens]
+        if missing:
+            logger.debug('tokenizing {} uncached messages'.format(
+                len(missing)))
+            tokens = tokenize_documents([key2text[k] for k in missing],
+                                        n_jobs=self.n_jobs,
+                                        chunk_size=self.chunk_size)
+            new_entries = dict(zip(missing, tokens))
+            self.key2tokens.update(new_entries)
+            _append_log(self.tokens_path, new_entries)
+        return [self.key2tokens[k] for k in keys]
+
+    def tokens(self, msg_ids, id2text):
+        """
+        id2text: function that maps a message id to its text
+        """
+        m2key, key2text = self._keys(msg_ids, id2text)
+        return self._tokens_of_keys([m2key[m] for m in msg_ids], key2text)
+
+    def _load_bow(self, dictionary, dict_sig):
+        if dict_sig in self._bow:
+            return self._bow[dict_sig]
+
+        keys = []
+        mats = [csr_matrix((0, len(dictionary.keys())), dtype=np.int32)]
+        for chunk_keys, data, indices, indptr, shape in _load_log(
+                self.bow_path(dict_sig)):
+            keys += chunk_keys
+            mats.append(csr_matrix((data, indices, indptr), shape=shape))
+        mat = vstack(mats, format='csr', dtype=np.int32)
+        self._bow[dict_sig] = ({k: i for i, k in enumerate(keys)}, mat)
+        return self._bow[dict_sig]
+
+    def _dictionary_signature(self, dictionary):
+        """`dictionary_signature`, computed once per dictionary object
+        (and again if tokens are added to it)
+        """
+        key = (id(dictionary), len(dictionary.token2id))
+        # the dictionary is kept so that its id is not reused
+        if key not in self._dict_sigs or \
+                self._dict_sigs[key][0] is not dictionary:
+            self._dict_sigs[key] = (dictionary,
+                                    dictionary_signature(dictionary))
+        return self._dict_sigs[key][1]
+
+    def bow_matrix(self, msg_ids, id2text, dictionary):
+        """
+        Return CSR count matrix whose i-th row is the BoW of msg_ids[i]
+        """
+        dict_sig = self._dictionary_signature(dictionary)
+        key2row, mat = self._load_bow(dictionary, dict_sig)
+        m2key, key2text = self._keys(msg_ids, id2text)
+
+        missing = [k for k in set(m2key.values()) if k not in key2row]
+        if missing:
+            logger.debug('building BoW for {} uncached messages'.format(
+                len(missing)))
+            row_ind, col_ind, data = [], [], []
+            for i, tokens in enumerate(self._tokens_of_keys(missing,
+                                                            key2text)):
+                for word_id, cnt in dictionary.doc2bow(tokens):
+                    row_ind.append(i)
+                    col_ind.append(word_id)
+                    data.append(cnt)
+            new_rows = csr_matrix((data, (row_ind, col_ind)),
+                                  shape=(len(missing), mat.shape[1]),
+                                  dtype=np.int32)
+            _append_log(self.bow_path(dict_sig),
+                        (missing, new_rows.data, new_rows.indices,
+                         new_rows.indptr, new_rows.shape))
+            for k in missing:
+                key2row[k] = len(key2row)
+            mat = vstack([mat, new_rows], format='csr')
+            self._bow[dict_sig] = (key2row, mat)
+
+        return mat[[key2row[m2key[m]] for m in msg_ids], :]
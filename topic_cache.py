@@ -0,0 +1,185 @@
+# Topic distributions stored once and shared by
+# meta graph construction, edge weighting and event summaries
+
+import os
+import hashlib
+import logging
+import cPickle as pkl
+import numpy as np
+
+logging.basicConfig(format="%(asctime)s;%(levelname)s;%(message)s",
+                    datefmt="%Y-%m-%d %H:%M:%S")
+logger = logging.getLogger("TopicCache")
+logger.setLevel(logging.DEBUG)
+
+
+def to_dense_topics(topic_dist, n_topics):
+    """[(topic, weight)] -> float32 array of length n_topics
+
+    Mallet drops topics with tiny weights, so the list can be sparse
+    """
+    vect = np.zeros(n_topics, dtype=np.float32)
+    for t, w in topic_dist:
+        vect[t] = w
+    return vect
+
+
+def topic_matrix_signature(lda_model, msg_ids):
+    """
+    hash of the message ids(in order) and the model:
+    #topics and the size and mtime of Mallet's doc-topics file,
+    which `TopicMatrix.from_lda` reads
+    """
+    h = hashlib.sha1()
+    h.update('{}:{}\n'.format(type(lda_model).__name__,
+                               lda_model.num_topics))
+    fdoctopics = getattr(lda_model, 'fdoctopics', None)
+    if fdoctopics is not None and os.path.exists(fdoctopics()):
+        st = os.stat(fdoctopics())
+        h.update('{}:{}:{!r}\n'.format(fdoctopics(), st.st_size,
+                                        st.st_mtime))
+    for mid in msg_ids:
+        h.update(u'{}\n'.format(mid).encode('utf8'))
+    return h.hexdigest()
+
+
+class TopicMatrix(object):
+    """
+    Dense float32 matrix of document topics(one row per message)
+    together with the message id index.
+
+    Saved as `{path}.npy`(loaded with memory mapping) and `{path}.ids.pkl`
+    """
+    def __init__(self, matrix, msg_ids):
+        assert matrix.shape[0] == len(msg_ids), \
+            '{} != {}'.format(matrix.shape[0], len(msg_ids))
+        self.matrix = matrix
+        self.msg_ids = msg_ids
+        self.id2row = {mid: i for i, mid in enumerate(msg_ids)}
+
+    @property
+    def n_topics(self):
+        return self.matrix.shape[1]
+
+    @classmethod
+    def from_lda(cls, lda_model, msg_ids):
+        """
+        msg_ids: message id of each document used to train `lda_model`
+        """
+        matrix = np.zeros((len(msg_ids), lda_model.num_topics),
+                          dtype=np.float32)
+        n_docs = 0
+        for i, topic_dist in enumerate(lda_model.load_document_topics()):
+            assert i < len(msg_ids), \
+                'the model has more documents than the {} message ids'.format(
+                    len(msg_ids))
+            for t, w in topic_dist:
+                matrix[i, t] = w
+            n_docs += 1
+        assert n_docs == len(msg_ids), \
+            'the model has {} documents but there are {} message ids'.format(
+                n_docs, len(msg_ids))
+        return cls(matrix, msg_ids)
+
+    def save(self, path):
+        # replace rather than overwrite the file,
+        # which can still be memory mapped by earlier loads
+        tmp_path = path + '.npy.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, self.matrix)
+        os.rename(tmp_path, path + '.npy')
+        pkl.dump(self.msg_ids, open(path + '.ids.pkl', 'wb'),
+                 protocol=pkl.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        return cls(np.load(path + '.npy', mmap_mode=mmap_mode),
+                   pkl.load(open(path + '.ids.pkl', 'rb')))
+
+    @classmethod
+    def load_or_build(cls, path, lda_model, msg_ids):
+        """
+        Load the matrix saved at `path` if it was built from
+        the same model and message ids(see `topic_matrix_signature`),
+        otherwise build and save it
+        """
+        sig = topic_matrix_signature(lda_model, msg_ids)
+        sig_path = path + '.sig'
+        if os.path.exists(path + '.npy') and os.path.exists(sig_path) and \
+                open(sig_path).read() == sig:
+            logger.info('loading topic matrix from {}'.format(path))
+            return cls.load(path)
+        else:
+            logger.info('building topic matrix to {}'.format(path))
+            tm = cls.from_lda(lda_model, msg_ids)
+            tm.save(path)
+            with open(sig_path, 'w') as f:
+                f.write(sig)
+            return cls.load(path)
+
+    def __contains__(self, mid):
+        return mid in self.id2row
+
+    def __getitem__(self, mid):
+        return self.matrix[self.id2row[mid]]
+
+    def rows(self, msg_ids):
+        return self.matrix[[self.id2row[mid] for mid in msg_ids]]
+
+
+def event_key(msg_ids):
+    h = hashlib.sha1()
+    for mid in sorted(set(msg_ids)):
+        h.update(u'{}\n'.format(mid).encode('utf8'))
+    return h.hexdigest()
+
+
+class EventTopicCache(object):
+    """
+    Cached topic inference for concatenated event documents.
+
+    Keyed by the set of message ids of the event.
+    `prefetch` infers all missing events in one Mallet call.
+    """
+    def __init__(self, lda, iterations=100, path=None):
+        self.lda = lda
+        self.iterations = iterations
+        self.path = path
+        if path and os.path.exists(path):
+            self.key2topics = pkl.load(open(path, 'rb'))
+        else:
+            self.key2topics = {}
+
+    def _infer(self, bows):
+        result = self.lda.__getitem__(bows, iterations=self.iterations)
+        return [to_dense_topics(topic_dist, self.lda.num_topics)
+                for topic_dist in result]
+
+    def prefetch(self, events):
+        """
+        events: list of (msg_ids, bow)
+        """
+        missing = {}
+        for msg_ids, bow in events:
+            key = event_key(msg_ids)
+            if key not in self.key2topics:
+                missing[key] = bow
+        if missing:
+            logger.debug('inferring topics for {} events'.format(
+                len(missing)))
+            keys = missing.keys()
+            for key, topics in zip(keys,
+                                   self._infer([missing[k] for k in keys])):
+                self.key2topics[key] = topics
+            self.save()
+
+    def get(self, msg_ids, bow):
+        key = event_key(msg_ids)
+        if key not in self.key2topics:
+            self.prefetch([(msg_ids, bow)])
+        return self.key2topics[key]
+
+    def save(self):
+        if self.path:
+            pkl.dump(self.key2topics, open(self.path, 'wb'),
+                     protocol=pkl.HIGHEST_PROTOCOL)
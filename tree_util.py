@@ -193,6 +193,7 @@ if __name__ == '__main__':
     np.set_printoptions(precision=2, suppress=True)
     import matplotlib.pyplot as plt
     import cPickle as pkl
+    from compact_meta_graph import load_meta_graph
 
     plt.figure(figsize=(8, 8))
     # pred_path, mg_path = pkl.load(open('.paths.pkl'))
@@ -204,7 +205,7 @@ if __name__ == '__main__':
     pred_tree = pkl.load(open(paths['result']))[0]
     true_tree = pkl.load(open(paths['true_events']))[0]
     
-    meta_graph = nx.read_gpickle(paths['meta_graph'])
+    meta_graph = load_meta_graph(paths['meta_graph'], features=())
 
     # print('mg.c:', [meta_graph[s][t]['c'] for s, t in true_tree.edges_iter()])
     # print('t.c:', [true_tree[s][t]['c'] for s, t in true_tree.edges_iter()])
@@ -1,3 +1,4 @@
+import sys
 import pymongo
 import ujson as json
 from tweepy.streaming import StreamListener
@@ -58,6 +59,29 @@ class StdOutListener(StreamListener):
         print status
 
 
+class MetaGraphListener(StreamListener):
+    """feed tweets into an `IncrementalMetaGraph` as they arrive
+    """
+    def __init__(self, incremental_meta_graph):
+        self.meta_graph = incremental_meta_graph
+
+    def on_data(self, raw_data):
+        try:
+            data = json.loads(raw_data)
+            if data.get("lang") == 'en':
+                if data.get("entities") and \
+                        data.get("entities").get('user_mentions') and \
+                        data["entities"]['user_mentions']:
+                    self.meta_graph.add(convert_tweet(data))
+        except:
+            import traceback
+            traceback.print_exc(file=sys.stdout)
+        return True
+
+    def on_error(self, status):
+        print status
+
+
 if __name__ == '__main__':
     import argparse
     parser = argparse.ArgumentParser('')
@@ -1,4 +1,5 @@
 import codecs
+import cPickle as pkl
 import ujson as json
 import math
 import gensim
@@ -21,6 +22,20 @@ def load_json_by_line(path):
     return map(json.loads, load_items_by_line(path))
 
 
+def load_interactions(path):
+    """interactions in either json(whole file or one per line) or pickle
+    """
+    if path.endswith(".json"):
+        try:
+            return json.load(open(path))
+        except ValueError:
+            return load_json_by_line(path)
+    elif path.endswith(".pkl"):
+        return pkl.load(open(path))
+    else:
+        raise ValueError("invalid path extension: {}".format(path))
+
+
 def load_id2obj_dict(path, id_key):
     try:
         df = pd.read_json(path)
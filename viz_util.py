@@ -1,28 +1,68 @@
-def to_d3_graph(g):
-    """convert networkx format graph to d3 format
-    node/edge attributes are copied
-    """
-    data = {'nodes': [], 'edges': []}
-    for n in g.nodes_iter():
-        node = g.node[n]
-        # print('node', node)
-        for f in ('topics', 'bow', 'hashtag_bow'):
-            if f in node:
-                del node[f]
+import codecs
+import ujson as json
+
+# too large for the visualization
+D3_EXCLUDED_FIELDS = ('topics', 'bow', 'hashtag_bow')
 
+
+def _d3_nodes(g):
+    """copies of the node attributes with `name`"""
+    for n in g.nodes_iter():
+        node = {k: v for k, v in g.node[n].iteritems()
+                if k not in D3_EXCLUDED_FIELDS}
         node['name'] = n
-        data['nodes'].append(node)
+        yield node
+
 
+def _d3_edges(g):
+    """copies of the edge attributes with `source` and `target`"""
     name2index = {n: i
                   for i, n in enumerate(g.nodes_iter())}
-
     for s, t in g.edges_iter():
-        edge = g[s][t]
+        edge = dict(g[s][t])
         edge['source'] = name2index[s]
         edge['target'] = name2index[t]
-        data['edges'].append(edge)
+        yield edge
+
+
+def to_d3_graph(g):
+    """convert networkx format graph to d3 format
+    node/edge attributes are copied
+    """
+    return {'nodes': list(_d3_nodes(g)),
+            'edges': list(_d3_edges(g))}
+
+
+def _write_json_items(items, f):
+    for i, item in enumerate(items):
+        if i > 0:
+            f.write(u',')
+        f.write(json.dumps(item))
+
+
+def write_d3_graphs(graphs, f):
+    """
+    write the list of `to_d3_graph` of `graphs` as json to file `f`,
+    one node/edge at a time, so neither the d3 graphs
+    nor the json string are held in memory.
+
+    graphs can be a generator
+    """
+    f.write(u'[')
+    for i, g in enumerate(graphs):
+        if i > 0:
+            f.write(u',')
+        f.write(u'{"nodes":[')
+        _write_json_items(_d3_nodes(g), f)
+        f.write(u'],"edges":[')
+        _write_json_items(_d3_edges(g), f)
+        f.write(u']}')
+    f.write(u']')
+
 
-    return data
+def dump_d3_graphs(graphs, path):
+    with codecs.open(path, 'w', 'utf8') as f:
+        write_d3_graphs(graphs, f)
 
 
 def add_subgraph_specific_attributes_to_graph(